@@ -9,3 +9,7 @@ scriptdir="${scriptdir%/*}"
 # Competition jobs
 python $scriptdir/../unicorn/manage.py update_competition_states
 python $scriptdir/../unicorn/manage.py entry_status_progress
+python $scriptdir/../unicorn/manage.py flush_vote_buffer
+
+# Upload jobs
+python $scriptdir/../unicorn/manage.py reap_uploads
@@ -7,7 +7,11 @@ from rest_framework.serializers import CharField, ListSerializer
 from rest_framework.views import APIView
 from rest_framework_guardian.filters import ObjectPermissionsFilter
 from utilities.api import ModelViewSet
-from utilities.permissions import IsAuthenticatedAndNotAnon, StandardObjectPermissions
+from utilities.permissions import (
+    IsAuthenticatedAndNotAnon,
+    StandardObjectPermissions,
+    get_anonymous_user,
+)
 
 from ..constants import USER_ROLE_ANON
 from ..filters import UserSearchFilter
@@ -41,7 +45,7 @@ class UserViewSet(ModelViewSet):
             return Response(status=404, data="Not found")
 
         user_perms = user.get_all_permissions()
-        anon_perms = User.get_anonymous().get_all_permissions()
+        anon_perms = get_anonymous_user().get_all_permissions()
         perms = set.union(user_perms, anon_perms)
 
         return Response(sorted(perms))
@@ -68,7 +72,7 @@ class MyGlobalPermissionsView(APIView):
         Return a list of all global permissions for the current user
         """
         user_perms = request.user.get_all_permissions()
-        anon_perms = User.get_anonymous().get_all_permissions()
+        anon_perms = get_anonymous_user().get_all_permissions()
         perms = set.union(user_perms, anon_perms)
 
         return Response(sorted(perms))
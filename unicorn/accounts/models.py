@@ -88,6 +88,8 @@ class User(AbstractUser, GuardianUserMixin):
         help_text=_("Designates whether the user has been physically checked in to the event or not."),
     )
     crew = models.JSONField(verbose_name=_("crew details"), null=True, blank=True)
+    # not moved by logins, which only save last_login, see EntryViewSet.conditional_fields
+    last_updated = models.DateTimeField(verbose_name=_("last updated"), auto_now=True)
 
     class Meta:
         ordering = ("last_name", "first_name")
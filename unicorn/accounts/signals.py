@@ -1,13 +1,23 @@
+from collections import defaultdict
+
 from django.contrib.auth.models import Group
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from guardian.shortcuts import assign_perm
 from social_django.models import UserSocialAuth
+from utilities.reference import cached_reference, get_group, invalidate_reference
 
 from .constants import USER_ROLE_ANON, USER_ROLE_CREW, USER_ROLE_PARTICIPANT
 from .models import AutoCrew, User
 
 
+def _autocrew_mappings():
+    mappings = defaultdict(list)
+    for mapping in AutoCrew.objects.select_related("group"):
+        mappings[mapping.crew].append(mapping.group)
+    return dict(mappings)
+
+
 @receiver(post_save, sender=User)
 def give_user_self_permissions(sender, instance, created, **kwargs):
     if created and instance.role is not USER_ROLE_ANON:
@@ -23,7 +33,13 @@ def add_default_permissions(sender, instance, created, **kwargs):
         and not instance.groups.filter(name="p-participant").exists()
     ):
         # add user to default participants group
-        instance.groups.add(Group.objects.get(name="p-participant"))
+        instance.groups.add(get_group("p-participant"))
+
+
+@receiver(post_save, sender=AutoCrew)
+@receiver(post_delete, sender=AutoCrew)
+def invalidate_autocrew_mappings(sender, **kwargs):
+    invalidate_reference(sender)
 
 
 @receiver(pre_save, sender=UserSocialAuth)
@@ -42,13 +58,13 @@ def assign_crew_permissions_keycloak(instance, **kwargs):
         return
 
     # find groups for each of the crews the user is a member of and add them to them
+    mappings = cached_reference("autocrew", [AutoCrew, Group], _autocrew_mappings)
     for g in instance.extra_data.get("groups", []):
-        ac = AutoCrew.objects.filter(crew=g).prefetch_related()
-        for mapping in ac:
-            instance.user.groups.add(mapping.group)
+        for group in mappings.get(g, []):
+            instance.user.groups.add(group)
 
             # if users are added to the crew-group, also add the role.
-            if mapping.group.name == "p-crew":
+            if group.name == "p-crew":
                 instance.user.role = USER_ROLE_CREW
                 instance.user.save()
 
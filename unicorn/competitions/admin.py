@@ -1,7 +1,11 @@
+import time
+
 from django.contrib import admin
 from guardian.admin import GuardedModelAdmin
 
+from . import scoring
 from .models import Competition, Contributor, Entry, File, Genre
+from .results import refresh_snapshots, snapshot_results
 
 
 @admin.register(Genre)
@@ -14,6 +18,29 @@ class GenreAdmin(GuardedModelAdmin):
 class CompetitionAdmin(GuardedModelAdmin):
     list_display = ("name", "genre", "published", "state", "entries_count")
     list_filter = ("event__name", "genre__name", "published", "state")
+    actions = ("rebuild_results", "recompute_scores")
+
+    def get_queryset(self, request):
+        return super(CompetitionAdmin, self).get_queryset(request).with_entries_count()
+
+    @admin.action(description="Rebuild results snapshot")
+    def rebuild_results(self, request, queryset):
+        for competition in queryset:
+            snapshot_results(competition)
+
+        self.message_user(request, "Rebuilt results for %d competitions" % len(queryset))
+
+    @admin.action(description="Recompute scores")
+    def recompute_scores(self, request, queryset):
+        started = time.monotonic()
+        changes = scoring.recompute_scores(queryset.values_list("pk", flat=True))
+        refresh_snapshots(queryset)
+
+        self.message_user(
+            request,
+            "Recomputed %d competitions in %.2f seconds, %d scores changed"
+            % (len(queryset), time.monotonic() - started, len(changes)),
+        )
 
 
 @admin.register(Entry)
@@ -0,0 +1,118 @@
+from accounts.models import User
+from competitions import reference
+from competitions.constants import COMPETITION_STATE_CHOICES
+from competitions.models import (
+    NEXT_STATE_FIELDS,
+    Competition,
+    Contributor,
+    File,
+    next_competition_state,
+)
+from utilities.fast_serializers import FastSerializer
+
+from . import serializers
+from .nested_serializers import NestedGenreSerializer
+
+#
+# Competitions
+#
+
+
+class FastCompetitionSerializer(FastSerializer):
+    """
+    Same output as CompetitionSerializer without nested entries, see CompetitionViewSet.
+    """
+
+    serializer_class = serializers.CompetitionSerializer
+    extra_values = ("genre_id", "annotated_entries_count")
+
+    def __init__(self, context, **selection):
+        super(FastCompetitionSerializer, self).__init__(context, **selection)
+        self.state_choices = {value: {"value": value, "label": label} for value, label in COMPETITION_STATE_CHOICES}
+        self.genres = {}
+        if "next_state" in self.names:
+            self.columns.update(("state", *NEXT_STATE_FIELDS))
+
+    def prepare(self, rows):
+        for genre_id in {row["genre_id"] for row in rows} - self.genres.keys():
+            self.genres[genre_id] = NestedGenreSerializer(reference.get_genre(genre_id), context=self.context).data
+
+    def get_genre(self, row):
+        return self.genres[row["genre_id"]]
+
+    def get_entries_count(self, row) -> int:
+        return row["annotated_entries_count"]
+
+    def get_team_required(self, row) -> bool:
+        return bool(row["team_min"] and row["team_max"])
+
+    def get_next_state(self, row):
+        state = next_competition_state(row["state"], **{name: row[name] for name in NEXT_STATE_FIELDS})
+        return self.state_choices[state]
+
+
+#
+# Entries
+#
+
+
+class FastEntryVoteSerializer(FastSerializer):
+    """
+    Same output as EntryVoteSerializer, see EntryViewSet.
+    """
+
+    serializer_class = serializers.EntryVoteSerializer
+    extra_values = ("competition_id",)
+
+    def prepare(self, rows):
+        entry_ids = [row["id"] for row in rows]
+
+        self.owners = {}
+        self.files = {}
+        if "owner" in self.names:
+            self.prepare_owners(entry_ids)
+        if "files" in self.names:
+            self.prepare_files(rows, entry_ids)
+
+    def prepare_owners(self, entry_ids):
+        owners = Contributor.objects.filter(entry_id__in=entry_ids, is_owner=True).values(
+            "entry_id", "user__display_name_format", "user__first_name", "user__last_name", "user__username"
+        )
+        for owner in owners:
+            if owner["entry_id"] not in self.owners:
+                user = User(
+                    display_name_format=owner["user__display_name_format"],
+                    first_name=owner["user__first_name"],
+                    last_name=owner["user__last_name"],
+                    username=owner["user__username"],
+                )
+                self.owners[owner["entry_id"]] = user.display_name
+
+    def prepare_files(self, rows, entry_ids):
+        fileupload = dict(
+            Competition.objects.filter(pk__in={row["competition_id"] for row in rows}).values_list("pk", "fileupload")
+        )
+        kinds = {
+            competition_id: {kind.get("type", None): kind.get("file", None) for kind in reversed(kinds)}
+            for competition_id, kinds in fileupload.items()
+        }
+        storage = File._meta.get_field("file").storage
+        build = self.request.build_absolute_uri
+
+        self.files = {entry_id: [] for entry_id in entry_ids}
+        competitions = {row["id"]: row["competition_id"] for row in rows}
+        for f in File.objects.filter(entry_id__in=entry_ids, active=True).values("entry_id", "type", "name", "file"):
+            self.files[f["entry_id"]].append(
+                {
+                    "type": f["type"],
+                    "name": f["name"],
+                    "kind": kinds[competitions[f["entry_id"]]].get(f["type"]),
+                    "url": build(storage.url(f["file"])),
+                }
+            )
+
+    def get_owner(self, row) -> str:
+        return self.owners.get(row["id"])
+
+    def get_files(self, row):
+        return self.files[row["id"]]
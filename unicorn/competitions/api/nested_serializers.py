@@ -1,7 +1,45 @@
 from competitions.constants import GENRE_CATEGORY_CHOICES
-from competitions.models import Competition, Entry, File, Genre
+from competitions.models import Competition, Contributor, Entry, File, Genre
 from rest_framework import serializers
-from utilities.api import ChoiceField, WritableNestedSerializer
+from utilities.api import ChoiceField, WritableNestedSerializer, request_cache
+
+
+def contributed_entry_ids(context) -> frozenset:
+    """
+    Ids of the entries the requesting user contributes to, looked up once per request.
+    """
+
+    def lookup():
+        user = context["request"].user
+        if not user.is_authenticated:
+            return frozenset()
+        return frozenset(Contributor.objects.filter(user=user).values_list("entry_id", flat=True))
+
+    return request_cache(context, "contributed_entry_ids", lookup)
+
+
+def can_view_crew_details(context) -> bool:
+    """
+    Whether the requesting user may see crew messages and contributor details, looked up once per request.
+    """
+    request = context.get("request")
+    return request_cache(
+        context,
+        "view_entry_crewmsg",
+        lambda: bool(request) and request.user.has_perm("competitions.view_entry_crewmsg"),
+    )
+
+
+def get_owner(entry):
+    """
+    The owning contributor of an entry, read from prefetched contributors when the entries were fetched with them.
+    """
+    for contributor in entry.entry_to_user.all():
+        if contributor.is_owner:
+            return contributor
+
+    return None
+
 
 #
 # Genre
@@ -46,13 +84,7 @@ class NestedEntrySerializer(WritableNestedSerializer):
         fields = ["obj_type", "id", "url", "title", "is_contributor"]
 
     def get_is_contributor(self, obj) -> bool:
-        if not self.context["request"].user.is_authenticated:
-            return False
-
-        if obj in self.context["request"].user.entries.all():
-            return True
-
-        return False
+        return obj.pk in contributed_entry_ids(self.context)
 
 
 class NestedFileVoteSerializer(WritableNestedSerializer):
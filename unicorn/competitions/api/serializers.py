@@ -1,9 +1,8 @@
-import re
-
 from accounts.api.nested_serializers import (
     NestedUserSerializer,
     NestedUserWithDetailsSerializer,
 )
+from competitions import vote_buffer
 from competitions.constants import (
     COMPETITION_STATE_CHOICES,
     ENTRY_STATUS_CHOICES,
@@ -11,6 +10,9 @@ from competitions.constants import (
     GENRE_CATEGORY_CHOICES,
 )
 from competitions.models import Competition, Contributor, Entry, File, Genre, Vote
+from competitions.results import get_results
+from competitions.voting import cast_ballot, validate_ballot
+from django.core.exceptions import ValidationError as ModelValidationError
 from drf_spectacular.utils import extend_schema_field
 from guardian.shortcuts import assign_perm
 from rest_framework import serializers
@@ -27,6 +29,9 @@ from .nested_serializers import (
     NestedEntrySerializer,
     NestedFileVoteSerializer,
     NestedGenreSerializer,
+    can_view_crew_details,
+    contributed_entry_ids,
+    get_owner,
 )
 
 #
@@ -88,13 +93,29 @@ class CompetitionSerializer(ValidatedModelSerializer):
     genre = NestedGenreSerializer()
     state = ChoiceField(choices=COMPETITION_STATE_CHOICES, read_only=True)
     next_state = ChoiceField(choices=COMPETITION_STATE_CHOICES, read_only=True)
-    entries = NestedEntrySerializer(many=True, read_only=True)
+    entries = serializers.SerializerMethodField()
 
     def __init__(self, *args, **kwargs):
         super(CompetitionSerializer, self).__init__(*args, **kwargs)
 
-        if self.context.get("request") and not self.context["request"].user.has_perm("view_entry"):
-            self.fields.pop("entries")
+        if not self.includes_entries(self.context.get("request")):
+            self.fields.pop("entries", None)
+
+    @staticmethod
+    def includes_entries(request) -> bool:
+        """
+        Whether nested entries are rendered for a request, so views only prefetch entries when they are needed.
+        """
+        return request is None or request.user.has_perm("view_entry")
+
+    @extend_schema_field(NestedEntrySerializer(many=True))
+    def get_entries(self, obj):
+        # CompetitionViewSet prefetches a limited number of entries, see COMPETITION_NESTED_ENTRIES_LIMIT
+        entries = getattr(obj, "nested_entries", None)
+        if entries is None:
+            entries = obj.entries.all()
+
+        return NestedEntrySerializer(entries, many=True, context=self.context).data
 
     class Meta:
         model = Competition
@@ -146,6 +167,7 @@ class CompetitionSerializer(ValidatedModelSerializer):
             "autoqualify",
             "scoring_complete",
         ]
+        deferrable_fields = ("brief_description", "description", "rules", "prizes", "links", "contributor_extra")
 
     def create(self, validated_data):
         instance = super(CompetitionSerializer, self).create(validated_data)
@@ -180,8 +202,7 @@ class EntryContributorSerializer(WritableNestedSerializer):
 
     @extend_schema_field(NestedUserSerializer)  # TODO: maybe redo this method to return the same schema in all cases?
     def get_user(self, instance, **kwargs):
-        request = self.context.get("request", None)
-        if request and request.user.has_perm("competitions.view_entry_crewmsg"):
+        if can_view_crew_details(self.context):
             return NestedUserWithDetailsSerializer(instance=instance.user).data
         else:
             return NestedUserSerializer(instance=instance.user).data
@@ -219,6 +240,7 @@ class EntrySerializer(ValidatedModelSerializer):
             "order",
             "score",
         )
+        deferrable_fields = ("crew_msg", "screen_msg", "vote_msg", "comment")
 
     def update(self, instance, validated_data):
         # stop update if compo is locked down
@@ -250,13 +272,7 @@ class EntrySerializer(ValidatedModelSerializer):
         return instance
 
     def get_is_contributor(self, obj) -> bool:
-        if not self.context["request"].user.is_authenticated:
-            return False
-
-        if obj in self.context["request"].user.entries.all():
-            return True
-
-        return False
+        return obj.pk in contributed_entry_ids(self.context)
 
     def get_is_owner(self, obj) -> bool:
         # make sure we are authenticated
@@ -264,21 +280,20 @@ class EntrySerializer(ValidatedModelSerializer):
             return False
 
         # fetch owner and make sure there is one
-        owner = self.get_owner(obj)
+        owner = get_owner(obj)
         if not owner:
             return False
 
         # finally check if we are the owner
-        return self.context["request"].user.pk == owner["uuid"]
+        return self.context["request"].user.pk == owner.user_id
 
     @extend_schema_field(NestedUserSerializer)  # TODO: maybe redo this method to return the same schema in all cases?
     def get_owner(self, obj):
-        try:
-            contributor = Contributor.objects.get(is_owner=True, entry_id=obj.pk)
-        except Contributor.DoesNotExist:
+        contributor = get_owner(obj)
+        if not contributor:
             return None
 
-        if self.context["request"] and self.context["request"].user.has_perm("competitions.view_entry_crewmsg"):
+        if can_view_crew_details(self.context):
             return NestedUserWithDetailsSerializer(instance=contributor.user).data
         else:
             return NestedUserSerializer(instance=contributor.user).data
@@ -292,14 +307,16 @@ class EntryVoteSerializer(ValidatedModelSerializer):
         model = Entry
         read_only_fields = ("id", "title", "owner", "files")
         fields = (*read_only_fields,)
+        deferrable_fields = ("crew_msg", "screen_msg", "vote_msg", "comment")
 
     def get_owner(self, obj) -> str:
-        contrib = Contributor.objects.get(entry=obj, is_owner=True)
-        return contrib.user.display_name
+        contrib = get_owner(obj)
+        return contrib.user.display_name if contrib else None
 
     def get_files(self, obj):
         request = self.context.get("request")
-        qs = File.objects.filter(entry=obj, active=True)
+        # the entries view prefetches active files, see EntryViewSet.get_queryset()
+        qs = obj.active_files if hasattr(obj, "active_files") else File.objects.filter(entry=obj, active=True)
         return NestedFileVoteSerializer(many=True, instance=qs, context={"request": request}).data
 
 
@@ -377,31 +394,57 @@ class VoteSerializer(ValidatedModelSerializer):
         return instance
 
 
+class BallotVoteSerializer(serializers.Serializer):
+    entry = serializers.IntegerField()
+    score = serializers.IntegerField(min_value=1, max_value=5)
+
+
+class BallotSerializer(serializers.Serializer):
+    competition = serializers.PrimaryKeyRelatedField(queryset=Competition.objects.all())
+    votes = BallotVoteSerializer(many=True, allow_empty=False)
+
+    def validate(self, data):
+        scores = {}
+        for vote in data["votes"]:
+            if vote["entry"] in scores:
+                raise ValidationError({"votes": "Entry {} is listed more than once".format(vote["entry"])})
+            scores[vote["entry"]] = vote["score"]
+
+        try:
+            validate_ballot(self.context["request"].user, data["competition"], scores)
+        except ModelValidationError as e:
+            raise ValidationError(e.args[0])
+
+        data["scores"] = scores
+        return data
+
+    def save(self, **kwargs):
+        user = self.context["request"].user
+        if vote_buffer.is_enabled():
+            return vote_buffer.buffer_ballot(user, self.validated_data["competition"], self.validated_data["scores"])
+
+        return cast_ballot(user, self.validated_data["competition"], self.validated_data["scores"])
+
+
+class PendingVoteSerializer(serializers.Serializer):
+    competition = serializers.IntegerField(read_only=True)
+    entry = serializers.IntegerField(read_only=True)
+    score = serializers.IntegerField(read_only=True)
+
+
 #
 # Results
 #
 
 
 class ResultsEntrySerializer(WritableNestedSerializer):
-    owner = serializers.SerializerMethodField()
+    owner = serializers.CharField(read_only=True)
 
     class Meta:
         model = Entry
         read_only_fields = ("title", "owner", "score")
         fields = (*read_only_fields,)
 
-    def get_owner(self, obj) -> str:
-        contrib = Contributor.objects.get(entry=obj, is_owner=True)
-        name = contrib.user.display_name
-
-        # remove uuid from display name of users with default nick from
-        # new-style GE which are also still using "aka" style display name
-        return re.sub(
-            r"\saka\.\s[0-9a-f]{8}-[0-9a-f]{4}-[1-5][0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{6}",
-            "",
-            name,
-        )
-
 
 class ResultsSerializer(ValidatedModelSerializer):
     entries = ResultsEntrySerializer(many=True, read_only=True)
@@ -410,3 +453,7 @@ class ResultsSerializer(ValidatedModelSerializer):
         model = Competition
         read_only_fields = ("name", "entries_count", "entries")
         fields = (*read_only_fields,)
+
+    def to_representation(self, instance):
+        # served from the results snapshot when there is one, see competitions.results
+        return get_results(instance)
@@ -2,31 +2,46 @@ import os
 import shutil
 from zipfile import ZipFile
 
-from competitions import filters
-from competitions.models import Competition, Contributor, Entry, Genre, Vote
+from competitions import filters, vote_buffer
+from competitions.models import (
+    Competition,
+    Contributor,
+    Entry,
+    File,
+    Genre,
+    ResultsSnapshot,
+    Vote,
+)
+from core.models import Event
+from django.conf import settings
 from django.db.models import Prefetch
 from django.http import HttpResponseRedirect
 from drf_spectacular.types import OpenApiTypes
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import OpenApiParameter, extend_schema
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
 from utilities.api import ModelViewSet
+from utilities.fast_serializers import FastListMixin
+from utilities.response_cache import CachedResponseMixin
 
 from unicorn.api import MethodNotAllowed, PassthroughRenderer, ServerError
 
 from ..constants import ENTRY_STATUS_QUALIFIED, GENRE_CATEGORY_CREATIVE
-from . import serializers
+from ..results import prefetch_results
+from . import fast_serializers, serializers
 
 #
 # Genres
 #
 
 
-class GenreViewSet(ModelViewSet):
+class GenreViewSet(CachedResponseMixin, ModelViewSet):
     queryset = Genre.objects.all()
     serializer_class = serializers.GenreSerializer
+    cache_models = (Genre,)
 
 
 #
@@ -34,7 +49,7 @@ class GenreViewSet(ModelViewSet):
 #
 
 
-class CompetitionViewSet(ModelViewSet):
+class CompetitionViewSet(CachedResponseMixin, FastListMixin, ModelViewSet):
     """
     list:
     Return a list of all competitions
@@ -55,9 +70,29 @@ class CompetitionViewSet(ModelViewSet):
     Delete a competition
     """
 
-    queryset = Competition.objects.select_related("genre").prefetch_related("entries")
+    queryset = Competition.objects.select_related("genre").with_entries_count()
     serializer_class = serializers.CompetitionSerializer
+    fast_serializer_class = fast_serializers.FastCompetitionSerializer
     filterset_class = filters.CompetitionFilter
+    conditional_fields = ("last_updated", "entries__last_updated")
+    cache_models = (Competition, Entry, Genre, Event)
+
+    def use_fast_serializer(self):
+        # nested entries are only rendered by the regular serializer
+        return super(CompetitionViewSet, self).use_fast_serializer() and not (
+            self.renders_field("entries") and self.serializer_class.includes_entries(self.request)
+        )
+
+    def get_queryset(self):
+        queryset = super(CompetitionViewSet, self).get_queryset()
+        if not self.renders_field("entries") or not self.serializer_class.includes_entries(self.request):
+            return queryset
+
+        entries = Entry.objects.all()
+        if settings.COMPETITION_NESTED_ENTRIES_LIMIT:
+            entries = entries[: settings.COMPETITION_NESTED_ENTRIES_LIMIT]
+
+        return queryset.prefetch_related(Prefetch("entries", queryset=entries, to_attr="nested_entries"))
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -141,15 +176,44 @@ class DownloadViewSet(ReadOnlyModelViewSet):
 #
 
 
-class EntryViewSet(ModelViewSet):
+class EntryViewSet(FastListMixin, ModelViewSet):
     filterset_class = filters.EntryFilter
+    permission_prefetch = ("files",)
+    fast_serializer_class = fast_serializers.FastEntryVoteSerializer
+    conditional_fields = (
+        "last_updated",
+        "files__last_updated",
+        "competition__last_updated",
+        "entry_to_user__last_updated",
+        "entry_to_user__user__last_updated",
+    )
+    cursor_ordering = ("order", "title", "id")
+
+    def use_fast_serializer(self):
+        return super(EntryViewSet, self).use_fast_serializer() and bool(self.request.query_params.get("vote", None))
 
     def get_queryset(self):
+        # owners and contributors are read from the prefetched contributors, see nested_serializers.get_owner()
+        prefetch = []
+        if any(self.renders_field(name) for name in ("contributors", "owner", "is_owner")):
+            prefetch.append(Prefetch("entry_to_user", queryset=Contributor.objects.select_related("user")))
+
         if self.request:
             if self.request.query_params.get("vote", None):
-                return Entry.objects.filter(status=ENTRY_STATUS_QUALIFIED)
+                if self.renders_field("files"):
+                    files = File.objects.filter(active=True)
+                    prefetch.append(Prefetch("files", queryset=files, to_attr="active_files"))
+
+                return (
+                    Entry.objects.filter(status=ENTRY_STATUS_QUALIFIED)
+                    .select_related("competition")
+                    .prefetch_related(*prefetch)
+                )
+
+        if self.renders_field("files"):
+            prefetch.append("files")
 
-        return Entry.objects.select_related("competition")
+        return Entry.objects.select_related("competition").prefetch_related(*prefetch)
 
     def get_serializer_class(self):
         if self.request:
@@ -168,6 +232,59 @@ class VoteViewSet(ModelViewSet):
         else:
             return Vote.objects.none()
 
+    def create(self, request, *args, **kwargs):
+        if not vote_buffer.is_enabled():
+            return super(VoteViewSet, self).create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        entry = serializer.validated_data["entry"]
+        votes = vote_buffer.buffer_ballot(
+            request.user, entry.competition, {entry.pk: serializer.validated_data["score"]}
+        )
+
+        return Response(serializers.PendingVoteSerializer(votes[0]).data, status=status.HTTP_202_ACCEPTED)
+
+    @extend_schema(request=serializers.BallotSerializer, responses=serializers.VoteSerializer(many=True))
+    @action(methods=["post"], detail=False)
+    def ballot(self, request, *args, **kwargs):
+        """
+        Submit all votes for a competition at once. Existing votes on the same entries are updated.
+
+        When the vote buffer is enabled the ballot is accepted with status 202 and the buffered votes are returned.
+        They show up in /pending/ until they are written.
+        """
+        ballot = serializers.BallotSerializer(data=request.data, context=self.get_serializer_context())
+        ballot.is_valid(raise_exception=True)
+        result = ballot.save()
+
+        if vote_buffer.is_enabled():
+            serializer = serializers.PendingVoteSerializer(result, many=True)
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+        votes = self.get_queryset().filter(entry__competition=ballot.validated_data["competition"])
+        serializer = self.get_serializer(votes, many=True)
+        return Response(serializer.data)
+
+    @extend_schema(
+        parameters=[OpenApiParameter("competition", OpenApiTypes.INT)],
+        responses=serializers.PendingVoteSerializer(many=True),
+    )
+    @action(methods=["get"], detail=False)
+    def pending(self, request, *args, **kwargs):
+        """
+        List your votes which are accepted by the vote buffer, but not written yet.
+        """
+        if not request.user.is_authenticated:
+            return Response([])
+
+        competition = request.query_params.get("competition")
+        if competition and not competition.isdigit():
+            raise ValidationError({"competition": "A valid integer is required."})
+
+        votes = vote_buffer.pending_votes(request.user, int(competition) if competition else None)
+        return Response(serializers.PendingVoteSerializer(votes, many=True).data)
+
 
 #
 # Contributors
@@ -182,16 +299,22 @@ class ContributorViewSet(ModelViewSet):
 #
 
 
-class ResultsViewSet(ModelViewSet):
+class ResultsViewSet(CachedResponseMixin, ModelViewSet):
     queryset = (
         Competition.objects.filter(published=True)
         .filter(genre__category=GENRE_CATEGORY_CREATIVE)
         .order_by("genre", "name")
-        .prefetch_related(
-            Prefetch(
-                "entries",
-                queryset=Entry.objects.filter(status=ENTRY_STATUS_QUALIFIED).order_by("-score", "order"),
-            )
-        )
+        .select_related("results_snapshot")
+        .with_entries_count()
     )
     serializer_class = serializers.ResultsSerializer
+    cache_models = (Competition, Entry, ResultsSnapshot)
+    cache_fields = ((Entry, "score"),)
+
+    def get_serializer(self, *args, **kwargs):
+        if args and args[0] is not None and kwargs.get("many"):
+            # competitions without a snapshot are built live, fetch their entries for the whole page at once
+            args = (list(args[0]), *args[1:])
+            prefetch_results(args[0])
+
+        return super(ResultsViewSet, self).get_serializer(*args, **kwargs)
@@ -72,3 +72,8 @@ FILE_STATUS_CHOICES = (
     (FILE_STATUS_FINISHED, _("Finished")),
     (FILE_STATUS_FAILED, _("Failed")),
 )
+
+# Weighting of regular and jury votes when calculating entry scores. Jury votes are normalised so that the jury as a
+# whole carries JURY_WEIGHT of the total score in a competition, regardless of how many jury members voted.
+SCORE_MORTAL_WEIGHT = 0.7
+SCORE_JURY_WEIGHT = 1 - SCORE_MORTAL_WEIGHT
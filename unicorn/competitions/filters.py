@@ -1,11 +1,11 @@
 import django_filters
-from core.models import Event
 from django.db.models import Q
 from django.utils.translation import gettext_lazy as _
 from utilities.filters import NumericInFilter
 
 from .constants import GENRE_CATEGORY_CHOICES
 from .models import Competition, Entry, Genre
+from .reference import genre_choices, visible_event_choices
 
 
 class GenreFilter(django_filters.FilterSet):
@@ -31,8 +31,8 @@ class CompetitionFilter(django_filters.FilterSet):
         null_value=None,
         label=_("Category"),
     )
-    event = django_filters.ModelMultipleChoiceFilter(field_name="event", queryset=Event.objects.filter(visible=True))
-    genre = django_filters.ModelMultipleChoiceFilter(field_name="genre", queryset=Genre.objects.all(), label=_("Genre"))
+    event = django_filters.MultipleChoiceFilter(field_name="event", choices=visible_event_choices, label=_("Event"))
+    genre = django_filters.MultipleChoiceFilter(field_name="genre", choices=genre_choices, label=_("Genre"))
     name = django_filters.CharFilter()
     info = django_filters.CharFilter()
     rules = django_filters.CharFilter()
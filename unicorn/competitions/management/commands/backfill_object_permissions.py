@@ -0,0 +1,37 @@
+import time
+from datetime import datetime
+
+import pytz
+from competitions.permissions import BACKFILL_RULES, backfill_object_permissions
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfills the object permissions normally assigned by signals on competitions, entries, contributors, files "
+        "and votes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model",
+            action="append",
+            choices=list(BACKFILL_RULES),
+            help="Only backfill permissions on the given model, can be repeated",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000, help="Number of permissions inserted per query")
+
+    def handle(self, *args, **options):
+        self.stdout.write("=== Starting backfill_object_permissions at %s" % datetime.now().replace(tzinfo=pytz.utc))
+
+        for name in options["model"] or BACKFILL_RULES:
+            started = time.monotonic()
+            created = backfill_object_permissions(name, batch_size=options["batch_size"])
+            elapsed = time.monotonic() - started
+
+            self.stdout.write(
+                "+ Backfilled %d %s permissions in %.2f seconds (%d/s)"
+                % (created, name, elapsed, created / elapsed if elapsed else 0)
+            )
+
+        self.stdout.write("=== Finished at %s" % datetime.now().replace(tzinfo=pytz.utc), ending="\n\n")
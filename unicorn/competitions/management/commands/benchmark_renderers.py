@@ -0,0 +1,93 @@
+import time
+import tracemalloc
+from datetime import datetime
+
+import pytz
+from accounts.models import User
+from competitions.api import views
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from utilities.permissions import get_anonymous_user
+
+from unicorn.api import FastJSONRenderer
+
+ENDPOINTS = {
+    "competitions": views.CompetitionViewSet,
+    "contributors": views.ContributorViewSet,
+    "entries": views.EntryViewSet,
+}
+
+
+class Command(BaseCommand):
+    help = "Compares time and peak memory of buffered and streamed unlimited (limit=0) list responses"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--endpoint", action="append", choices=list(ENDPOINTS), help="Endpoint to benchmark")
+        parser.add_argument("--user", help="Username to request as, defaults to the anonymous user")
+        parser.add_argument("--repeat", type=int, default=3, help="Number of runs, the fastest one is reported")
+
+    def measure(self, repeat, func):
+        timings, peaks = [], []
+        for _ in range(repeat):
+            tracemalloc.start()
+            started = time.perf_counter()
+            size = func()
+            timings.append(time.perf_counter() - started)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+        return min(timings), min(peaks), size
+
+    def request(self, viewset, user, renderer, streaming):
+        view = viewset.as_view({"get": "list"}, renderer_classes=[renderer])
+        request = APIRequestFactory().get("/", {"limit": 0})
+        force_authenticate(request, user=user)
+
+        with override_settings(LIST_STREAMING_CHUNK_SIZE=100 if streaming else 0):
+            response = view(request)
+            if response.streaming:
+                # consume the stream like a client would, without keeping it around
+                return sum(len(chunk) for chunk in response.streaming_content)
+
+            return len(response.render().content)
+
+    def handle(self, *args, **options):
+        self.stdout.write("=== Starting benchmark_renderers at %s" % datetime.now().replace(tzinfo=pytz.utc))
+
+        if options["user"]:
+            try:
+                user = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError("User %s does not exist" % options["user"])
+        else:
+            user = get_anonymous_user()
+
+        for name in options["endpoint"] or ENDPOINTS:
+            viewset = ENDPOINTS[name]
+            repeat = options["repeat"]
+
+            for label, renderer, streaming in (
+                ("stock renderer", JSONRenderer, False),
+                ("fast renderer", FastJSONRenderer, False),
+                ("fast renderer, streamed", FastJSONRenderer, True),
+            ):
+                elapsed, peak, size = self.measure(repeat, lambda: self.request(viewset, user, renderer, streaming))
+                self.stdout.write(
+                    "+ %s with %s: %d bytes in %.1f ms, peak memory %.1f MiB"
+                    % (name, label, size, elapsed * 1000, peak / 1024 / 1024)
+                )
+
+            # encoding alone, on data which has already been serialized
+            view = viewset.as_view({"get": "list"})
+            request = APIRequestFactory().get("/", {"limit": 0})
+            force_authenticate(request, user=user)
+            with override_settings(LIST_STREAMING_CHUNK_SIZE=0):
+                data = view(request).data
+
+            for label, renderer in (("stock renderer", JSONRenderer()), ("fast renderer", FastJSONRenderer())):
+                elapsed, _, _ = self.measure(repeat, lambda: renderer.render(data))
+                self.stdout.write("+ %s encoded by %s in %.1f ms" % (name, label, elapsed * 1000))
+
+        self.stdout.write("=== Finished at %s" % datetime.now().replace(tzinfo=pytz.utc), ending="\n\n")
@@ -0,0 +1,77 @@
+import time
+from datetime import datetime
+
+import pytz
+from competitions.api import fast_serializers, serializers
+from competitions.models import Competition, Contributor, Entry, File
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from utilities.permissions import AnonymousPermissionChecker, get_anonymous_user
+
+BENCHMARKS = {
+    "competitions": (
+        serializers.CompetitionSerializer,
+        fast_serializers.FastCompetitionSerializer,
+        lambda: Competition.objects.select_related("genre").with_entries_count(),
+    ),
+    "entries": (
+        serializers.EntryVoteSerializer,
+        fast_serializers.FastEntryVoteSerializer,
+        lambda: Entry.objects.select_related("competition").prefetch_related(
+            Prefetch("entry_to_user", queryset=Contributor.objects.select_related("user")),
+            Prefetch("files", queryset=File.objects.filter(active=True), to_attr="active_files"),
+        ),
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the time spent per object by the regular and the fast serializers, using the objects in the database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--serializer", action="append", choices=list(BENCHMARKS), help="Serializer to benchmark")
+        parser.add_argument("--limit", type=int, default=500, help="Number of objects to serialize")
+        parser.add_argument("--repeat", type=int, default=10, help="Number of runs, the fastest one is reported")
+
+    def context(self):
+        request = Request(APIRequestFactory().get("/"))
+        request.user = get_anonymous_user()
+        return {"request": request, "permission_checker": AnonymousPermissionChecker()}
+
+    def measure(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+
+        return min(timings)
+
+    def handle(self, *args, **options):
+        self.stdout.write("=== Starting benchmark_serializers at %s" % datetime.now().replace(tzinfo=pytz.utc))
+
+        for name in options["serializer"] or BENCHMARKS:
+            serializer_class, fast_serializer_class, queryset = BENCHMARKS[name]
+
+            # fetch once, so only serialization is measured
+            objects = list(queryset()[: options["limit"]])
+            rows = list(fast_serializer_class(self.context()).values(queryset())[: options["limit"]])
+            if not objects:
+                self.stdout.write("- No objects to serialize for %s" % name)
+                continue
+
+            regular = self.measure(
+                options["repeat"], lambda: serializer_class(objects, many=True, context=self.context()).data
+            )
+            fast = self.measure(options["repeat"], lambda: fast_serializer_class(self.context()).serialize(rows))
+
+            self.stdout.write(
+                "+ %s: %.1f µs per object regular, %.1f µs per object fast (%.1fx)"
+                % (name, regular / len(objects) * 1e6, fast / len(rows) * 1e6, regular / fast if fast else 0)
+            )
+
+        self.stdout.write("=== Finished at %s" % datetime.now().replace(tzinfo=pytz.utc), ending="\n\n")
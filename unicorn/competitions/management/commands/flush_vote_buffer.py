@@ -0,0 +1,35 @@
+import time
+from datetime import datetime
+
+import pytz
+from competitions.vote_buffer import flush_votes
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Writes votes accepted by the vote buffer to the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Number of ballots written per batch")
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep running, flushing the buffer every INTERVAL seconds",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("=== Starting flush_vote_buffer at %s" % datetime.now().replace(tzinfo=pytz.utc))
+
+        while True:
+            started = time.monotonic()
+            written = flush_votes(batch_size=options["batch_size"])
+            if written:
+                self.stdout.write("+ Wrote %d votes in %.2f seconds" % (written, time.monotonic() - started))
+
+            if not options["interval"]:
+                break
+
+            time.sleep(options["interval"])
+
+        self.stdout.write("=== Finished at %s" % datetime.now().replace(tzinfo=pytz.utc), ending="\n\n")
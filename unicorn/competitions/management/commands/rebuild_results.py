@@ -0,0 +1,32 @@
+from datetime import datetime
+
+import pytz
+from competitions.constants import COMPETITION_STATE_FIN
+from competitions.models import Competition
+from competitions.results import snapshot_results
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the results snapshot of finished competitions, or of the given competitions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("competitions", nargs="*", type=int, help="Competition IDs")
+
+    def handle(self, *args, **options):
+        self.stdout.write("=== Starting rebuild_results at %s" % datetime.now().replace(tzinfo=pytz.utc))
+
+        if options["competitions"]:
+            competitions = Competition.objects.filter(pk__in=options["competitions"])
+        else:
+            competitions = Competition.objects.filter(Q(scoring_complete=True) | Q(state=COMPETITION_STATE_FIN))
+
+        for competition in competitions:
+            snapshot = snapshot_results(competition)
+            self.stdout.write(
+                "+ Rebuilt results for competition %s with %d entries"
+                % (competition.name, len(snapshot.data["entries"]))
+            )
+
+        self.stdout.write("=== Finished at %s" % datetime.now().replace(tzinfo=pytz.utc), ending="\n\n")
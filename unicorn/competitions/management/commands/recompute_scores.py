@@ -0,0 +1,47 @@
+import time
+from datetime import datetime
+
+import pytz
+from competitions.models import Competition, Entry
+from competitions.results import refresh_snapshots
+from competitions.scoring import recompute_scores
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Recomputes vote totals and scores for competitions, syncing jury votes with user roles"
+
+    def add_arguments(self, parser):
+        parser.add_argument("competitions", nargs="*", type=int, help="Competition IDs")
+        parser.add_argument("--all", action="store_true", help="Recompute all competitions")
+        parser.add_argument("--dry-run", action="store_true", help="Only show which scores would change")
+
+    def handle(self, *args, **options):
+        if not options["competitions"] and not options["all"]:
+            raise CommandError("Give one or more competition IDs, or use --all")
+
+        self.stdout.write("=== Starting recompute_scores at %s" % datetime.now().replace(tzinfo=pytz.utc))
+
+        competitions = Competition.objects.all()
+        if not options["all"]:
+            competitions = competitions.filter(pk__in=options["competitions"])
+
+        started = time.monotonic()
+        changes = recompute_scores(competitions.values_list("pk", flat=True), dry_run=options["dry_run"])
+        elapsed = time.monotonic() - started
+
+        entries = Entry.objects.select_related("competition").in_bulk([pk for pk, _, _ in changes])
+        for pk, old, new in changes:
+            entry = entries[pk]
+            self.stdout.write("~ %s in %s: %d -> %d" % (entry.title, entry.competition.name, old, new))
+
+        if options["dry_run"]:
+            self.stdout.write("- Dry run, no changes saved")
+        else:
+            refresh_snapshots(competitions)
+
+        self.stdout.write(
+            "+ Recomputed %d competitions in %.2f seconds, %d scores changed"
+            % (len(competitions), elapsed, len(changes))
+        )
+        self.stdout.write("=== Finished at %s" % datetime.now().replace(tzinfo=pytz.utc), ending="\n\n")
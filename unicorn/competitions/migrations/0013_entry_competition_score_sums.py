@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:07
+
+import math
+
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+
+def backfill_score_sums(apps, schema_editor):
+    Competition = apps.get_model("competitions", "Competition")
+    Entry = apps.get_model("competitions", "Entry")
+    Vote = apps.get_model("competitions", "Vote")
+
+    totals = (
+        Vote.objects.values("entry_id")
+        .annotate(mortal=Sum("score", filter=Q(jury=False)), jury=Sum("score", filter=Q(jury=True)))
+        .order_by()
+    )
+    for row in totals:
+        Entry.objects.filter(pk=row["entry_id"]).update(
+            mortal_score_sum=row["mortal"] or 0, jury_score_sum=row["jury"] or 0
+        )
+
+    totals = (
+        Vote.objects.values("entry__competition_id")
+        .annotate(mortal=Sum("score", filter=Q(jury=False)), jury=Sum("score", filter=Q(jury=True)))
+        .order_by()
+    )
+    for row in totals:
+        Competition.objects.filter(pk=row["entry__competition_id"]).update(
+            mortal_score_sum=row["mortal"] or 0, jury_score_sum=row["jury"] or 0
+        )
+
+    # stored scores may be stale for all but the last voted entry in each competition, so rescore everything once
+    for competition in Competition.objects.exclude(mortal_score_sum=0, jury_score_sum=0):
+        factor = 0.0
+        if competition.jury_score_sum:
+            factor = ((competition.mortal_score_sum / 0.7) * (1 - 0.7)) / competition.jury_score_sum
+        for entry in Entry.objects.filter(competition=competition):
+            entry.score = math.floor((entry.jury_score_sum * factor + entry.mortal_score_sum) + 0.5)
+            entry.save(update_fields=["score"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("competitions", "0012_increase_contrib_info_length"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="competition",
+            name="jury_score_sum",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Sum of jury votes"),
+        ),
+        migrations.AddField(
+            model_name="competition",
+            name="mortal_score_sum",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Sum of regular votes"),
+        ),
+        migrations.AddField(
+            model_name="entry",
+            name="jury_score_sum",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Sum of jury votes"),
+        ),
+        migrations.AddField(
+            model_name="entry",
+            name="mortal_score_sum",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Sum of regular votes"),
+        ),
+        migrations.RunPython(backfill_score_sums, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:04
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("competitions", "0015_cursor_pagination_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="content_hash",
+            field=models.CharField(db_index=True, max_length=64, null=True, verbose_name="Content hash"),
+        ),
+        migrations.AddIndex(
+            model_name="file",
+            index=models.Index(django.db.models.functions.text.Upper("name"), name="file_name_upper_idx"),
+        ),
+    ]
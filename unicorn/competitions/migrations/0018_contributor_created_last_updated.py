@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("competitions", "0017_bufferedballot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contributor",
+            name="created",
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="contributor",
+            name="last_updated",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
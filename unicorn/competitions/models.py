@@ -1,4 +1,3 @@
-import math
 from datetime import datetime
 
 import pytz
@@ -7,7 +6,8 @@ from auditlog.registry import auditlog
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
-from django.db.models import Q, Sum
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Upper
 from django.utils.translation import gettext_lazy as _
 from utilities.models import CreatedUpdatedModel
 from utilities.utils import round_seconds
@@ -36,6 +36,95 @@ class Genre(models.Model):
         return self.name
 
 
+class CompetitionQuerySet(models.QuerySet):
+    def with_entries_count(self):
+        """
+        Count entries in the same query, so Competition.entries_count does not need a query per competition.
+        """
+        entries = (
+            Entry.objects.filter(competition=OuterRef("pk"))
+            .order_by()
+            .values("competition")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        return self.annotate(annotated_entries_count=Coalesce(Subquery(entries), 0))
+
+
+# the schedule next_competition_state() depends on, besides the state
+NEXT_STATE_FIELDS = (
+    "register_time_start",
+    "register_time_end",
+    "run_time_start",
+    "run_time_end",
+    "vote_time_start",
+    "vote_time_end",
+    "show_time_start",
+)
+
+
+# TODO: this function needs refactoring to be less complex
+def next_competition_state(  # noqa: C901
+    state,
+    *,
+    register_time_start,
+    register_time_end,
+    run_time_start,
+    run_time_end,
+    vote_time_start,
+    vote_time_end,
+    show_time_start,
+):
+    """
+    The state a competition with the given schedule moves to after state. Takes the values instead of a competition, so
+    it can be used for rows read with .values() as well.
+    """
+    if state == COMPETITION_STATE_NEW:
+        return COMPETITION_STATE_REG_OPEN if register_time_start else COMPETITION_STATE_RUN
+
+    elif state == COMPETITION_STATE_REG_OPEN:
+        if (run_time_start - register_time_end).seconds > 1:
+            return COMPETITION_STATE_REG_CLOSE
+        else:
+            return COMPETITION_STATE_RUN
+
+    elif state == COMPETITION_STATE_REG_CLOSE:
+        return COMPETITION_STATE_RUN
+
+    elif state == COMPETITION_STATE_RUN:
+        if (vote_time_start and (vote_time_start - run_time_end).seconds > 1) or (
+            show_time_start and (show_time_start - run_time_end).seconds > 1
+        ):
+            return COMPETITION_STATE_CLOSED
+        elif vote_time_start:
+            return COMPETITION_STATE_VOTE
+        elif show_time_start:
+            return COMPETITION_STATE_SHOW
+        else:
+            return COMPETITION_STATE_FIN
+
+    elif state == COMPETITION_STATE_CLOSED:
+        if vote_time_start:
+            return COMPETITION_STATE_VOTE
+        # implicitly means we have a show time start
+        else:
+            return COMPETITION_STATE_SHOW
+
+    elif state == COMPETITION_STATE_VOTE:
+        if show_time_start and (show_time_start - vote_time_end).seconds > 1:
+            return COMPETITION_STATE_VOTE_CLOSED
+        elif show_time_start:
+            return COMPETITION_STATE_SHOW
+        else:
+            return COMPETITION_STATE_FIN
+
+    elif state == COMPETITION_STATE_VOTE_CLOSED:
+        return COMPETITION_STATE_SHOW if show_time_start else COMPETITION_STATE_FIN
+
+    else:
+        return COMPETITION_STATE_FIN
+
+
 class Competition(CreatedUpdatedModel, models.Model):
     event = models.ForeignKey(
         to="core.Event",
@@ -181,6 +270,12 @@ class Competition(CreatedUpdatedModel, models.Model):
         help_text=_("Scoring is completed and the competition is ready for handing out prices"),
     )
 
+    # running vote totals, maintained by competitions.scoring
+    mortal_score_sum = models.PositiveIntegerField(verbose_name=_("Sum of regular votes"), default=0, editable=False)
+    jury_score_sum = models.PositiveIntegerField(verbose_name=_("Sum of jury votes"), default=0, editable=False)
+
+    objects = CompetitionQuerySet.as_manager()
+
     class Meta:
         ordering = ("genre__name", "name")
 
@@ -193,6 +288,9 @@ class Competition(CreatedUpdatedModel, models.Model):
 
     @property
     def entries_count(self) -> int:
+        if hasattr(self, "annotated_entries_count"):
+            return self.annotated_entries_count
+
         return self.entries.filter().count()
 
     @property
@@ -246,54 +344,17 @@ class Competition(CreatedUpdatedModel, models.Model):
     def next_state(self):
         return self.compute_next_state()
 
-    # TODO: this function needs refactoring to be less complex
-    def compute_next_state(self, state=None):  # noqa: C901
-        state = state or self.state
-
-        if state == COMPETITION_STATE_NEW:
-            return COMPETITION_STATE_REG_OPEN if self.register_time_start else COMPETITION_STATE_RUN
-
-        elif state == COMPETITION_STATE_REG_OPEN:
-            if (self.run_time_start - self.register_time_end).seconds > 1:
-                return COMPETITION_STATE_REG_CLOSE
-            else:
-                return COMPETITION_STATE_RUN
-
-        elif state == COMPETITION_STATE_REG_CLOSE:
-            return COMPETITION_STATE_RUN
-
-        elif state == COMPETITION_STATE_RUN:
-            if (self.vote_time_start and (self.vote_time_start - self.run_time_end).seconds > 1) or (
-                self.show_time_start and (self.show_time_start - self.run_time_end).seconds > 1
-            ):
-                return COMPETITION_STATE_CLOSED
-            elif self.vote_time_start:
-                return COMPETITION_STATE_VOTE
-            elif self.show_time_start:
-                return COMPETITION_STATE_SHOW
-            else:
-                return COMPETITION_STATE_FIN
-
-        elif state == COMPETITION_STATE_CLOSED:
-            if self.vote_time_start:
-                return COMPETITION_STATE_VOTE
-            # implicitly means we have a show time start
-            else:
-                return COMPETITION_STATE_SHOW
-
-        elif state == COMPETITION_STATE_VOTE:
-            if self.show_time_start and (self.show_time_start - self.vote_time_end).seconds > 1:
-                return COMPETITION_STATE_VOTE_CLOSED
-            elif self.show_time_start:
-                return COMPETITION_STATE_SHOW
-            else:
-                return COMPETITION_STATE_FIN
-
-        elif state == COMPETITION_STATE_VOTE_CLOSED:
-            return COMPETITION_STATE_SHOW if self.show_time_start else COMPETITION_STATE_FIN
-
-        else:
-            return COMPETITION_STATE_FIN
+    def compute_next_state(self, state=None):
+        return next_competition_state(
+            state or self.state,
+            register_time_start=self.register_time_start,
+            register_time_end=self.register_time_end,
+            run_time_start=self.run_time_start,
+            run_time_end=self.run_time_end,
+            vote_time_start=self.vote_time_start,
+            vote_time_end=self.vote_time_end,
+            show_time_start=self.show_time_start,
+        )
 
     # TODO: this function needs refactoring to be less complex
     def clean(self):  # noqa: C901
@@ -381,6 +442,27 @@ class Competition(CreatedUpdatedModel, models.Model):
 
         # run parent logic
         super(Competition, self).save(*args, **kwargs)
+        self.remember_stored_state()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Competition, cls).from_db(db, field_names, values)
+        instance.remember_stored_state()
+        return instance
+
+    def remember_stored_state(self):
+        """
+        Keep track of the stored state, scoring and publishing status, so post_save signals can tell what changed.
+        """
+        self._stored_state = (
+            self.__dict__.get("state"),
+            self.__dict__.get("scoring_complete"),
+            self.__dict__.get("published"),
+        )
+
+    @property
+    def stored_state(self):
+        return getattr(self, "_stored_state", (None, False, False))
 
 
 auditlog.register(Competition)
@@ -444,8 +526,14 @@ class Entry(CreatedUpdatedModel, models.Model):
     comment = models.TextField(verbose_name=_("Comment"), blank=True, null=True, default=None)
     score = models.PositiveSmallIntegerField(verbose_name=_("Score"), default=0, help_text=_("Between 0 and 32767"))
 
+    # running vote totals, maintained by competitions.scoring
+    mortal_score_sum = models.PositiveIntegerField(verbose_name=_("Sum of regular votes"), default=0, editable=False)
+    jury_score_sum = models.PositiveIntegerField(verbose_name=_("Sum of jury votes"), default=0, editable=False)
+
     class Meta:
         ordering = ("order", "title")
+        # keys for cursor pagination, see EntryViewSet
+        indexes = (models.Index(fields=("order", "title", "id"), name="entry_cursor_idx"),)
         verbose_name_plural = "entries"
         permissions = (("view_entry_crewmsg", "View information for crew in Entry"),)
 
@@ -455,17 +543,38 @@ class Entry(CreatedUpdatedModel, models.Model):
             "competition": self.competition.name,
         }
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Entry, cls).from_db(db, field_names, values)
+        instance.remember_stored_status()
+        return instance
+
+    def remember_stored_status(self):
+        """
+        Keep track of the stored status, so post_save signals can tell whether it changed.
+        """
+        self._stored_status = self.__dict__.get("status")
+
+    @property
+    def stored_status(self):
+        return getattr(self, "_stored_status", None)
+
     @property
     def contributor_count(self) -> int:
         return self.contributors.filter().count()
 
     def update_score(self):
-        self.score = self.votesum()
-        self.save()
+        from .scoring import rescore_competition
+
+        rescore_competition(self.competition_id)
+        self.refresh_from_db(fields=["score", "mortal_score_sum", "jury_score_sum"])
 
     def votesum(self) -> float:
-        mortal_weight = 0.7
-        jury_weight = 1 - mortal_weight
+        """
+        Calculate the score for this entry straight from the Vote table. This is the reference implementation for the
+        incremental scoring in competitions.scoring, and is too expensive to run for every vote.
+        """
+        from .scoring import calculate_score
 
         # Sum up the vote scores from non-jury votes on this entry, and return 0 if there is none
         mortal_score = Vote.objects.filter(Q(entry=self), Q(jury=False)).aggregate(Sum("score"))["score__sum"] or 0
@@ -487,11 +596,10 @@ class Entry(CreatedUpdatedModel, models.Model):
         # Calculate the vote score from jury votes on this entry
         if jury_sum:
             jury_self = Vote.objects.filter(Q(entry=self), Q(jury=True)).aggregate(Sum("score"))["score__sum"] or 0
-            jury_score = jury_self * (((mortal_sum / mortal_weight) * jury_weight) / jury_sum)
         else:
-            jury_score = 0
+            jury_self = 0
 
-        return math.floor((jury_score + mortal_score) + 0.5)
+        return calculate_score(mortal_score, jury_self, mortal_sum, jury_sum)
 
     def validate_contributors(self) -> bool:
         if self.contributor_count < 1 or (
@@ -527,7 +635,7 @@ class Entry(CreatedUpdatedModel, models.Model):
             raise ValidationError(errors)
 
 
-class Contributor(models.Model):
+class Contributor(CreatedUpdatedModel, models.Model):
     entry = models.ForeignKey(
         verbose_name=_("Entry"),
         to="Entry",
@@ -598,9 +706,12 @@ class File(CreatedUpdatedModel, models.Model):
         verbose_name=_("Status"), choices=FILE_STATUS_CHOICES, default=FILE_STATUS_NEW
     )
     active = models.BooleanField(verbose_name=_("Active"), default=True)
+    # SHA-256 block hash of the content, shared with every other file with the same content, see zoodo_utils.tus.blobs
+    content_hash = models.CharField(verbose_name=_("Content hash"), max_length=64, null=True, db_index=True)
 
     class Meta:
         ordering = ("entry", "type", "-active", "name")
+        indexes = (models.Index(Upper("name"), name="file_name_upper_idx"),)
 
     def __str__(self):
         return self.name
@@ -656,6 +767,23 @@ class Vote(models.Model):
     class Meta:
         unique_together = ("entry", "user")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Vote, cls).from_db(db, field_names, values)
+        instance.remember_score_state()
+        return instance
+
+    def remember_score_state(self):
+        """
+        Keep track of what this vote currently contributes to the score totals, so the scoring engine can apply the
+        difference when the vote is changed or deleted.
+        """
+        self._score_state = (self.__dict__.get("entry_id"), self.__dict__.get("score"), self.__dict__.get("jury"))
+
+    @property
+    def score_state(self):
+        return getattr(self, "_score_state", None)
+
     def clean(self):
         errors = {}
         try:
@@ -694,3 +822,43 @@ class Vote(models.Model):
             using=using,
             update_fields=update_fields,
         )
+
+
+class BufferedBallot(models.Model):
+    """
+    A validated ballot accepted by the vote buffer, waiting to be written as votes. See competitions.vote_buffer.
+    """
+
+    user = models.ForeignKey(verbose_name=_("User"), to="accounts.User", related_name="+", on_delete=models.CASCADE)
+    competition = models.ForeignKey(
+        verbose_name=_("Competition"), to="Competition", related_name="+", on_delete=models.CASCADE
+    )
+    scores = models.JSONField(verbose_name=_("Scores"))
+    created = models.DateTimeField(auto_now_add=True)
+
+    # set when writing the ballot failed, it is kept for inspection and not retried
+    failed = models.DateTimeField(verbose_name=_("Failed"), null=True)
+    error = models.TextField(verbose_name=_("Error"), blank=True)
+
+    class Meta:
+        indexes = (models.Index(fields=("user", "competition"), name="bufferedballot_user_idx"),)
+
+    def __str__(self):
+        return f"{self.user_id} in {self.competition_id}"
+
+
+class ResultsSnapshot(CreatedUpdatedModel, models.Model):
+    """
+    Final results of a competition, stored as served by the results endpoint. See competitions.results.
+    """
+
+    competition = models.OneToOneField(
+        verbose_name=_("Competition"),
+        to="Competition",
+        related_name="results_snapshot",
+        on_delete=models.CASCADE,
+    )
+    data = models.JSONField(verbose_name=_("Results"))
+
+    def __str__(self):
+        return str(self.competition)
@@ -0,0 +1,192 @@
+import logging
+
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import CharField, Exists, F, OuterRef, Value
+from django.db.models.functions import Cast, Concat
+from guardian.utils import get_group_obj_perms_model, get_user_obj_perms_model
+from utilities.metrics import increment
+from utilities.permissions import bulk_assign_perms, bulk_remove_perms, sync_user_perms
+from utilities.reference import get_group
+from utilities.visibility import invalidate_object_permissions
+
+from .constants import ENTRY_STATUS_QUALIFIED
+from .models import Competition, Contributor, Entry, File, Vote
+
+logger = logging.getLogger(__name__)
+
+COMPETITION_CODENAMES = ("view_competition", "change_competition", "delete_competition")
+CONTRIBUTOR_CODENAMES = ("view_contributor", "change_contributor", "delete_contributor")
+ENTRY_CODENAMES = ("view_entry", "change_entry", "delete_entry")
+FILE_CODENAMES = ("change_file", "delete_file")
+VOTE_CODENAMES = ("view_vote", "change_vote", "delete_vote")
+
+COMPOADMIN_GROUP_PREFIX = "p-compoadmin-"
+
+# object permissions every object should have, as (model, codenames, holder, field) where the holder is either the
+# compoadmin group of the genre category in field, or the user in field. Mirrors the permissions assigned by signals.
+BACKFILL_RULES = {
+    "competition": (Competition, COMPETITION_CODENAMES, "group", "genre__category"),
+    "entry": (Entry, ENTRY_CODENAMES, "group", "competition__genre__category"),
+    "contributor": (Contributor, CONTRIBUTOR_CODENAMES, "group", "entry__competition__genre__category"),
+    "file": (File, FILE_CODENAMES, "user", "uploader_id"),
+    "vote": (Vote, VOTE_CODENAMES, "user", "user_id"),
+}
+
+
+def sync_contributor_permissions(entry: Entry) -> int:
+    """
+    Bring the object permissions of an entry's contributors in line with the team:
+
+    - all contributors can view the entry and each other
+    - contributors can change and delete themselves
+    - the owner can change and delete the entry and all contributors
+
+    Only permissions of current contributors are touched, and only the difference is written.
+
+    :returns: The number of permission rows inserted or deleted
+    """
+    contributors = list(Contributor.objects.filter(entry=entry))
+    owners = {c.user_id for c in contributors if c.is_owner}
+
+    desired = set()
+    for contributor in contributors:
+        desired.add((contributor.user_id, "view_entry", entry))
+        for codename in ("change_contributor", "delete_contributor"):
+            desired.add((contributor.user_id, codename, contributor))
+            desired.update((owner, codename, contributor) for owner in owners)
+
+        desired.update((other.user_id, "view_contributor", contributor) for other in contributors)
+
+    for owner in owners:
+        desired.add((owner, "change_entry", entry))
+        desired.add((owner, "delete_entry", entry))
+
+    return sync_user_perms(
+        desired,
+        user_ids={c.user_id for c in contributors},
+        objects=[entry, *contributors],
+        codenames=CONTRIBUTOR_CODENAMES + ENTRY_CODENAMES,
+    )
+
+
+def sync_voting_permissions(competition: Competition, voting_open: bool) -> int:
+    """
+    Let participants view the qualified entries of a competition while voting is open, and revoke it again when voting
+    closes. Meant to be called on transitions only, since it writes all entries of the competition in one go.
+
+    :returns: The number of permission rows inserted or deleted
+    """
+    group = get_group("p-participant")
+
+    if voting_open:
+        entries = list(competition.entries.filter(status=ENTRY_STATUS_QUALIFIED))
+        rows = (
+            len(entries)
+            - get_group_obj_perms_model(Entry)
+            .objects.filter(
+                group=group,
+                permission__codename="view_entry",
+                content_type=ContentType.objects.get_for_model(Entry),
+                object_pk__in=[str(entry.pk) for entry in entries],
+            )
+            .count()
+        )
+        bulk_assign_perms(["view_entry"], group, entries)
+    else:
+        # entries may have been disqualified while voting was open, so revoke from all of them
+        rows = bulk_remove_perms(["view_entry"], group, competition.entries.all())
+
+    logger.info(
+        "Voting %s for competition %s, %d permissions changed", "opened" if voting_open else "closed", competition, rows
+    )
+    increment("voting_permission_rows", rows)
+    return rows
+
+
+def sync_entry_voting_permissions(entry: Entry, voting_open: bool) -> int:
+    """
+    Let participants view a single entry while voting is open and it's qualified, for entries whose status changes
+    while voting is already open.
+
+    :returns: The number of permission rows inserted or deleted
+    """
+    group = get_group("p-participant")
+
+    if voting_open and entry.status == ENTRY_STATUS_QUALIFIED:
+        rows = len(bulk_assign_perms(["view_entry"], group, [entry]))
+    else:
+        rows = bulk_remove_perms(["view_entry"], group, [entry])
+
+    increment("voting_permission_rows", rows)
+    return rows
+
+
+def _missing_permissions(perms_model, model, codenames, holder, field, chunk_size):
+    """
+    Yield the guardian rows missing for all objects of a model according to a backfill rule, reading the objects and
+    which of the permissions they already have in a single query.
+    """
+    ctype = ContentType.objects.get_for_model(model)
+    permissions = dict(
+        Permission.objects.filter(content_type=ctype, codename__in=codenames).values_list("codename", "pk")
+    )
+
+    if holder == "group":
+        identity = Concat(Value(COMPOADMIN_GROUP_PREFIX), F(field), output_field=CharField())
+        holders = dict(Group.objects.filter(name__startswith=COMPOADMIN_GROUP_PREFIX).values_list("name", "pk"))
+        lookup = "group__name"
+    else:
+        identity = F(field)
+        holders = None
+        lookup = "user_id"
+
+    existing = perms_model.objects.filter(content_type=ctype, object_pk=Cast(OuterRef("pk"), CharField()))
+    has = {
+        f"has_{codename}": Exists(existing.filter(permission_id=pk, **{lookup: OuterRef("holder")}))
+        for codename, pk in permissions.items()
+    }
+
+    objects = (
+        model.objects.annotate(holder=identity, **has)
+        .exclude(holder=None)
+        .order_by("pk")
+        .values_list("pk", "holder", *has.keys())
+    )
+    for pk, holder_id, *found in objects.iterator(chunk_size=chunk_size):
+        if holders is not None:
+            if holder_id not in holders:
+                logger.warning("Group %s does not exist, skipping %s %s", holder_id, model._meta.model_name, pk)
+                continue
+            identity_kwargs = {"group_id": holders[holder_id]}
+        else:
+            identity_kwargs = {"user_id": holder_id}
+
+        for permission_id, exists in zip(permissions.values(), found):
+            if not exists:
+                yield perms_model(permission_id=permission_id, content_type=ctype, object_pk=str(pk), **identity_kwargs)
+
+
+def backfill_object_permissions(name, batch_size=1000) -> int:
+    """
+    Insert the object permissions missing according to BACKFILL_RULES[name] in batches, without sending signals.
+
+    :returns: The number of inserted permissions
+    """
+    model, codenames, holder, field = BACKFILL_RULES[name]
+    perms_model = get_group_obj_perms_model(model) if holder == "group" else get_user_obj_perms_model(model)
+
+    created = 0
+    batch = []
+    for row in _missing_permissions(perms_model, model, codenames, holder, field, batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            created += len(perms_model.objects.bulk_create(batch, ignore_conflicts=True))
+            batch = []
+
+    if batch:
+        created += len(perms_model.objects.bulk_create(batch, ignore_conflicts=True))
+
+    if created:
+        invalidate_object_permissions(model)
+    return created
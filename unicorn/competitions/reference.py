@@ -0,0 +1,27 @@
+from core.models import Event
+from utilities.reference import cached_reference
+
+from .models import Genre
+
+
+def get_genre(pk) -> Genre:
+    """
+    Look up a genre from the process cache, raising Genre.DoesNotExist for unknown ids like Genre.objects.get().
+    """
+    genres = cached_reference("genres", [Genre], lambda: Genre.objects.in_bulk())
+    try:
+        return genres[pk]
+    except KeyError:
+        raise Genre.DoesNotExist(f"Genre {pk} does not exist")
+
+
+def genre_choices():
+    return cached_reference("genre-choices", [Genre], lambda: [(genre.pk, str(genre)) for genre in Genre.objects.all()])
+
+
+def visible_event_choices():
+    return cached_reference(
+        "visible-event-choices",
+        [Event],
+        lambda: [(event.pk, str(event)) for event in Event.objects.filter(visible=True)],
+    )
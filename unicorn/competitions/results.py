@@ -0,0 +1,87 @@
+import re
+
+from django.db.models import Prefetch, prefetch_related_objects
+
+from .constants import ENTRY_STATUS_QUALIFIED
+from .models import Contributor, Entry, ResultsSnapshot
+
+# uuid in display names of users with default nick from new-style GE, which still use "aka" style display names
+DEFAULT_NICK_RE = re.compile(r"\saka\.\s[0-9a-f]{8}-[0-9a-f]{4}-[1-5][0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}")
+
+
+def clean_display_name(name) -> str:
+    return DEFAULT_NICK_RE.sub("", name)
+
+
+def results_entries():
+    return (
+        Entry.objects.filter(status=ENTRY_STATUS_QUALIFIED)
+        .order_by("-score", "order")
+        .prefetch_related(
+            Prefetch(
+                "entry_to_user",
+                queryset=Contributor.objects.filter(is_owner=True).select_related("user"),
+                to_attr="owners",
+            )
+        )
+    )
+
+
+def prefetch_results(competitions):
+    """
+    Prefetch the entries of the given competitions which have to be built live, as they have no results snapshot.
+    """
+    live = [competition for competition in competitions if not hasattr(competition, "results_snapshot")]
+    if live:
+        prefetch_related_objects(live, Prefetch("entries", queryset=results_entries(), to_attr="results_entries"))
+
+
+def build_results(competition) -> dict:
+    """
+    Build the results document of a competition, in the format of ResultsSerializer.
+    """
+    if hasattr(competition, "results_entries"):
+        entries = competition.results_entries
+    else:
+        entries = results_entries().filter(competition=competition)
+
+    return {
+        "name": competition.name,
+        "entries_count": competition.entries_count,
+        "entries": [
+            {
+                "title": entry.title,
+                "owner": clean_display_name(entry.owners[0].user.display_name) if entry.owners else "",
+                "score": entry.score,
+            }
+            for entry in entries
+        ],
+    }
+
+
+def snapshot_results(competition) -> ResultsSnapshot:
+    """
+    Store the current results of a competition, replacing any existing snapshot.
+    """
+    snapshot, _ = ResultsSnapshot.objects.update_or_create(
+        competition=competition, defaults={"data": build_results(competition)}
+    )
+    return snapshot
+
+
+def get_results(competition) -> dict:
+    """
+    Return the results snapshot of a competition if there is one, and otherwise build the results live.
+    """
+    try:
+        return competition.results_snapshot.data
+    except ResultsSnapshot.DoesNotExist:
+        return build_results(competition)
+
+
+def refresh_snapshots(competitions):
+    """
+    Rebuild existing results snapshots of the given competitions, e.g. after scores have been corrected.
+    """
+    for competition in competitions.filter(results_snapshot__isnull=False):
+        snapshot_results(competition)
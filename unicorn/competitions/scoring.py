@@ -0,0 +1,202 @@
+import math
+from collections import defaultdict
+
+from accounts.constants import USER_ROLE_JURY
+from django.db import transaction
+from django.db.models import (
+    Case,
+    F,
+    FloatField,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast, Coalesce, Floor
+from django.utils import timezone
+from utilities.response_cache import invalidate_responses
+
+from .constants import SCORE_JURY_WEIGHT, SCORE_MORTAL_WEIGHT
+from .models import Competition, Entry, Vote
+
+
+def jury_factor(mortal_sum, jury_sum) -> float:
+    """
+    Factor used to normalise jury votes, so that the jury as a whole carries SCORE_JURY_WEIGHT of the total score.
+    """
+    if not jury_sum:
+        return 0.0
+
+    return ((mortal_sum / SCORE_MORTAL_WEIGHT) * SCORE_JURY_WEIGHT) / jury_sum
+
+
+def calculate_score(mortal_self, jury_self, mortal_sum, jury_sum) -> int:
+    """
+    Calculate the score of a single entry from its own vote totals and the vote totals of its competition.
+    """
+    return math.floor((jury_self * jury_factor(mortal_sum, jury_sum) + mortal_self) + 0.5)
+
+
+def score_expression(mortal_sum, jury_sum):
+    """
+    Build a database expression equivalent to calculate_score() for all entries in a competition with the given totals.
+    """
+    factor = Value(jury_factor(mortal_sum, jury_sum), output_field=FloatField())
+    return Cast(
+        Floor(F("jury_score_sum") * factor + F("mortal_score_sum") + Value(0.5, output_field=FloatField())),
+        IntegerField(),
+    )
+
+
+def rescore_competition(competition_id) -> int:
+    """
+    Rewrite the score of every entry in a competition from the stored vote totals, using a single UPDATE. Only entries
+    whose score actually changed are touched. Returns the number of updated entries.
+    """
+    mortal_sum, jury_sum = Competition.objects.values_list("mortal_score_sum", "jury_score_sum").get(pk=competition_id)
+    score = score_expression(mortal_sum, jury_sum)
+
+    updated = (
+        Entry.objects.filter(competition_id=competition_id)
+        .exclude(score=score)
+        .update(score=score, last_updated=timezone.now())
+    )
+    if updated:
+        # update() doesn't send signals. Only responses rendering scores are affected, not every one listing entries.
+        invalidate_responses(Entry, field="score")
+
+    return updated
+
+
+def apply_vote_deltas(competition_id, deltas, rescore=True) -> int:
+    """
+    Apply changes in vote totals to entries in a competition, and rescore the competition.
+
+    :param competition_id: The competition all the entries belong to
+    :param deltas: A dict of entry id to a (mortal delta, jury delta) tuple
+    :param rescore: Set to False when applying many deltas in a batch, and call rescore_competition() afterwards
+    """
+    deltas = {pk: (mortal, jury) for pk, (mortal, jury) in deltas.items() if mortal or jury}
+    if not deltas:
+        return 0
+
+    mortal_total = sum(mortal for mortal, _ in deltas.values())
+    jury_total = sum(jury for _, jury in deltas.values())
+
+    with transaction.atomic():
+        # the competition row is updated first and works as a lock, serializing concurrent score updates within the
+        # same competition. Entries are then locked in pk order, so ballots spanning competitions can't deadlock.
+        Competition.objects.filter(pk=competition_id).update(
+            mortal_score_sum=F("mortal_score_sum") + mortal_total,
+            jury_score_sum=F("jury_score_sum") + jury_total,
+        )
+
+        list(Entry.objects.select_for_update().filter(pk__in=deltas.keys()).order_by("pk").values_list("pk"))
+        Entry.objects.filter(pk__in=deltas.keys()).update(
+            mortal_score_sum=F("mortal_score_sum")
+            + Case(*[When(pk=pk, then=Value(d[0])) for pk, d in deltas.items()], default=Value(0)),
+            jury_score_sum=F("jury_score_sum")
+            + Case(*[When(pk=pk, then=Value(d[1])) for pk, d in deltas.items()], default=Value(0)),
+        )
+
+        if not rescore:
+            return 0
+
+        return rescore_competition(competition_id)
+
+
+def _split(score, jury):
+    return (0, score) if jury else (score, 0)
+
+
+def record_vote_saved(vote, created=False):
+    """
+    Update vote totals and scores after a vote has been created or changed.
+    """
+    deltas = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+
+    previous = None if created else vote.score_state
+    if previous and previous[0] is not None:
+        entry_id, score, is_jury = previous
+        mortal, jury = _split(score, is_jury)
+        competition_id = (
+            vote.entry.competition_id
+            if entry_id == vote.entry_id
+            else Entry.objects.values_list("competition_id", flat=True).get(pk=entry_id)
+        )
+        deltas[competition_id][entry_id][0] -= mortal
+        deltas[competition_id][entry_id][1] -= jury
+
+    mortal, jury = _split(vote.score, vote.jury)
+    deltas[vote.entry.competition_id][vote.entry_id][0] += mortal
+    deltas[vote.entry.competition_id][vote.entry_id][1] += jury
+
+    # always in the same order, see apply_vote_deltas()
+    for competition_id, entries in sorted(deltas.items()):
+        apply_vote_deltas(competition_id, entries)
+
+    vote.remember_score_state()
+
+
+def record_vote_deleted(vote):
+    """
+    Update vote totals and scores after a vote has been deleted.
+    """
+    entry_id, score, is_jury = vote.score_state or (vote.entry_id, vote.score, vote.jury)
+    mortal, jury = _split(score, is_jury)
+
+    competition_id = Entry.objects.filter(pk=entry_id).values_list("competition_id", flat=True).first()
+    if competition_id is None:
+        # the entry is gone as well, so there is nothing left to score
+        return
+
+    apply_vote_deltas(competition_id, {entry_id: (-mortal, -jury)})
+
+
+def _sum_of_votes(votes, group, jury):
+    total = votes.filter(jury=jury).order_by().values(group).annotate(total=Sum("score")).values("total")
+    return Coalesce(Subquery(total), 0)
+
+
+def recompute_scores(competition_ids, dry_run=False):
+    """
+    Rebuild the vote totals and scores of competitions from scratch, after syncing the jury flag of every vote with the
+    current role of the voter. This runs a fixed number of queries per competition and does not fire any signals.
+
+    :param dry_run: Roll back all changes when done
+    :returns: A list of (entry id, old score, new score) for every entry whose score changed
+    """
+    competition_ids = list(competition_ids)
+
+    with transaction.atomic():
+        entries = Entry.objects.filter(competition_id__in=competition_ids)
+        before = dict(entries.values_list("pk", "score"))
+
+        votes = Vote.objects.filter(entry__competition_id__in=competition_ids)
+        votes.filter(user__role=USER_ROLE_JURY, jury=False).update(jury=True)
+        votes.exclude(user__role=USER_ROLE_JURY).filter(jury=True).update(jury=False)
+
+        entry_votes = Vote.objects.filter(entry=OuterRef("pk"))
+        entries.update(
+            mortal_score_sum=_sum_of_votes(entry_votes, "entry", False),
+            jury_score_sum=_sum_of_votes(entry_votes, "entry", True),
+        )
+
+        competition_votes = Vote.objects.filter(entry__competition=OuterRef("pk"))
+        Competition.objects.filter(pk__in=competition_ids).update(
+            mortal_score_sum=_sum_of_votes(competition_votes, "entry__competition", False),
+            jury_score_sum=_sum_of_votes(competition_votes, "entry__competition", True),
+        )
+
+        for competition_id in competition_ids:
+            rescore_competition(competition_id)
+
+        after = dict(entries.values_list("pk", "score"))
+        changes = [(pk, before[pk], after[pk]) for pk in sorted(after) if before.get(pk) != after[pk]]
+
+        if dry_run:
+            transaction.set_rollback(True)
+
+    return changes
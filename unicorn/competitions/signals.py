@@ -1,23 +1,45 @@
 from competitions.constants import (
+    COMPETITION_STATE_FIN,
     COMPETITION_STATE_VOTE,
     COMPETITION_VISIBILITY_CREW,
     COMPETITION_VISIBILITY_HIDDEN,
     COMPETITION_VISIBILITY_PUBLIC,
     ENTRY_STATUS_QUALIFIED,
 )
-from competitions.models import Competition, Contributor, Entry, File, Vote
+from competitions.models import (
+    Competition,
+    Contributor,
+    Entry,
+    File,
+    Genre,
+    ResultsSnapshot,
+    Vote,
+)
+from competitions.permissions import (
+    sync_contributor_permissions,
+    sync_entry_voting_permissions,
+    sync_voting_permissions,
+)
+from competitions.reference import get_genre
+from competitions.results import refresh_snapshots, snapshot_results
+from competitions.scoring import record_vote_deleted, record_vote_saved
+from core.models import Event
 from django.contrib.auth.models import Group
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from guardian.shortcuts import assign_perm, remove_perm
+from utilities.reference import get_group, invalidate_reference
+from utilities.response_cache import invalidate_responses
+from zoodo_utils.tus.blobs import release_blob
 from zoodo_utils.tus.signals import tus_upload_finished_signal
 from zoodo_utils.tus.views import TusUpload
 
 
 @receiver(post_save, sender=Competition)
 def add_competition_view_published(sender, instance, created, **kwargs):
-    anon = Group.objects.get(name="p-anonymous")
-    crew = Group.objects.get(name="p-crew")
+    anon = get_group("p-anonymous")
+    crew = get_group("p-crew")
 
     # if visibility is set to hidden, we remove crew and anon permissions
     # regardless if the action is publish or unpublish
@@ -48,7 +70,7 @@ def add_competition_view_published(sender, instance, created, **kwargs):
 def assure_compoadmin_permissions(sender, instance, created, **kwargs):
     if created:
         try:
-            group = Group.objects.get(name="p-compoadmin-{}".format(str(instance.genre.category)))
+            group = get_group("p-compoadmin-{}".format(str(get_genre(instance.genre_id).category)))
             assign_perm("view_competition", group, instance)
             assign_perm("change_competition", group, instance)
             assign_perm("delete_competition", group, instance)
@@ -60,7 +82,7 @@ def assure_compoadmin_permissions(sender, instance, created, **kwargs):
 def assure_compoadmin_entry_permissions(sender, instance, created, **kwargs):
     if created:
         try:
-            group = Group.objects.get(name="p-compoadmin-{}".format(str(instance.competition.genre.category)))
+            group = get_group("p-compoadmin-{}".format(str(get_genre(instance.competition.genre_id).category)))
             assign_perm("view_entry", group, instance)
             assign_perm("change_entry", group, instance)
             assign_perm("delete_entry", group, instance)
@@ -72,7 +94,7 @@ def assure_compoadmin_entry_permissions(sender, instance, created, **kwargs):
 def assure_compoadmin_contributor_permissions(sender, instance, created, **kwargs):
     if created:
         try:
-            group = Group.objects.get(name="p-compoadmin-{}".format(str(instance.entry.competition.genre.category)))
+            group = get_group("p-compoadmin-{}".format(str(get_genre(instance.entry.competition.genre_id).category)))
             assign_perm("view_contributor", group, instance)
             assign_perm("change_contributor", group, instance)
             assign_perm("delete_contributor", group, instance)
@@ -81,59 +103,30 @@ def assure_compoadmin_contributor_permissions(sender, instance, created, **kwarg
 
 
 @receiver(post_save, sender=Contributor)
-def contributor_permissions(instance, created, **kwargs):
-    # find all other contributors in our entry
-    theothers = Contributor.objects.filter(entry=instance.entry)
-    if instance.pk:
-        theothers = theothers.exclude(pk=instance.pk)
-
-    # remove our permissions towards other contributors if we are not the owner anymore
-    if not instance.is_owner:
-        for contrib in theothers:
-            remove_perm("change_contributor", instance.user, contrib)
-            remove_perm("delete_contributor", instance.user, contrib)
-
-    # grant view permissions to all
-    assign_perm("view_contributor", instance.user, instance)
-    for contrib in theothers:
-        assign_perm("view_contributor", contrib.user, instance)
-
-    # grant modify permissions to ourselves
-    assign_perm("change_contributor", instance.user, instance)
-    assign_perm("delete_contributor", instance.user, instance)
-
-    # grant modify permissions to the owner on all contributors in this entry
-    try:
-        owner = Contributor.objects.get(entry=instance.entry, is_owner=True)
-    except Contributor.DoesNotExist:
-        return
-    all_contributors = Contributor.objects.filter(entry=instance.entry)
-    for contrib in all_contributors:
-        assign_perm("change_contributor", owner.user, contrib)
-        assign_perm("delete_contributor", owner.user, contrib)
+def contributor_permissions(instance, **kwargs):
+    sync_contributor_permissions(instance.entry)
 
 
-@receiver(post_save, sender=Contributor)
-def adjust_entry_permissions_for_contributor(sender, instance, created, **kwargs):
-    # all contributors can see the entry
-    assign_perm("view_entry", instance.user, instance.entry)
-
-    # only owners can modify it
-    if instance.is_owner:
-        assign_perm("change_entry", instance.user, instance.entry)
-        assign_perm("delete_entry", instance.user, instance.entry)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_reference_data(sender, **kwargs):
+    invalidate_reference(sender)
 
-        # remove from all other contributors
-        theothers = Contributor.objects.filter(entry=instance.entry)
-        theothers = theothers.exclude(pk=instance.pk)
-        for contrib in theothers:
-            remove_perm("change_entry", contrib.user, instance.entry)
-            remove_perm("delete_entry", contrib.user, instance.entry)
 
-    # remove permissions for anyone else which might have these permissions
-    else:
-        remove_perm("change_entry", instance.user, instance.entry)
-        remove_perm("delete_entry", instance.user, instance.entry)
+@receiver(post_save, sender=Competition)
+@receiver(post_delete, sender=Competition)
+@receiver(post_save, sender=Entry)
+@receiver(post_delete, sender=Entry)
+@receiver(post_save, sender=ResultsSnapshot)
+@receiver(post_delete, sender=ResultsSnapshot)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_cached_responses(sender, **kwargs):
+    invalidate_responses(sender)
 
 
 @receiver(tus_upload_finished_signal, sender=TusUpload)
@@ -150,6 +143,7 @@ def register_file_upload(sender, **kwargs):
     f.file.name = data["hash"]
     f.name = data["name"]
     f.mime = data["type"]
+    f.content_hash = kwargs.get("content_hash")
 
     # then add the info we need for association elsewhere
     f.type = kwargs.get("type")
@@ -162,6 +156,15 @@ def register_file_upload(sender, **kwargs):
     f.save()
 
 
+@receiver(post_delete, sender=File)
+def release_file_content(sender, instance, **kwargs):
+    # the file itself is only a link to the blob, which is deleted with the last file referring to it. Both are only
+    # removed from disk once the deletion is committed, a rollback would leave the file pointing at nothing otherwise.
+    if instance.content_hash:
+        transaction.on_commit(lambda: instance.file.delete(save=False))
+        release_blob(instance.content_hash)
+
+
 @receiver(post_save, sender=Vote)
 def add_vote_object_permissions(sender, instance, **kwargs):
     assign_perm("view_vote", instance.user, instance)
@@ -170,22 +173,67 @@ def add_vote_object_permissions(sender, instance, **kwargs):
 
 
 @receiver(post_save, sender=Vote)
-def recalculate_entry_score(sender, instance, **kwargs):
-    instance.entry.update_score()
+def recalculate_entry_score(sender, instance, created, **kwargs):
+    record_vote_saved(instance, created=created)
+
+
+@receiver(post_delete, sender=Vote)
+def recalculate_entry_score_on_delete(sender, instance, **kwargs):
+    record_vote_deleted(instance)
 
 
 @receiver(post_save, sender=Competition)
 def update_entry_permissions_for_voting(instance: Competition, **kwargs):
-    if not instance.published:
-        return
+    state, _, published = instance.stored_state
 
-    g = Group.objects.get(name="p-participant")
-    entries = instance.entries.filter(status=ENTRY_STATUS_QUALIFIED)
+    was_open = published and state == COMPETITION_STATE_VOTE
+    is_open = instance.published and instance.state == COMPETITION_STATE_VOTE
+    if was_open != is_open:
+        sync_voting_permissions(instance, is_open)
 
-    if entries.exists():
-        if instance.state == COMPETITION_STATE_VOTE:
-            for entry in entries:
-                assign_perm("view_entry", g, entry)
-        else:
-            for entry in entries:
-                remove_perm("view_entry", g, entry)
+
+@receiver(post_save, sender=Entry)
+def update_entry_permission_for_voting(instance: Entry, **kwargs):
+    status = instance.stored_status
+    instance.remember_stored_status()
+
+    # entries qualified or disqualified while voting is open are missed by the transitions of the competition
+    if status != instance.status and ENTRY_STATUS_QUALIFIED in (status, instance.status):
+        competition = instance.competition
+        if competition.published and competition.state == COMPETITION_STATE_VOTE:
+            sync_entry_voting_permissions(instance, True)
+
+
+@receiver(post_save, sender=Competition)
+def update_results_snapshot(instance: Competition, **kwargs):
+    state, scoring_complete, _ = instance.stored_state
+
+    if scoring_complete and not instance.scoring_complete:
+        # scores are being corrected, serve live results until scoring is completed again
+        ResultsSnapshot.objects.filter(competition=instance).delete()
+    elif (instance.scoring_complete and not scoring_complete) or (
+        instance.state == COMPETITION_STATE_FIN and state != COMPETITION_STATE_FIN
+    ):
+        transaction.on_commit(lambda: snapshot_results(instance))
+    elif instance.state == COMPETITION_STATE_FIN or instance.scoring_complete:
+        refresh_results_snapshot(instance.pk)
+
+
+def refresh_results_snapshot(competition_id):
+    # only competitions which already have a snapshot are rebuilt, others are served live anyway
+    transaction.on_commit(lambda: refresh_snapshots(Competition.objects.filter(pk=competition_id)))
+
+
+@receiver(post_save, sender=Entry)
+@receiver(post_delete, sender=Entry)
+def update_results_snapshot_for_entry(instance: Entry, **kwargs):
+    refresh_results_snapshot(instance.competition_id)
+
+
+@receiver(post_save, sender=Contributor)
+@receiver(post_delete, sender=Contributor)
+def update_results_snapshot_for_contributor(instance: Contributor, **kwargs):
+    # results show the owners of entries, which may have just stopped being one
+    competition_id = Entry.objects.filter(pk=instance.entry_id).values_list("competition_id", flat=True).first()
+    if competition_id:
+        refresh_results_snapshot(competition_id)
@@ -26,6 +26,33 @@ def get_social_user(user: User):
     return (social, social_type)
 
 
+def send_user_has_voted(user: User, competition_id, entry_ids):
+    """
+    Notify the achievement system about a user's first vote on one or more entries in a competition.
+    """
+    # do not process if we don't have a webhook destination
+    if not settings.ACHIEVEMENTS_WEBHOOK:
+        return
+
+    # find correct social user
+    social, social_type = get_social_user(user)
+    if not social:
+        return
+
+    for entry_id in entry_ids:
+        # build payload
+        payload = {
+            "type": "user_has_voted",
+            "user": social.extra_data.get("sub", ""),
+            "user_type": social_type or "",
+            "entry": entry_id,
+            "competition": competition_id,
+        }
+
+        # send event to achievements
+        requests.post(settings.ACHIEVEMENTS_WEBHOOK, json=payload)
+
+
 @receiver(post_save, sender=Vote)
 def user_has_voted(instance: Vote, created, **kwargs):
     # do not process if we don't have a webhook destination
@@ -36,22 +63,7 @@ def user_has_voted(instance: Vote, created, **kwargs):
     if not created:
         return
 
-    # find correct social user
-    social, social_type = get_social_user(instance.user)
-    if not social:
-        return
-
-    # build payload
-    payload = {
-        "type": "user_has_voted",
-        "user": social.extra_data.get("sub", ""),
-        "user_type": social_type or "",
-        "entry": instance.entry.id,
-        "competition": instance.entry.competition.id,
-    }
-
-    # send event to achievements
-    requests.post(settings.ACHIEVEMENTS_WEBHOOK, json=payload)
+    send_user_has_voted(instance.user, instance.entry.competition_id, [instance.entry_id])
 
 
 @receiver(post_save, sender=Entry)
@@ -1,7 +1,14 @@
 from io import StringIO
 
+from accounts.models import User
+from django.contrib.auth.models import Group
 from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+from guardian.models import GroupObjectPermission, UserObjectPermission
+
+from ..constants import GENRE_CATEGORY_CREATIVE
+from ..models import Competition, Contributor, Entry, Genre, Vote
 
 
 class ManagementCommandsTestCase(TestCase):
@@ -18,3 +25,52 @@ class ManagementCommandsTestCase(TestCase):
         out = StringIO()
         call_command("update_competition_states", stdout=out)
         self.assertIn("=== Finished at", out.getvalue())
+
+    def test_rebuild_results(self):
+        out = StringIO()
+        call_command("rebuild_results", stdout=out)
+        self.assertIn("=== Finished at", out.getvalue())
+
+    def test_recompute_scores(self):
+        out = StringIO()
+        call_command("recompute_scores", "--all", "--dry-run", stdout=out)
+        self.assertIn("=== Finished at", out.getvalue())
+
+    def test_backfill_object_permissions(self):
+        now = timezone.now()
+        genre = Genre.objects.create(category=GENRE_CATEGORY_CREATIVE, name="Music")
+        competition = Competition.objects.create(genre=genre, name="Music", run_time_start=now, run_time_end=now)
+        entry = Entry.objects.create(competition=competition, title="Entry")
+        contributor = Contributor.objects.create(entry=entry, user=User.objects.create_user(username="owner"))
+        vote = Vote.objects.create(entry=entry, user=User.objects.create_user(username="voter"), score=3)
+
+        compoadmin = Group.objects.get(name="p-compoadmin-creative")
+        GroupObjectPermission.objects.filter(group=compoadmin).delete()
+        UserObjectPermission.objects.filter(user=vote.user).delete()
+
+        out = StringIO()
+        call_command("backfill_object_permissions", "--batch-size", "2", stdout=out)
+        self.assertIn("+ Backfilled 3 contributor permissions", out.getvalue())
+        self.assertIn("+ Backfilled 3 vote permissions", out.getvalue())
+        self.assertIn("=== Finished at", out.getvalue())
+
+        compoadmin_user = User.objects.create_user(username="compoadmin")
+        compoadmin_user.groups.add(compoadmin)
+        for obj in (competition, entry, contributor):
+            self.assertTrue(compoadmin_user.has_perm(f"competitions.change_{obj._meta.model_name}", obj))
+        self.assertTrue(User.objects.get(pk=vote.user.pk).has_perm("competitions.change_vote", vote))
+
+        out = StringIO()
+        call_command("backfill_compoadmin_contributor_permissions", stdout=out)
+        self.assertIn("+ Backfilled 0 contributor permissions", out.getvalue())
+
+    def test_benchmark_serializers(self):
+        out = StringIO()
+        call_command("benchmark_serializers", "--repeat", "1", stdout=out)
+        self.assertIn("=== Finished at", out.getvalue())
+
+    def test_benchmark_renderers(self):
+        out = StringIO()
+        call_command("benchmark_renderers", "--repeat", "1", "--endpoint", "competitions", stdout=out)
+        self.assertIn("+ competitions with fast renderer, streamed", out.getvalue())
+        self.assertIn("=== Finished at", out.getvalue())
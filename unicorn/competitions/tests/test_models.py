@@ -18,7 +18,7 @@ from ..constants import (
     GENRE_CATEGORY_GAME,
     GENRE_CATEGORY_OTHER,
 )
-from ..models import Competition, Genre
+from ..models import Competition, Entry, Genre
 
 
 class CompetitionModelTestCase(TestCase):
@@ -67,6 +67,16 @@ class CompetitionModelTestCase(TestCase):
         """competition with no entries should report 0 on entries count"""
         self.assertEqual(self.competition1.entries_count, 0)
 
+    def test_entries_count_annotated(self):
+        """annotated entries counts should match the counted ones, without querying per competition"""
+        Entry.objects.create(competition=self.competition2, title="Entry 1")
+        Entry.objects.create(competition=self.competition2, title="Entry 2")
+
+        competitions = list(Competition.objects.with_entries_count().order_by("pk"))
+        with self.assertNumQueries(0):
+            self.assertEqual([c.entries_count for c in competitions], [0, 2])
+        self.assertEqual(self.competition2.entries_count, 2)
+
     def test_genre_name(self):
         """
         Test to make sure Genre names did not get changed while being inserted into the database
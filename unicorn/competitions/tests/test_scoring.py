@@ -0,0 +1,93 @@
+from accounts.constants import USER_ROLE_JURY, USER_ROLE_PARTICIPANT
+from accounts.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from ..constants import ENTRY_STATUS_QUALIFIED, GENRE_CATEGORY_CREATIVE
+from ..models import Competition, Entry, Genre, Vote
+from ..scoring import recompute_scores
+
+
+class ScoringTestCase(TestCase):
+    """
+    Test Case for the incremental scoring engine, using Entry.votesum() as the reference
+    """
+
+    def setUp(self):
+        now = timezone.now()
+        genre = Genre.objects.create(category=GENRE_CATEGORY_CREATIVE, name="Music")
+        self.competition = Competition.objects.create(
+            genre=genre,
+            name="Music",
+            rules="don't cheat. plox",
+            run_time_start=now - timezone.timedelta(hours=2),
+            run_time_end=now - timezone.timedelta(hours=1),
+            vote_time_start=now - timezone.timedelta(minutes=30),
+            vote_time_end=now + timezone.timedelta(hours=1),
+        )
+        self.entries = [
+            Entry.objects.create(competition=self.competition, title=f"Entry {i}", status=ENTRY_STATUS_QUALIFIED)
+            for i in range(3)
+        ]
+        self.voters = [User.objects.create_user(username=f"voter{i}", role=USER_ROLE_PARTICIPANT) for i in range(4)] + [
+            User.objects.create_user(username=f"jury{i}", role=USER_ROLE_JURY) for i in range(2)
+        ]
+
+    def assertScoresMatchReference(self):
+        self.competition.refresh_from_db()
+        for entry in Entry.objects.filter(competition=self.competition):
+            self.assertEqual(entry.score, entry.votesum(), entry.title)
+
+    def test_scores_follow_votes(self):
+        """every entry score should be consistent after each vote, not only the score of the voted entry"""
+        for i, user in enumerate(self.voters):
+            for j, entry in enumerate(self.entries):
+                Vote.objects.create(entry=entry, user=user, score=(i + j) % 5 + 1)
+                self.assertScoresMatchReference()
+
+        self.assertEqual(self.competition.jury_score_sum, sum(v.score for v in Vote.objects.filter(jury=True)))
+
+    def test_changed_and_deleted_votes(self):
+        """changing or removing a vote should subtract its previous contribution"""
+        for user in self.voters:
+            Vote.objects.create(entry=self.entries[0], user=user, score=5)
+
+        vote = Vote.objects.get(entry=self.entries[0], user=self.voters[-1])
+        vote.score = 1
+        vote.save()
+        self.assertScoresMatchReference()
+
+        vote.entry = self.entries[1]
+        vote.save()
+        self.assertScoresMatchReference()
+
+        Vote.objects.filter(user=self.voters[0]).delete()
+        vote.delete()
+        self.assertScoresMatchReference()
+
+    def test_update_score(self):
+        """update_score should leave the entry with the reference score"""
+        Vote.objects.create(entry=self.entries[0], user=self.voters[0], score=3)
+        Entry.objects.filter(pk=self.entries[0].pk).update(score=0)
+
+        self.entries[0].update_score()
+        self.assertEqual(self.entries[0].score, 3)
+
+    def test_recompute_scores(self):
+        """recompute_scores should pick up role changes and stale totals, and leave nothing behind on a dry run"""
+        for i, user in enumerate(self.voters):
+            Vote.objects.create(entry=self.entries[i % 3], user=user, score=i % 5 + 1)
+
+        self.voters[0].role = USER_ROLE_JURY
+        self.voters[0].save()
+        Entry.objects.filter(pk=self.entries[1].pk).update(mortal_score_sum=100, score=100)
+
+        changes = recompute_scores([self.competition.pk], dry_run=True)
+        self.assertTrue(changes)
+        self.assertEqual(Entry.objects.get(pk=self.entries[1].pk).score, 100)
+        self.assertFalse(Vote.objects.get(user=self.voters[0]).jury)
+
+        self.assertEqual(recompute_scores([self.competition.pk]), changes)
+        self.assertTrue(Vote.objects.get(user=self.voters[0]).jury)
+        self.assertScoresMatchReference()
+        self.assertEqual(recompute_scores([self.competition.pk]), [])
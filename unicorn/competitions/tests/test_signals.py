@@ -1,23 +1,28 @@
 from unittest import mock
 
+from accounts.models import User
 from competitions.constants import (
+    COMPETITION_STATE_VOTE,
     COMPETITION_VISIBILITY_CREW,
     COMPETITION_VISIBILITY_HIDDEN,
     COMPETITION_VISIBILITY_PUBLIC,
+    ENTRY_STATUS_DISQUALIFIED,
+    ENTRY_STATUS_QUALIFIED,
     GENRE_CATEGORY_OTHER,
 )
-from competitions.models import Competition, Genre
-from competitions.signals import add_competition_view_published
+from competitions.models import Competition, Contributor, Entry, Genre
+from competitions.reference import visible_event_choices
+from core.models import Event
 from django.contrib.auth.models import Group
-from django.db.models.signals import post_save
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from utilities.metrics import get_counter
 
 
 class AddCompetitionViewPublishedTestCase(TestCase):
     def setUp(self):
-        post_save.connect(add_competition_view_published, sender=Competition)
-
         self.anon, _ = Group.objects.get_or_create(name="p-anonymous")
         self.crew, _ = Group.objects.get_or_create(name="p-crew")
 
@@ -33,9 +38,6 @@ class AddCompetitionViewPublishedTestCase(TestCase):
             run_time_end=later,
         )
 
-    def tearDown(self):
-        post_save.disconnect(add_competition_view_published, sender=Competition)
-
     @mock.patch("competitions.signals.remove_perm")
     def test_visibility_hidden(self, mock_remove):
         self.competition.visibility = COMPETITION_VISIBILITY_HIDDEN
@@ -75,3 +77,160 @@ class AddCompetitionViewPublishedTestCase(TestCase):
 
         mock_remove.assert_called_with("view_competition", self.crew, self.competition)
         mock_assign.assert_called_with("view_competition", self.anon, self.competition)
+
+
+class ContributorPermissionsTestCase(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        genre = Genre.objects.create(category=GENRE_CATEGORY_OTHER, name="Genre")
+        competition = Competition.objects.create(
+            genre=genre, name="Competition", run_time_start=now, run_time_end=now + timezone.timedelta(days=1)
+        )
+        self.entry = Entry.objects.create(competition=competition, title="Entry")
+        self.users = [User.objects.create_user(username=f"user{i}") for i in range(6)]
+
+    def add_contributor(self, user, is_owner=False):
+        with CaptureQueriesContext(connection) as context:
+            contributor = Contributor.objects.create(entry=self.entry, user=user, is_owner=is_owner)
+        return contributor, len(context)
+
+    def test_team_permissions(self):
+        """contributors should see each other and the entry, only the owner should be able to change everything"""
+        owner, _ = self.add_contributor(self.users[0], is_owner=True)
+        _, small = self.add_contributor(self.users[1])
+        for user in self.users[2:-1]:
+            self.add_contributor(user)
+        last, large = self.add_contributor(self.users[-1])
+
+        # adding a contributor should not get more expensive with the size of the team
+        self.assertEqual(small, large)
+
+        for contributor in Contributor.objects.filter(entry=self.entry):
+            is_owner = contributor.user == owner.user
+            self.assertEqual(contributor.user.has_perm("competitions.change_entry", self.entry), is_owner)
+            self.assertTrue(contributor.user.has_perm("competitions.view_entry", self.entry))
+            self.assertTrue(contributor.user.has_perm("competitions.view_contributor", owner))
+            self.assertTrue(contributor.user.has_perm("competitions.change_contributor", contributor))
+            self.assertEqual(
+                contributor.user.has_perm("competitions.change_contributor", last), is_owner or contributor == last
+            )
+
+        # handing over ownership moves the owner permissions
+        last.is_owner = True
+        last.save()
+        self.assertFalse(User.objects.get(pk=owner.user.pk).has_perm("competitions.change_entry", self.entry))
+        self.assertFalse(User.objects.get(pk=owner.user.pk).has_perm("competitions.change_contributor", last))
+        self.assertTrue(User.objects.get(pk=last.user.pk).has_perm("competitions.change_contributor", owner))
+
+
+class VotingPermissionsTestCase(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        genre = Genre.objects.create(category=GENRE_CATEGORY_OTHER, name="Genre")
+        self.competition = Competition.objects.create(
+            genre=genre,
+            name="Competition",
+            run_time_start=now - timezone.timedelta(hours=2),
+            run_time_end=now - timezone.timedelta(hours=1),
+            vote_time_start=now - timezone.timedelta(minutes=30),
+            vote_time_end=now + timezone.timedelta(hours=1),
+        )
+        self.entries = [
+            Entry.objects.create(competition=self.competition, title=f"Entry {i}", status=ENTRY_STATUS_QUALIFIED)
+            for i in range(3)
+        ]
+        self.participant = User.objects.create_user(username="participant")
+        self.participant.groups.add(Group.objects.get_or_create(name="p-participant")[0])
+
+    def visible(self):
+        user = User.objects.get(pk=self.participant.pk)
+        return [user.has_perm("competitions.view_entry", entry) for entry in self.entries]
+
+    def test_voting_transitions(self):
+        """participants should see entries while voting is open, and permissions should only be written on changes"""
+        self.assertEqual(self.competition.state, COMPETITION_STATE_VOTE)
+        self.assertEqual(self.visible(), [False] * 3)
+
+        before = get_counter("voting_permission_rows")
+        self.competition.published = True
+        self.competition.save()
+        self.assertEqual(self.visible(), [True] * 3)
+        self.assertEqual(get_counter("voting_permission_rows") - before, 3)
+
+        before = get_counter("voting_permission_rows")
+        self.competition.name = "Renamed"
+        with mock.patch("competitions.signals.sync_voting_permissions") as mock_sync:
+            self.competition.save()
+        mock_sync.assert_not_called()
+        self.assertEqual(get_counter("voting_permission_rows"), before)
+
+        self.competition.vote_time_end = timezone.now() - timezone.timedelta(minutes=1)
+        self.competition.save()
+        self.assertNotEqual(self.competition.state, COMPETITION_STATE_VOTE)
+        self.assertEqual(self.visible(), [False] * 3)
+        self.assertEqual(get_counter("voting_permission_rows") - before, 3)
+
+    def test_status_changes_while_voting(self):
+        """entries qualified or disqualified while voting is open should be visible to participants accordingly"""
+        self.competition.published = True
+        self.competition.save()
+
+        entry = Entry.objects.get(pk=self.entries[0].pk)
+        entry.status = ENTRY_STATUS_DISQUALIFIED
+        entry.save()
+        self.assertEqual(self.visible(), [False, True, True])
+
+        with mock.patch("competitions.signals.sync_entry_voting_permissions") as mock_sync:
+            entry.title = "Renamed"
+            entry.save()
+        mock_sync.assert_not_called()
+
+        entry.status = ENTRY_STATUS_QUALIFIED
+        entry.save()
+        late = Entry.objects.create(competition=self.competition, title="Late", status=ENTRY_STATUS_QUALIFIED)
+        self.entries.append(late)
+        self.assertEqual(self.visible(), [True] * 4)
+
+
+class ReferenceCacheTestCase(TestCase):
+    def setUp(self):
+        self.genre = Genre.objects.create(category=GENRE_CATEGORY_OTHER, name="Genre")
+
+    def create_competition(self, name):
+        now = timezone.now()
+        with CaptureQueriesContext(connection) as context:
+            competition = Competition.objects.create(
+                genre=self.genre, name=name, published=True, run_time_start=now, run_time_end=now
+            )
+            Entry.objects.create(competition=competition, title="Entry")
+        return [q["sql"] for q in context if '"auth_group"' in q["sql"] or '"competitions_genre"' in q["sql"]]
+
+    def test_lookups_are_cached(self):
+        """groups and genres should only be read again after they changed"""
+        self.create_competition("First")
+        self.assertEqual(self.create_competition("Second"), [])
+
+        Group.objects.create(name="p-new")
+        self.assertTrue(self.create_competition("Third"))
+
+    def test_event_choices_follow_changes(self):
+        now = timezone.now()
+        event = Event.objects.create(name="Event", location="Hamar", start_date=now, end_date=now)
+        self.assertEqual(visible_event_choices(), [])
+
+        event.visible = True
+        event.save()
+        self.assertEqual(visible_event_choices(), [(event.pk, "Event")])
+
+        event.delete()
+        self.assertEqual(visible_event_choices(), [])
+
+    @override_settings(SHARED_CACHE=False)
+    def test_unshared_cache(self):
+        """without a shared cache, changes made by other processes (without signals here) should be seen at once"""
+        now = timezone.now()
+        event = Event.objects.create(name="Event", location="Hamar", start_date=now, end_date=now)
+        self.assertEqual(visible_event_choices(), [])
+
+        Event.objects.filter(pk=event.pk).update(visible=True)
+        self.assertEqual(visible_event_choices(), [(event.pk, "Event")])
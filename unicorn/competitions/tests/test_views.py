@@ -0,0 +1,801 @@
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from accounts.constants import USER_DISPLAY_AKA, USER_ROLE_PARTICIPANT
+from accounts.models import User
+from django.contrib.auth.models import Group, Permission, update_last_login
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from guardian.models import GroupObjectPermission
+from guardian.shortcuts import assign_perm, get_perms, remove_perm
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from rest_framework.utils.serializer_helpers import ReturnList
+from utilities.permissions import get_anonymous_user
+from utilities.response_cache import get_audience
+
+from unicorn.api import FastJSONRenderer
+
+from .. import vote_buffer
+from ..api.views import CompetitionViewSet
+from ..constants import (
+    COMPETITION_VISIBILITY_CREW,
+    ENTRY_STATUS_DISQUALIFIED,
+    ENTRY_STATUS_QUALIFIED,
+    GENRE_CATEGORY_CREATIVE,
+)
+from ..models import (
+    BufferedBallot,
+    Competition,
+    Contributor,
+    Entry,
+    File,
+    Genre,
+    ResultsSnapshot,
+    Vote,
+)
+
+
+class VoteViewTestMixin:
+    def setUp(self):
+        now = timezone.now()
+        genre = Genre.objects.create(category=GENRE_CATEGORY_CREATIVE, name="Music")
+        self.competition = Competition.objects.create(
+            genre=genre,
+            name="Music",
+            rules="don't cheat. plox",
+            published=True,
+            run_time_start=now - timezone.timedelta(hours=2),
+            run_time_end=now - timezone.timedelta(hours=1),
+            vote_time_start=now - timezone.timedelta(minutes=30),
+            vote_time_end=now + timezone.timedelta(hours=1),
+        )
+        self.entries = [
+            Entry.objects.create(competition=self.competition, title=f"Entry {i}", status=ENTRY_STATUS_QUALIFIED)
+            for i in range(3)
+        ]
+
+        self.user = User.objects.create_user(username="voter", role=USER_ROLE_PARTICIPANT)
+        self.client.force_authenticate(user=self.user)
+
+    def hide_entries(self):
+        # participants can view qualified entries while voting is open, leave visibility to the test's own permissions
+        GroupObjectPermission.objects.filter(group__name="p-participant", permission__codename="view_entry").delete()
+
+
+class BallotViewTest(VoteViewTestMixin, APITestCase):
+
+    def test_ballot(self):
+        """a ballot should create and update votes, with permissions and scores like single votes"""
+        Vote.objects.create(entry=self.entries[0], user=self.user, score=1)
+
+        response = self.client.post(
+            "/api/competitions/votes/ballot/",
+            {
+                "competition": self.competition.pk,
+                "votes": [{"entry": entry.pk, "score": 4} for entry in self.entries],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+
+        for vote in Vote.objects.filter(user=self.user):
+            self.assertEqual(vote.score, 4)
+            self.assertEqual(set(get_perms(self.user, vote)), {"view_vote", "change_vote", "delete_vote"})
+
+        for entry in Entry.objects.filter(competition=self.competition):
+            self.assertEqual(entry.score, 4)
+            self.assertEqual(entry.score, entry.votesum())
+
+    def test_ballot_rejects_own_entries(self):
+        """a ballot including an entry the user has contributed to should be rejected as a whole"""
+        Contributor.objects.create(entry=self.entries[1], user=self.user, is_owner=True)
+
+        response = self.client.post(
+            "/api/competitions/votes/ballot/",
+            {
+                "competition": self.competition.pk,
+                "votes": [{"entry": entry.pk, "score": 3} for entry in self.entries],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Vote.objects.filter(user=self.user).exists())
+
+
+@override_settings(VOTE_BUFFER_ENABLED=True)
+class VoteBufferTest(VoteViewTestMixin, APITestCase):
+    def test_buffered_votes(self):
+        """buffered votes should be readable right away, and written with scores by the flusher"""
+        response = self.client.post(
+            "/api/competitions/votes/", {"entry": self.entries[0].pk, "score": 2}, format="json"
+        )
+        self.assertEqual(response.status_code, 202)
+
+        response = self.client.post(
+            "/api/competitions/votes/ballot/",
+            {
+                "competition": self.competition.pk,
+                "votes": [{"entry": entry.pk, "score": 5} for entry in self.entries[1:]],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(Vote.objects.exists())
+
+        response = self.client.get("/api/competitions/votes/pending/", {"competition": self.competition.pk})
+        self.assertEqual([v["score"] for v in response.data], [2, 5, 5])
+
+        call_command("flush_vote_buffer", stdout=StringIO())
+
+        self.assertEqual(Vote.objects.filter(user=self.user).count(), 3)
+        for vote in Vote.objects.filter(user=self.user):
+            self.assertEqual(set(get_perms(self.user, vote)), {"view_vote", "change_vote", "delete_vote"})
+        for entry in Entry.objects.filter(competition=self.competition):
+            self.assertEqual(entry.score, entry.votesum())
+
+        response = self.client.get("/api/competitions/votes/pending/")
+        self.assertEqual(response.data, [])
+
+    def test_failed_ballot(self):
+        """a ballot which can't be written should be set aside, without holding up the others"""
+        other = User.objects.create_user(username="other")
+        for user in (self.user, other):
+            BufferedBallot.objects.create(user=user, competition=self.competition, scores={self.entries[0].pk: 3})
+
+        def cast_ballot(user, *args, **kwargs):
+            if user == self.user:
+                raise ValueError("broken")
+            return original(user, *args, **kwargs)
+
+        original = vote_buffer.cast_ballot
+        with mock.patch.object(vote_buffer, "cast_ballot", cast_ballot):
+            self.assertEqual(vote_buffer.flush_votes(), 1)
+
+        self.assertTrue(Vote.objects.filter(user=other).exists())
+        failed = BufferedBallot.objects.get()
+        self.assertEqual((failed.user, failed.error), (self.user, "ValueError('broken')"))
+        self.assertEqual(vote_buffer.flush_votes(), 0)
+
+
+class ResultsViewTest(VoteViewTestMixin, APITestCase):
+    def setUp(self):
+        super(ResultsViewTest, self).setUp()
+        for i, entry in enumerate(self.entries):
+            owner = User.objects.create_user(
+                username=f"owner{i} aka. 0f8fad5b-d9cb-469f-a165-70867728950e", display_name_format=USER_DISPLAY_AKA
+            )
+            Contributor.objects.create(entry=entry, user=owner, is_owner=True)
+            Vote.objects.create(entry=entry, user=self.user, score=i + 1)
+
+        assign_perm("view_competition", self.user, self.competition)
+
+    def test_snapshot(self):
+        """results should be snapshotted when scoring completes, and served without building them again"""
+        live = self.client.get("/api/competitions/results/").data
+        self.assertEqual([e["owner"] for e in live["results"][0]["entries"]], ["owner2", "owner1", "owner0"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.competition.scoring_complete = True
+            self.competition.save()
+
+        self.assertTrue(ResultsSnapshot.objects.filter(competition=self.competition).exists())
+
+        # entries are not read anymore once there is a snapshot
+        Entry.objects.filter(competition=self.competition).update(score=0)
+        snapshot = self.client.get("/api/competitions/results/").data
+        self.assertEqual(snapshot, live)
+
+        self.competition.scoring_complete = False
+        self.competition.save()
+        self.assertFalse(ResultsSnapshot.objects.filter(competition=self.competition).exists())
+
+    def test_snapshot_edits(self):
+        """the snapshot should be rebuilt when entries or their owners are edited after scoring completed"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.competition.scoring_complete = True
+            self.competition.save()
+
+        def snapshot():
+            return ResultsSnapshot.objects.get(competition=self.competition).data["entries"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entries[2].status = ENTRY_STATUS_DISQUALIFIED
+            self.entries[2].save()
+        self.assertEqual([e["title"] for e in snapshot()], ["Entry 1", "Entry 0"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Contributor.objects.filter(entry=self.entries[1]).delete()
+        self.assertEqual([e["owner"] for e in snapshot()], ["", "owner0"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.competition.name = "Tracked music"
+            self.competition.save()
+        self.assertEqual(ResultsSnapshot.objects.get(competition=self.competition).data["name"], "Tracked music")
+
+    def test_live_queries(self):
+        """live results should be built with a fixed number of queries, regardless of the number of competitions"""
+
+        def add_competition(name):
+            competition = Competition.objects.create(
+                genre=self.competition.genre,
+                name=name,
+                rules="-",
+                published=True,
+                run_time_start=self.competition.run_time_start,
+                run_time_end=self.competition.run_time_end,
+                vote_time_start=self.competition.vote_time_start,
+                vote_time_end=self.competition.vote_time_end,
+            )
+            assign_perm("view_competition", self.user, competition)
+            Entry.objects.create(competition=competition, title="Entry", status=ENTRY_STATUS_QUALIFIED)
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get("/api/competitions/results/")
+            self.assertEqual(response.status_code, 200)
+            return len(context), len(response.data["results"])
+
+        self.client.get("/api/competitions/results/")
+        add_competition("Music 1")
+        queries, _ = count_queries()
+
+        add_competition("Music 2")
+        add_competition("Music 3")
+        self.assertEqual(count_queries(), (queries, 4))
+
+
+class CompetitionVisibilityTest(VoteViewTestMixin, APITestCase):
+    def names(self):
+        return [c["name"] for c in self.client.get("/api/competitions/competitions/").data["results"]]
+
+    def test_visibility_follows_permissions(self):
+        """the list should follow permission changes right away, for anonymous and regular users"""
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.names(), ["Music"])
+
+        hidden = Competition.objects.create(
+            genre=self.competition.genre,
+            name="Crew only",
+            rules="none",
+            published=True,
+            visibility=COMPETITION_VISIBILITY_CREW,
+            run_time_start=self.competition.run_time_start,
+            run_time_end=self.competition.run_time_end,
+        )
+        self.assertEqual(self.names(), ["Music"])
+
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.names(), ["Music"])
+
+        self.user.groups.add(Group.objects.get(name="p-crew"))
+        self.assertEqual(sorted(self.names()), ["Crew only", "Music"])
+
+        hidden.published = False
+        hidden.save()
+        self.assertEqual(self.names(), ["Music"])
+
+    def test_anonymous_permissions_are_cached(self):
+        """anonymous requests should not look up permissions separately once the caches are warm"""
+        self.client.force_authenticate(user=None)
+        self.names()
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.names(), ["Music"])
+            self.client.get(f"/api/competitions/competitions/{self.competition.pk}/")
+
+        # permissions are only semi-joined into the competitions query
+        lookups = [
+            query["sql"]
+            for query in context
+            if ("guardian_" in query["sql"] or "auth_" in query["sql"])
+            and not query["sql"].startswith('SELECT "competitions_competition"')
+        ]
+        self.assertEqual(lookups, [])
+
+    @override_settings(SHARED_CACHE=False)
+    def test_unshared_cache(self):
+        """without a shared cache, permission changes made elsewhere should be seen right away"""
+        self.client.force_authenticate(user=None)
+        url = f"/api/competitions/competitions/{self.competition.pk}/"
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        # like another process revoking it, the version bump doesn't reach this one
+        GroupObjectPermission.objects.filter(object_pk=str(self.competition.pk)).delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.names(), [])
+
+    @override_settings(SHARED_CACHE=False)
+    def test_unshared_anonymous_user(self):
+        """without a shared cache, global permissions of the anonymous user should not be kept by the process"""
+        anon = get_anonymous_user()
+        self.assertFalse(anon.has_perm("competitions.change_competition"))
+
+        # like another process granting it, without a version bump reaching this one
+        permission = Permission.objects.get(codename="change_competition")
+        User.user_permissions.through.objects.create(user_id=anon.pk, permission=permission)
+        self.assertTrue(get_anonymous_user().has_perm("competitions.change_competition"))
+
+        User.user_permissions.through.objects.filter(user_id=anon.pk).delete()
+        self.assertFalse(get_anonymous_user().has_perm("competitions.change_competition"))
+
+
+class PermissionPrefetchTest(VoteViewTestMixin, APITestCase):
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get("/api/competitions/contributors/")
+        self.assertEqual(response.status_code, 200)
+        return len(response.data["results"]), len(context)
+
+    def add_contributors(self, entries):
+        for entry in entries:
+            contributor = Contributor.objects.create(
+                entry=entry, user=User.objects.create_user(username=f"owner-{entry.pk}"), is_owner=True
+            )
+            assign_perm("view_contributor", self.user, contributor)
+
+    def test_permissions_do_not_scale_with_page_size(self):
+        """serializing permissions should take the same number of queries for one object as for many"""
+        self.add_contributors(self.entries[:1])
+        self.count_queries()  # warm up process caches
+        one = self.count_queries()
+
+        self.add_contributors(self.entries[1:])
+        self.count_queries()
+        many = self.count_queries()
+
+        self.assertEqual((one[0], many[0]), (1, 3))
+        self.assertEqual(one[1], many[1])
+
+
+class EntryQueriesTest(VoteViewTestMixin, APITestCase):
+    def setUp(self):
+        super(EntryQueriesTest, self).setUp()
+        self.hide_entries()
+        self.competition.fileupload = [{"type": "main", "file": "music"}]
+        self.competition.save()
+
+    def add_entries(self, entries):
+        for entry in entries:
+            owner = User.objects.create_user(username=f"owner-{entry.pk}")
+            Contributor.objects.create(entry=entry, user=owner, is_owner=True)
+            Contributor.objects.create(entry=entry, user=User.objects.create_user(username=f"member-{entry.pk}"))
+            File.objects.create(entry=entry, uploader=owner, name="song.mp3", type="main", file="song.mp3")
+            assign_perm("view_entry", self.user, entry)
+
+    def count_queries(self, params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get("/api/competitions/entries/", params)
+        self.assertEqual(response.status_code, 200)
+        return len(response.data["results"]), len(context)
+
+    def test_queries_do_not_scale_with_page_size(self):
+        """listing entries should take the same number of queries for one entry as for many"""
+        Contributor.objects.create(entry=self.entries[0], user=self.user)
+
+        for params in ({}, {"vote": 1}):
+            self.add_entries(self.entries[:1])
+            self.count_queries(params)  # warm up process caches
+            one = self.count_queries(params)
+
+            self.add_entries(self.entries[1:])
+            self.count_queries(params)
+            many = self.count_queries(params)
+
+            self.assertEqual((one[0], many[0]), (1, 3))
+            self.assertEqual(one[1], many[1], params)
+
+            User.objects.filter(entries__in=self.entries).exclude(pk=self.user.pk).delete()
+            for entry in self.entries[1:]:
+                remove_perm("view_entry", self.user, entry)
+
+        self.add_entries(self.entries)
+        response = self.client.get("/api/competitions/entries/")
+        self.assertEqual([e["is_contributor"] for e in response.data["results"]], [True, False, False])
+        self.assertEqual(
+            [str(e["owner"]["uuid"]) for e in response.data["results"]],
+            [str(Contributor.objects.get(entry=entry, is_owner=True).user_id) for entry in self.entries],
+        )
+
+
+class CompetitionListTest(VoteViewTestMixin, APITestCase):
+    def setUp(self):
+        super(CompetitionListTest, self).setUp()
+        self.user.is_superuser = True
+        self.user.save()
+
+    @override_settings(COMPETITION_NESTED_ENTRIES_LIMIT=2)
+    def test_nested_entries(self):
+        """entries should be counted in full but only nested up to the limit, and only when they are rendered"""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(f"/api/competitions/competitions/{self.competition.pk}/")
+        self.assertEqual(response.data["entries_count"], 3)
+        self.assertEqual(len(response.data["entries"]), 2)
+        self.assertTrue([q for q in context if '"competitions_entry"."title"' in q["sql"]])
+
+        self.user.is_superuser = False
+        self.user.save()
+        assign_perm("view_competition", self.user, self.competition)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(f"/api/competitions/competitions/{self.competition.pk}/")
+        self.assertEqual(response.data["entries_count"], 3)
+        self.assertNotIn("entries", response.data)
+        self.assertFalse([q for q in context if '"competitions_entry"."title"' in q["sql"]])
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class FastSerializerParityTest(VoteViewTestMixin, APITestCase):
+    def setUp(self):
+        super(FastSerializerParityTest, self).setUp()
+        self.competition.fileupload = [{"type": "main", "file": "music"}, {"type": "main", "file": "ignored"}]
+        self.competition.header_image_file = "header.png"
+        self.competition.team_min = 1
+        self.competition.team_max = 4
+        self.competition.save()
+
+        other = Competition.objects.create(
+            genre=Genre.objects.create(category=GENRE_CATEGORY_CREATIVE, name="Graphics"),
+            name="Graphics",
+            rules="none",
+            published=True,
+            visibility=COMPETITION_VISIBILITY_CREW,
+            run_time_start=self.competition.run_time_start,
+            run_time_end=self.competition.run_time_end,
+        )
+
+        for competition in (self.competition, other):
+            assign_perm("view_competition", self.user, competition)
+
+        for i, entry in enumerate(self.entries):
+            if i:
+                owner = User.objects.create_user(username=f"owner{i}", first_name=f"Owner {i}")
+                Contributor.objects.create(entry=entry, user=owner, is_owner=True)
+                File.objects.create(entry=entry, uploader=owner, name="song.mp3", type="main", file=f"song{i}.mp3")
+                File.objects.create(entry=entry, uploader=owner, name="old.mp3", type="main", active=False)
+            assign_perm("view_entry", self.user, entry)
+
+    def assertSameResponse(self, url, params=None):
+        with override_settings(FAST_SERIALIZERS_ENABLED=False):
+            regular = self.client.get(url, params)
+        with override_settings(FAST_SERIALIZERS_ENABLED=True):
+            fast = self.client.get(url, params)
+
+        self.assertEqual(regular.status_code, 200)
+        self.assertEqual(fast.status_code, 200)
+        self.assertTrue(fast.data["results"])
+        self.assertNotIsInstance(fast.data["results"], ReturnList)
+        self.assertEqual(regular.content, fast.content)
+
+    def test_competitions(self):
+        """the fast competitions list should render exactly like the regular one"""
+        self.assertSameResponse("/api/competitions/competitions/")
+        self.assertSameResponse("/api/competitions/competitions/", {"limit": 1, "offset": 1})
+
+        self.client.force_authenticate(user=None)
+        self.assertSameResponse("/api/competitions/competitions/")
+
+    def test_competitions_next_state(self):
+        """the next state should be computed from the schedule even when only it is selected"""
+        self.assertSameResponse("/api/competitions/competitions/", {"fields": "id,next_state"})
+
+    def test_renderer(self):
+        """the fast renderer should encode values which serializers don't turn into strings like the stock one"""
+        now = timezone.now().replace(microsecond=123456)
+        data = {"at": now, "date": now.date(), "time": now.time(), 1: [Decimal("1.5"), self.user.pk, "\u2028"]}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_entries_for_voting(self):
+        """the fast voting entries list should render exactly like the regular one"""
+        self.assertSameResponse("/api/competitions/entries/", {"vote": 1})
+
+
+class ConditionalGetTest(VoteViewTestMixin, APITestCase):
+    def setUp(self):
+        super(ConditionalGetTest, self).setUp()
+        self.hide_entries()
+        for entry in self.entries:
+            assign_perm("view_entry", self.user, entry)
+
+    def assertNotModified(self, url, **headers):
+        response = self.client.get(url, headers=headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_list(self):
+        """lists should answer 304 until an object is changed, added or removed, or permissions change"""
+        url = "/api/competitions/entries/"
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertNotIn("Last-Modified", response)
+        self.assertNotModified(url, if_none_match=etag)
+
+        self.assertEqual(self.client.get(url, {"limit": 1}, headers={"if_none_match": etag}).status_code, 200)
+
+        self.entries[0].title = "Changed"
+        self.entries[0].save()
+        response = self.client.get(url, headers={"if_none_match": etag})
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        self.entries[2].delete()
+        response = self.client.get(url, headers={"if_none_match": etag})
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        remove_perm("view_entry", self.user, self.entries[1])
+        response = self.client.get(url, headers={"if_none_match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_detail(self):
+        """details should be validated by the timestamps of the object and what is nested in it"""
+        url = f"/api/competitions/entries/{self.entries[0].pk}/"
+        response = self.client.get(url)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        self.assertNotModified(url, if_none_match=etag)
+        self.assertNotModified(url, if_modified_since=last_modified)
+
+        File.objects.create(entry=self.entries[0], uploader=self.user, name="song.mp3", type="main", file="song.mp3")
+        self.assertEqual(self.client.get(url, headers={"if_none_match": etag}).status_code, 200)
+
+        self.client.force_authenticate(user=User.objects.create_user(username="other"))
+        self.assertEqual(self.client.get(url, headers={"if_none_match": etag}).status_code, 404)
+
+    def test_contributors(self):
+        """entries should be validated by their contributors and the names of their users, but not by logins"""
+        owner = User.objects.create_user(username="owner", first_name="Owner")
+        contributor = Contributor.objects.create(entry=self.entries[0], user=owner, is_owner=True)
+
+        for url in ("/api/competitions/entries/", f"/api/competitions/entries/{self.entries[0].pk}/"):
+            response = self.client.get(url)
+            etag = response["ETag"]
+
+            update_last_login(None, owner)
+            self.assertNotModified(url, if_none_match=etag)
+
+            contributor.extra_info = "Vocals"
+            contributor.save()
+            response = self.client.get(url, headers={"if_none_match": etag})
+            self.assertEqual(response.status_code, 200)
+            etag = response["ETag"]
+
+            owner.first_name = "Renamed"
+            owner.save()
+            response = self.client.get(url, headers={"if_none_match": etag})
+            self.assertEqual(response.status_code, 200)
+
+    def test_shared_etags(self):
+        """users who see the same through their groups should share ETags, users with permissions of their own not"""
+        group = Group.objects.create(name="viewers")
+        for entry in self.entries:
+            assign_perm("view_entry", group, entry)
+
+        users = [User.objects.create_user(username=username) for username in ("first", "second", "personal")]
+        group.user_set.add(*users)
+        assign_perm("view_entry", users[2], self.entries[0])
+
+        etags = []
+        for user in users:
+            self.client.force_authenticate(user=user)
+            etags.append(self.client.get("/api/competitions/entries/")["ETag"])
+
+        self.assertEqual(etags[0], etags[1])
+        self.assertNotEqual(etags[0], etags[2])
+
+    def test_aggregates_per_relation(self):
+        """timestamps of files and contributors should not be aggregated over the product of both"""
+        File.objects.create(entry=self.entries[0], uploader=self.user, name="song.mp3", type="main", file="song.mp3")
+        Contributor.objects.create(entry=self.entries[0], user=self.user, is_owner=True)
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get("/api/competitions/entries/")
+
+        aggregates = [q["sql"] for q in context if "MAX(" in q["sql"]]
+        self.assertTrue(aggregates)
+        self.assertFalse(
+            [sql for sql in aggregates if "competitions_file" in sql and "competitions_contributor" in sql]
+        )
+
+
+class ResponseCacheTest(VoteViewTestMixin, APITestCase):
+    url = "/api/competitions/competitions/"
+
+    def setUp(self):
+        super(ResponseCacheTest, self).setUp()
+        self.user.groups.add(Group.objects.get(name="p-participant"))
+
+    def get(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        competitions = [q for q in context if '"competitions_competition"' in q["sql"]]
+        return response.data["results"], bool(competitions)
+
+    def test_shared_between_audiences(self):
+        """users in the same groups should share responses, and changes should show up right away"""
+        self.client.force_authenticate(user=None)
+        self.assertTrue(self.get()[1])
+        self.assertFalse(self.get()[1])
+
+        self.client.force_authenticate(user=self.user)
+        self.assertTrue(self.get()[1])
+        other = User.objects.create_user(username="other")
+        other.groups.add(Group.objects.get(name="p-participant"))
+        self.client.force_authenticate(user=other)
+        self.assertFalse(self.get()[1])
+
+        self.competition.name = "Changed"
+        self.competition.save()
+        results, queried = self.get()
+        self.assertTrue(queried)
+        self.assertEqual(results[0]["name"], "Changed")
+
+    def test_votes(self):
+        """votes should only invalidate responses which render scores"""
+        self.assertTrue(self.get()[1])
+        results = self.client.get("/api/competitions/results/").data["results"]
+        self.assertEqual(results[0]["entries"][0]["score"], 0)
+
+        Vote.objects.create(entry=self.entries[0], user=self.user, score=5)
+        self.assertFalse(self.get()[1])
+        results = self.client.get("/api/competitions/results/").data["results"]
+        self.assertEqual(results[0]["entries"][0]["score"], 5)
+
+    def test_conditional_requests(self):
+        """cached responses should carry the same validators and answer conditional requests like uncached ones"""
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+        self.assertFalse(self.get()[1])
+
+        cached = self.client.get(self.url)
+        self.assertEqual((cached["ETag"], cached["Vary"]), (etag, response["Vary"]))
+        self.assertEqual(self.client.get(self.url, headers={"if_none_match": etag}).status_code, 304)
+
+        detail = f"{self.url}{self.competition.pk}/"
+        response = self.client.get(detail)
+        cached = self.client.get(detail, headers={"if_modified_since": response["Last-Modified"]})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached["ETag"], response["ETag"])
+
+    @override_settings(SHARED_CACHE=False)
+    def test_unshared_cache(self):
+        """without a shared cache, invalidations can't reach other processes, so nothing should be cached"""
+        self.assertTrue(self.get()[1])
+        self.assertTrue(self.get()[1])
+
+    def test_personal_responses_are_not_shared(self):
+        """crew, superusers and users with permissions of their own should never get or fill shared responses"""
+        crew = Group.objects.create(name="test-crew")
+        crew.permissions.add(Permission.objects.get(codename="view_entry_crewmsg"))
+        crew_user = User.objects.create_user(username="crew")
+        crew_user.groups.add(Group.objects.get(name="p-participant"), crew)
+        models = CompetitionViewSet.cache_models
+        self.assertNotEqual(get_audience(crew_user, models), get_audience(self.user, models))
+
+        self.assertTrue(self.get()[1])
+        self.assertFalse(self.get()[1])
+
+        assign_perm("view_competition", self.user, self.competition)
+        self.assertIsNone(get_audience(self.user, models))
+        self.assertTrue(self.get()[1])
+        self.assertTrue(self.get()[1])
+
+        self.user.is_superuser = True
+        self.user.save()
+        remove_perm("view_competition", self.user, self.competition)
+        self.assertIn("entries", self.get()[0][0])
+        self.assertTrue(self.get()[1])
+
+
+class CursorPaginationTest(VoteViewTestMixin, APITestCase):
+    def setUp(self):
+        super(CursorPaginationTest, self).setUp()
+        for entry in self.entries:
+            assign_perm("view_entry", self.user, entry)
+
+    def test_pages(self):
+        """cursor pages should follow the cursor ordering without counting, even when rows are added in between"""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get("/api/competitions/entries/", {"cursor": "", "limit": 2})
+        self.assertNotIn("count", response.data)
+        self.assertFalse([q for q in context if "__count" in q["sql"]])
+        self.assertEqual([e["title"] for e in response.data["results"]], ["Entry 0", "Entry 1"])
+
+        entry = Entry.objects.create(competition=self.competition, title="Entry 00", status=ENTRY_STATUS_QUALIFIED)
+        assign_perm("view_entry", self.user, entry)
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual([e["title"] for e in response.data["results"]], ["Entry 2"])
+        self.assertIsNone(response.data["next"])
+
+        response = self.client.get("/api/competitions/entries/", {"cursor": "nonsense"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_offset_by_default(self):
+        """views should keep paging with limit and offset unless a cursor is asked for"""
+        response = self.client.get("/api/competitions/entries/", {"limit": 2})
+        self.assertEqual(response.data["count"], 3)
+
+
+class FieldSelectionTest(VoteViewTestMixin, APITestCase):
+    def setUp(self):
+        super(FieldSelectionTest, self).setUp()
+        for entry in self.entries:
+            assign_perm("view_entry", self.user, entry)
+            File.objects.create(entry=entry, uploader=self.user, name="song.mp3", type="main", file="song.mp3")
+
+    def get(self, url, params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data["results"], [q["sql"] for q in context]
+
+    def test_fields(self):
+        """only the requested fields should be rendered, and unused columns and relations should not be queried"""
+        results, queries = self.get("/api/competitions/entries/", {"fields": "id,title"})
+        self.assertEqual([list(e) for e in results], [["id", "title"]] * 3)
+        self.assertFalse([q for q in queries if '"competitions_entry"."crew_msg"' in q])
+        self.assertFalse([q for q in queries if 'FROM "competitions_file"' in q])
+        self.assertFalse([q for q in queries if 'FROM "competitions_contributor"' in q])
+
+        results, queries = self.get("/api/competitions/entries/", {})
+        self.assertIn("crew_msg", results[0])
+        self.assertTrue([q for q in queries if 'FROM "competitions_file"' in q])
+
+    def test_omit(self):
+        """omitted fields should be left out of the full representation"""
+        results, queries = self.get("/api/competitions/entries/", {"omit": "files,crew_msg"})
+        self.assertNotIn("files", results[0])
+        self.assertNotIn("crew_msg", results[0])
+        self.assertIn("contributors", results[0])
+        self.assertFalse([q for q in queries if 'FROM "competitions_file"' in q])
+
+        response = self.client.get(f"/api/competitions/entries/{self.entries[0].pk}/", {"fields": "title"})
+        self.assertEqual(response.data, {"title": "Entry 0"})
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_fast_serializer(self):
+        """the fast serializers should render the same fields"""
+        for enabled in (False, True):
+            with override_settings(FAST_SERIALIZERS_ENABLED=enabled):
+                results, queries = self.get("/api/competitions/entries/", {"vote": 1, "fields": "id,owner"})
+                self.assertEqual([list(e) for e in results], [["id", "owner"]] * 3)
+                self.assertFalse([q for q in queries if 'FROM "competitions_file"' in q])
+
+                results, _ = self.get("/api/competitions/competitions/", {"fields": "id,name"})
+                self.assertEqual(results, [{"id": self.competition.pk, "name": "Music"}])
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0, LIST_STREAMING_CHUNK_SIZE=2)
+class StreamingListTest(VoteViewTestMixin, APITestCase):
+    def setUp(self):
+        super(StreamingListTest, self).setUp()
+        for entry in self.entries:
+            assign_perm("view_entry", self.user, entry)
+            File.objects.create(entry=entry, uploader=self.user, name="song.mp3", type="main", file="song.mp3")
+
+    def assertSameList(self, params):
+        streamed = self.client.get("/api/competitions/entries/", {**params, "limit": 0})
+        self.assertTrue(streamed.streaming)
+        with override_settings(LIST_STREAMING_CHUNK_SIZE=0):
+            buffered = self.client.get("/api/competitions/entries/", {**params, "limit": 0})
+        self.assertFalse(buffered.streaming)
+
+        self.assertEqual(b"".join(streamed.streaming_content), buffered.content)
+
+    def test_streamed_like_buffered(self):
+        """unlimited lists should be streamed in chunks, in the same envelope as a buffered response"""
+        self.assertSameList({})
+        self.assertSameList({"offset": 1})
+        self.assertSameList({"offset": 5})
+        with override_settings(FAST_SERIALIZERS_ENABLED=True):
+            self.assertSameList({"vote": 1})
+
+        self.assertFalse(self.client.get("/api/competitions/entries/", {"limit": 2}).streaming)
+        self.assertFalse(self.client.get("/api/competitions/entries/", {"limit": 0, "format": "api"}).streaming)
@@ -0,0 +1,124 @@
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import BufferedBallot, Entry
+from .scoring import rescore_competition
+from .voting import cast_ballot
+
+logger = logging.getLogger(__name__)
+
+
+def is_enabled() -> bool:
+    return settings.VOTE_BUFFER_ENABLED
+
+
+def _scores(ballot):
+    # JSON object keys are strings
+    return {int(entry_id): score for entry_id, score in ballot.scores.items()}
+
+
+def buffer_ballot(user, competition, scores):
+    """
+    Append an already validated ballot to the vote buffer, to be written to the database by flush_votes(). Accepting a
+    ballot is a single insert, without touching the votes, entries or competition rows writers contend on.
+
+    :param scores: A dict of entry id to score
+    :returns: The buffered votes, in the same format as pending_votes()
+    """
+    BufferedBallot.objects.create(user=user, competition=competition, scores=scores)
+    return [{"competition": competition.pk, "entry": entry_id, "score": score} for entry_id, score in scores.items()]
+
+
+def pending_votes(user, competition_id=None):
+    """
+    List votes of a user which are accepted but not flushed yet.
+    """
+    ballots = BufferedBallot.objects.filter(user=user, failed__isnull=True).order_by("pk")
+    if competition_id is not None:
+        ballots = ballots.filter(competition_id=competition_id)
+
+    pending = {}
+    for ballot in ballots:
+        for entry_id, score in _scores(ballot).items():
+            pending[entry_id] = (ballot.competition_id, score)
+
+    return [
+        {"competition": competition, "entry": entry_id, "score": score}
+        for entry_id, (competition, score) in sorted(pending.items())
+    ]
+
+
+def _write_batch(batch) -> int:
+    """
+    Write a batch of ballots to the database, rescoring each competition once. Later ballots override earlier ones.
+    Ballots which can't be written are marked as failed, so they don't hold up the rest of the buffer.
+    """
+    ballots = defaultdict(dict)
+    members = defaultdict(list)
+    for ballot in batch:
+        ballots[(ballot.user, ballot.competition)].update(_scores(ballot))
+        members[(ballot.user, ballot.competition)].append(ballot.pk)
+
+    entries = set(
+        Entry.objects.filter(competition__in={ballot.competition_id for ballot in batch})
+        .filter(pk__in={entry_id for scores in ballots.values() for entry_id in scores})
+        .values_list("pk", flat=True)
+    )
+
+    written = 0
+    for (user, competition), scores in ballots.items():
+        scores = {entry_id: score for entry_id, score in scores.items() if entry_id in entries}
+        if not scores:
+            logger.warning("Dropping buffered ballot of user %s in competition %s", user.pk, competition.pk)
+            continue
+
+        try:
+            with transaction.atomic():
+                # the ballot was validated when it was accepted, the voting window may have closed since
+                cast_ballot(user, competition, scores, rescore=False)
+        except Exception as e:
+            logger.exception("Unable to write buffered ballot of user %s in competition %s", user.pk, competition.pk)
+            BufferedBallot.objects.filter(pk__in=members[(user, competition)]).update(
+                failed=timezone.now(), error=repr(e)
+            )
+            continue
+
+        written += len(scores)
+
+    for competition_id in {ballot.competition_id for ballot in batch}:
+        rescore_competition(competition_id)
+
+    return written
+
+
+def flush_votes(batch_size=None) -> int:
+    """
+    Drain the vote buffer into the database in batches, oldest ballots first.
+
+    Each batch is written and removed in one transaction, with its ballots locked. A concurrent flusher waits for the
+    batch to be committed and only sees later ballots afterwards, so an older ballot can never override a newer one.
+
+    :returns: The number of votes written
+    """
+    batch_size = batch_size or settings.VOTE_BUFFER_BATCH_SIZE
+
+    written = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                BufferedBallot.objects.select_for_update(of=("self",))
+                .filter(failed__isnull=True)
+                .select_related("user", "competition")
+                .order_by("pk")[:batch_size]
+            )
+            if not batch:
+                break
+
+            written += _write_batch(batch)
+            BufferedBallot.objects.filter(pk__in=[ballot.pk for ballot in batch], failed__isnull=True).delete()
+
+    return written
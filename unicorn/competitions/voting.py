@@ -0,0 +1,97 @@
+from accounts.constants import USER_ROLE_JURY
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from utilities.permissions import bulk_assign_perms
+
+from .constants import COMPETITION_STATE_VOTE
+from .models import Contributor, Entry, Vote
+from .scoring import apply_vote_deltas
+from .signals_achievements import send_user_has_voted
+
+
+def validate_ballot(user, competition, scores):
+    """
+    Run the same checks as Vote.clean() for all votes in a ballot at once, using set lookups instead of one set of
+    queries per vote.
+
+    :param scores: A dict of entry id to score
+    """
+    errors = {}
+
+    if competition.state != COMPETITION_STATE_VOTE:
+        errors.update({"competition": "It is not possible to vote in this competition now"})
+
+    entry_ids = set(scores.keys())
+    valid_ids = set(Entry.objects.filter(competition=competition, pk__in=entry_ids).values_list("pk", flat=True))
+    if entry_ids - valid_ids:
+        errors.update(
+            {
+                "votes": "Entries {} are not part of this competition".format(
+                    ", ".join(str(pk) for pk in sorted(entry_ids - valid_ids))
+                )
+            }
+        )
+
+    contributed = set(Contributor.objects.filter(user=user, entry_id__in=valid_ids).values_list("entry_id", flat=True))
+    if contributed:
+        errors.update({"user": "You cannot vote on entries you have contributed to"})
+
+    if errors:
+        raise ValidationError(errors)
+
+
+def cast_ballot(user, competition, scores, rescore=True):
+    """
+    Create or update a user's votes on many entries in a competition, and do the follow-up work which is normally done
+    per vote by signals (object permissions, scoring and achievements) once for the whole ballot.
+
+    The ballot must already be validated, see validate_ballot().
+
+    :param scores: A dict of entry id to score
+    :param rescore: Set to False when casting many ballots in a batch, and rescore the competition afterwards
+    :returns: A tuple of created and updated votes
+    """
+    jury = user.role == USER_ROLE_JURY
+
+    with transaction.atomic():
+        # select_for_update() below can't lock votes which don't exist yet, so concurrent ballots of the same user are
+        # serialized on the user row instead. Otherwise both would create the same votes and fail on unique_together.
+        list(type(user).objects.select_for_update().filter(pk=user.pk).values_list("pk"))
+        existing = {
+            vote.entry_id: vote
+            for vote in Vote.objects.select_for_update().filter(user=user, entry__competition=competition)
+        }
+
+        created = []
+        updated = []
+        deltas = {}
+        for entry_id, score in scores.items():
+            vote = existing.get(entry_id)
+            if vote is None:
+                vote = Vote(entry_id=entry_id, user=user, score=score, jury=jury)
+                created.append(vote)
+                previous = (0, 0)
+            elif vote.score != score or vote.jury != jury:
+                previous = (0, vote.score) if vote.jury else (vote.score, 0)
+                vote.score = score
+                vote.jury = jury
+                updated.append(vote)
+            else:
+                continue
+
+            current = (0, score) if jury else (score, 0)
+            deltas[entry_id] = (current[0] - previous[0], current[1] - previous[1])
+
+        Vote.objects.bulk_create(created)
+        Vote.objects.bulk_update(updated, ["score", "jury"])
+        for vote in created + updated:
+            vote.remember_score_state()
+
+        bulk_assign_perms(["view_vote", "change_vote", "delete_vote"], user, created)
+        apply_vote_deltas(competition.pk, deltas, rescore=rescore)
+
+        # notify about the first vote on each entry, like the post_save signal would
+        entry_ids = [vote.entry_id for vote in created]
+        transaction.on_commit(lambda: send_user_has_voted(user, competition.pk, entry_ids))
+
+    return created, updated
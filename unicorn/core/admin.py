@@ -2,6 +2,8 @@ from django.contrib import admin, messages
 from django.utils.translation import gettext_lazy as _
 from django.utils.translation import ngettext_lazy
 from guardian.admin import GuardedModelAdmin
+from utilities.reference import invalidate_reference
+from utilities.response_cache import invalidate_responses
 
 from .models import Event
 
@@ -23,8 +25,14 @@ class EventAdmin(GuardedModelAdmin):
 
     actions = ["activate", "deactivate", "show", "hide"]
 
+    def invalidate(self):
+        # update() doesn't send the signals which invalidate cached events
+        invalidate_reference(Event)
+        invalidate_responses(Event)
+
     def activate(self, request, queryset):
         updated = queryset.update(active=True)
+        self.invalidate()
         self.message_user(
             request,
             ngettext_lazy(
@@ -40,6 +48,7 @@ class EventAdmin(GuardedModelAdmin):
 
     def deactivate(self, request, queryset):
         updated = queryset.update(active=False)
+        self.invalidate()
         self.message_user(
             request,
             ngettext_lazy(
@@ -55,6 +64,7 @@ class EventAdmin(GuardedModelAdmin):
 
     def show(self, request, queryset):
         updated = queryset.update(visible=True)
+        self.invalidate()
         self.message_user(
             request,
             ngettext_lazy(
@@ -70,6 +80,7 @@ class EventAdmin(GuardedModelAdmin):
 
     def hide(self, request, queryset):
         updated = queryset.update(visible=False)
+        self.invalidate()
         self.message_user(
             request,
             ngettext_lazy(
@@ -1,14 +1,16 @@
 from rest_framework_guardian.filters import ObjectPermissionsFilter
 from utilities.api import ModelViewSet
 from utilities.permissions import StandardObjectPermissions
+from utilities.response_cache import CachedResponseMixin
 
 from ..models import Event
 from .serializers import EventSerializer
 
 
-class EventViewSet(ModelViewSet):
+class EventViewSet(CachedResponseMixin, ModelViewSet):
     queryset = Event.objects.all()
     serializer_class = EventSerializer
+    cache_models = (Event,)
 
     permission_classes = (StandardObjectPermissions,)
     filter_backends = (ObjectPermissionsFilter,)
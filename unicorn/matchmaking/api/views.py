@@ -14,6 +14,8 @@ from . import serializers
 class MatchRequestViewSet(ModelViewSet):
     queryset = MatchRequest.objects.all()
     serializer_class = serializers.MatchRequestSerializer
+    conditional_fields = ("last_updated",)
+    cursor_ordering = ("-last_updated", "-id")
 
 
 #
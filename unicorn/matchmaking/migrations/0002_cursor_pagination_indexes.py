@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matchmaking", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="matchrequest",
+            index=models.Index(fields=["-last_updated", "-id"], name="matchrequest_cursor_idx"),
+        ),
+    ]
@@ -34,6 +34,8 @@ class MatchRequest(CreatedUpdatedModel, models.Model):
 
     class Meta:
         ordering = ("-last_updated",)
+        # keys for cursor pagination, see MatchRequestViewSet
+        indexes = (models.Index(fields=("-last_updated", "-id"), name="matchrequest_cursor_idx"),)
 
     def __str__(self):
         return "{} looking for {} in {}".format(
@@ -1,14 +1,14 @@
-from django.contrib.auth.models import Group
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from guardian.shortcuts import assign_perm, remove_perm
 from matchmaking.models import MatchRequest
+from utilities.reference import get_group
 
 
 @receiver(post_save, sender=MatchRequest)
 def add_matchrequest_view_active(sender, instance, created, **kwargs):
     """Add permissions to allow anyone to view active MatchRequests"""
-    g = Group.objects.get(name="p-anonymous")
+    g = get_group("p-anonymous")
 
     if instance.active:
         assign_perm("view_matchrequest", g, instance)
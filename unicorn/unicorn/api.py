@@ -1,13 +1,24 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+import orjson
 from django.core.exceptions import PermissionDenied
+from django.core.exceptions import ValidationError as ModelValidationError
+from django.db import connections
+from django.db.models import F, Q
 from django.http import Http404
 from drf_spectacular.extensions import OpenApiAuthenticationExtension
 from rest_framework import exceptions, serializers
-from rest_framework.exceptions import APIException
+from rest_framework.exceptions import APIException, NotFound
 from rest_framework.metadata import SimpleMetadata
 from rest_framework.pagination import LimitOffsetPagination
-from rest_framework.renderers import BaseRenderer, BrowsableAPIRenderer
+from rest_framework.renderers import BaseRenderer, BrowsableAPIRenderer, JSONRenderer
 from rest_framework.request import clone_request
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.utils.field_mapping import ClassLookupDict
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 #
 # Renderers
@@ -26,6 +37,28 @@ class FormlessBrowsableAPIRenderer(BrowsableAPIRenderer):
         return None
 
 
+class FastJSONRenderer(JSONRenderer):
+    """
+    Encode with orjson, which is several times faster than the standard library for large lists. Dates and times are
+    passed to DRF's encoder, so the output is the same as with the stock renderer, which is still used for indented
+    output. The exception are NaN and infinite floats, which orjson encodes as null where the stock renderer refuses
+    them (or writes invalid JSON without STRICT_JSON).
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super(FastJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(
+            data,
+            default=JSONEncoder().default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+
+        # same as the stock renderer, these are valid JSON but not valid JavaScript
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+
+
 class PassthroughRenderer(BaseRenderer):
     """
     Return data as-is. View should supply a Response.
@@ -43,14 +76,44 @@ class PassthroughRenderer(BaseRenderer):
 #
 
 
+def estimate_count(queryset):
+    """
+    Number of rows the database planner expects a queryset to return, without running it. Only PostgreSQL is supported,
+    None is returned for other databases.
+    """
+    if connections[queryset.db].vendor != "postgresql":
+        return None
+
+    plan = json.loads(queryset.order_by().explain(format="json"))
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
 class OptionalLimitOffsetPagination(LimitOffsetPagination):
     """
     Override the stock paginator to allow setting limit=0 to disable pagination for a request. This returns all objects
     matching a query, but retains the same format as a paginated request. The limit can only be disabled if
     MAX_PAGE_SIZE has been set to 0 or None.
+
+    Views which set cursor_ordering can be paged with ?cursor instead, which skips the count and the offset scan, see
+    paginate_keyset(). Set cursor_by_default on the view to use cursors unless ?offset is given.
     """
 
+    cursor_query_param = "cursor"
+    keyset = None
+
+    def use_cursor(self, request, view) -> bool:
+        if not getattr(view, "cursor_ordering", None):
+            return False
+
+        if self.cursor_query_param in request.query_params:
+            return True
+
+        return getattr(view, "cursor_by_default", False) and self.offset_query_param not in request.query_params
+
     def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if view is not None and self.use_cursor(request, view):
+            return self.paginate_keyset(queryset, request, view.cursor_ordering)
 
         try:
             self.count = queryset.count()
@@ -71,6 +134,100 @@ class OptionalLimitOffsetPagination(LimitOffsetPagination):
         else:
             return list(queryset[self.offset :])
 
+    def stream_queryset(self, queryset, request):
+        """
+        Like paginate_queryset(), but return the page as a queryset to be iterated in chunks, see
+        ModelViewSet.streaming_response().
+        """
+        self.keyset = None
+        self.count = queryset.count()
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+        self.request = request
+
+        if self.count == 0 or self.offset > self.count:
+            return queryset.none()
+
+        if self.limit:
+            return queryset[self.offset : self.offset + self.limit]
+        else:
+            return queryset[self.offset :]
+
+    def paginate_keyset(self, queryset, request, ordering):
+        """
+        Return the page after the position in ?cursor, ordered by the given fields. The fields must not be nullable and
+        must be unique together, e.g. ("-last_updated", "-id"), and should be covered by an index.
+        """
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.keyset = [(field.lstrip("-"), field.startswith("-")) for field in ordering]
+        self.estimated_count = estimate_count(queryset)
+
+        # annotate the keys, so they can be read from model instances and .values() rows alike
+        keys = {f"cursor_key_{i}": F(name) for i, (name, _) in enumerate(self.keyset)}
+        queryset = queryset.annotate(**keys).order_by(*ordering)
+
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+
+        page = list(queryset[: self.limit + 1] if self.limit else queryset)
+        self.next_position = None
+        if self.limit and len(page) > self.limit:
+            page = page[: self.limit]
+            last = page[-1]
+            self.next_position = [last[key] if isinstance(last, dict) else getattr(last, key) for key in keys]
+
+        return page
+
+    def after(self, position):
+        # (a, b, c) after (x, y, z) is a > x or (a = x and b > y) or (a = x and b = y and c > z)
+        condition = Q()
+        for i, (name, descending) in enumerate(self.keyset):
+            equal = {key: value for (key, _), value in zip(self.keyset[:i], position)}
+            condition |= Q(**equal, **{f"{name}__{'lt' if descending else 'gt'}": position[i]})
+
+        return condition
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            values = json.loads(urlsafe_b64decode(encoded.encode()))
+            if len(values) != len(self.keyset):
+                raise ValueError()
+            return [model._meta.get_field(name).to_python(v) for (name, _), v in zip(self.keyset, values)]
+        except (ValueError, TypeError, ModelValidationError):
+            raise NotFound("Invalid cursor")
+
+    def get_next_link(self):
+        if self.keyset is None:
+            return super(OptionalLimitOffsetPagination, self).get_next_link()
+
+        if self.next_position is None:
+            return None
+
+        cursor = urlsafe_b64encode(json.dumps(self.next_position, default=str).encode()).decode()
+        url = remove_query_param(self.request.build_absolute_uri(), self.offset_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        if self.keyset is None:
+            return super(OptionalLimitOffsetPagination, self).get_paginated_response(data)
+
+        return Response(
+            OrderedDict(
+                [
+                    ("estimated_count", self.estimated_count),
+                    ("next", self.get_next_link()),
+                    ("previous", None),
+                    ("results", data),
+                ]
+            )
+        )
+
     def get_limit(self, request):
 
         from django.conf import settings
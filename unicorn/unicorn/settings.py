@@ -129,6 +129,33 @@ if REDIS_CONNECTION:
 else:
     CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
 
+# Whether the default cache is shared by all processes serving requests. Permissions and reference data are cached in
+# each process and invalidated through the default cache, so those caches are only used when it is shared, see
+# utilities.cache.LocalVersionedCache. The test runner is a single process.
+SHARED_CACHE = env.bool("SHARED_CACHE", default=bool(REDIS_CONNECTION) or TESTING)
+
+# Number of entries nested in each competition by the competitions API, or 0 to nest all of them. When limited, clients
+# have to compare the nested entries with entries_count and get the rest from the entries API.
+COMPETITION_NESTED_ENTRIES_LIMIT = env.int("COMPETITION_NESTED_ENTRIES_LIMIT", default=0)
+
+# Serve the hottest read-only lists (competitions, entries for voting) through hand-written serializers, see
+# utilities.fast_serializers. The output is the same as with the regular serializers.
+FAST_SERIALIZERS_ENABLED = env.bool("FAST_SERIALIZERS_ENABLED", default=False)
+
+# Unlimited list responses (limit=0) are serialized, encoded and sent this many objects at a time, instead of building
+# the whole response in memory. Set to 0 to disable streaming.
+LIST_STREAMING_CHUNK_SIZE = env.int("LIST_STREAMING_CHUNK_SIZE", default=100)
+
+# Seconds to keep API responses shared by anonymous users and users in the same groups, see utilities.response_cache.
+# Responses are invalidated when the data changes, this only bounds fields which depend on the current time. Set to 0 to
+# disable the response cache.
+RESPONSE_CACHE_TIMEOUT = env.int("RESPONSE_CACHE_TIMEOUT", default=60)
+
+# Write-behind buffer for votes. Accepted ballots are queued in the database and written by flush_vote_buffer, see
+# competitions.vote_buffer.
+VOTE_BUFFER_ENABLED = env.bool("VOTE_BUFFER_ENABLED", default=False)
+VOTE_BUFFER_BATCH_SIZE = env.int("VOTE_BUFFER_BATCH_SIZE", default=500)
+
 
 # Authentication
 
@@ -340,8 +367,8 @@ MEDIA_URL = "/{}media/".format(BASE_PATH)
 # Disable default limit of 1000 fields per request. Needed for bulk deletion of objects. (Added in Django 1.10.)
 DATA_UPLOAD_MAX_NUMBER_FIELDS = None
 
-# Allow bigger files
-DATA_UPLOAD_MAX_MEMORY_SIZE = 1288490189  # 1,2 GB
+# Largest request body read into memory. TUS uploads are streamed to disk and not limited by this, see TUS_BUFFER_SIZE.
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10 MB
 
 # Messages
 MESSAGE_TAGS = {messages.ERROR: "danger"}
@@ -368,7 +395,7 @@ REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "unicorn.api.OptionalLimitOffsetPagination",
     "DEFAULT_PERMISSION_CLASSES": ("utilities.permissions.StandardObjectPermissions",),
     "DEFAULT_RENDERER_CLASSES": (
-        "rest_framework.renderers.JSONRenderer",
+        "unicorn.api.FastJSONRenderer",
         "unicorn.api.FormlessBrowsableAPIRenderer",
         # "rest_framework.renderers.BrowsableAPIRenderer",
     ),
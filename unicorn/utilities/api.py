@@ -1,16 +1,22 @@
+import hashlib
 from collections import OrderedDict
+from itertools import islice
 
 import pytz
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.exceptions import ValidationError as ModelValidationError
-from django.db.models import ManyToManyField
-from django.http import Http404
+from django.db.models import Count, ManyToManyField, Max, prefetch_related_objects
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from guardian.core import ObjectPermissionChecker
 from guardian.shortcuts import get_perms
 from rest_framework.exceptions import APIException
 from rest_framework.permissions import BasePermission
 from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.serializers import (
     Field,
@@ -21,7 +27,11 @@ from rest_framework.serializers import (
 from rest_framework.viewsets import ModelViewSet as _ModelViewSet
 from rest_framework.viewsets import ViewSet
 
+from .cache import get_versions
+from .permissions import AnonymousPermissionChecker, get_anonymous_user
+from .response_cache import get_audience
 from .utils import dynamic_import
+from .visibility import permissions_namespace
 
 WRITE_OPERATIONS = ["create", "update", "partial_update", "delete"]
 
@@ -48,6 +58,23 @@ def get_serializer_for_model(model, prefix=""):
 #
 
 
+def request_cache(context, key, default):
+    """
+    Compute a value once per request, so it can be shared by every serializer and every object serialized while
+    handling the request. Without a request in the context the value is computed every time.
+    """
+    request = context.get("request")
+    if request is None:
+        return default()
+
+    if not hasattr(request, "_serializer_cache"):
+        request._serializer_cache = {}
+    if key not in request._serializer_cache:
+        request._serializer_cache[key] = default()
+
+    return request._serializer_cache[key]
+
+
 class IsAuthenticatedOrLoginNotRequired(BasePermission):
     """
     Returns True if the user is authenticated or LOGIN_REQUIRED is False.
@@ -191,16 +218,66 @@ class SerializedPKRelatedField(PrimaryKeyRelatedField):
 #
 
 
+def parse_field_names(value) -> frozenset:
+    return frozenset(name.strip() for name in (value or "").split(",") if name.strip())
+
+
+def field_selected(name, fields=None, omit=(), expand=(), expandable=()) -> bool:
+    """
+    Whether a field is rendered for a sparse fieldset. Expandable fields are only rendered when asked for by name.
+    """
+    if name in omit:
+        return False
+    if name in expand:
+        return True
+    if name in expandable:
+        return fields is not None and name in fields
+
+    return fields is None or name in fields
+
+
+def multi_valued_path(model, path) -> str:
+    """
+    The longest prefix of a lookup path ending in a multi-valued relation, or "" if it only follows single-valued ones.
+    """
+    names = path.split("__")
+    prefix = ""
+    for i, name in enumerate(names[:-1]):
+        field = model._meta.get_field(name)
+        if field.many_to_many or field.one_to_many:
+            prefix = "__".join(names[: i + 1])
+        model = field.related_model
+
+    return prefix
+
+
 # TODO: We should probably take a fresh look at exactly what we're doing with this. There might be a more elegant
 # way to enforce model validation on the serializer.
 class ValidatedModelSerializer(ModelSerializer):
     """
     Extends the built-in ModelSerializer to enforce calling clean() on the associated model during validation.
+
+    The rendered fields can be narrowed down with the fields and omit arguments, and fields listed in
+    Meta.expandable_fields are only rendered when named in expand, see ModelViewSet.get_field_selection(). Columns
+    listed in Meta.deferrable_fields are deferred by the view when their field is not rendered.
     """
 
     obj_type = SerializerMethodField()
     permissions = SerializerMethodField()
 
+    def __init__(self, *args, fields=None, omit=(), expand=(), **kwargs):
+        self.selection = {"fields": fields, "omit": omit, "expand": expand}
+        super(ValidatedModelSerializer, self).__init__(*args, **kwargs)
+
+    @classmethod
+    def renders(cls, name, fields=None, omit=(), expand=()) -> bool:
+        expandable = getattr(cls.Meta, "expandable_fields", ())
+        return field_selected(name, fields, omit, expand, expandable)
+
+    def get_fields(self):
+        fields = super(ValidatedModelSerializer, self).get_fields()
+        return OrderedDict((name, field) for name, field in fields.items() if self.renders(name, **self.selection))
+
     def validate(self, data):
         attrs = data.copy()
 
@@ -228,7 +305,10 @@ class ValidatedModelSerializer(ModelSerializer):
         return "full"
 
     def get_permissions(self, obj) -> list:
-        return [f"{obj._meta.app_label}.{p}" for p in list(get_perms(self.context["request"].user, obj))]
+        # use the request's permission checker when there is one, it has the permissions of the whole page prefetched
+        checker = self.context.get("permission_checker")
+        perms = checker.get_perms(obj) if checker else get_perms(self.context["request"].user, obj)
+        return [f"{obj._meta.app_label}.{p}" for p in perms]
 
 
 class WritableNestedSerializer(ModelSerializer):
@@ -263,15 +343,258 @@ class WritableNestedSerializer(ModelSerializer):
 class ModelViewSet(_ModelViewSet):
     """
     Accept either a single object or a list of objects to create.
+
+    Object permissions of everything being serialized are prefetched in bulk before serialization. Set
+    permission_prefetch to related managers whose objects are serialized with permissions as well, e.g. ("files",).
+
+    Set conditional_fields to answer GET requests with ETag and Last-Modified validators, and with 304 Not Modified
+    when the client's copy is still current. The first field must be the timestamp of the object itself.
     """
 
+    permission_prefetch = ()
+
+    # timestamp fields used as validators for conditional GET requests, e.g. ("last_updated", "files__last_updated")
+    conditional_fields = ()
+
+    def get_permission_checker(self):
+        if not hasattr(self, "_permission_checker"):
+            if self.request.user.pk == get_anonymous_user().pk:
+                self._permission_checker = AnonymousPermissionChecker()
+            else:
+                self._permission_checker = ObjectPermissionChecker(self.request.user)
+
+        return self._permission_checker
+
+    def prefetch_permissions(self, objects):
+        checker = self.get_permission_checker()
+        checker.prefetch_perms(objects)
+
+        permission_prefetch = [name for name in self.permission_prefetch if self.renders_field(name)]
+        if permission_prefetch:
+            prefetch_related_objects(objects, *permission_prefetch)
+            for name in permission_prefetch:
+                related = [rel for obj in objects for rel in getattr(obj, name).all()]
+                if related:
+                    checker.prefetch_perms(related)
+
+    def serializes_permissions(self):
+        meta = getattr(self.get_serializer_class(), "Meta", None)
+        return "permissions" in getattr(meta, "fields", ()) and self.renders_field("permissions")
+
+    def get_field_selection(self) -> dict:
+        """
+        The fields requested with ?fields, ?omit and ?expand, as arguments for a ValidatedModelSerializer. Only reads
+        are narrowed down, so writes always respond with the full object.
+        """
+        if self.request is None or self.request.method not in ("GET", "HEAD"):
+            return {}
+        if not issubclass(self.get_serializer_class(), ValidatedModelSerializer):
+            return {}
+
+        params = self.request.query_params
+        return {
+            "fields": parse_field_names(params["fields"]) if "fields" in params else None,
+            "omit": parse_field_names(params.get("omit")),
+            "expand": parse_field_names(params.get("expand")),
+        }
+
+    def renders_field(self, name) -> bool:
+        """
+        Whether the response renders a field, so views only prefetch and select what is needed.
+        """
+        selection = self.get_field_selection()
+        if not selection:
+            return True
+
+        return self.get_serializer_class().renders(name, **selection)
+
+    def filter_queryset(self, queryset):
+        queryset = super(ModelViewSet, self).filter_queryset(queryset)
+
+        # defer large columns the response won't render
+        meta = getattr(self.get_serializer_class(), "Meta", None)
+        deferred = [name for name in getattr(meta, "deferrable_fields", ()) if not self.renders_field(name)]
+        if deferred and self.get_field_selection():
+            queryset = queryset.defer(*deferred)
+
+        return queryset
+
+    def get_serializer_context(self):
+        context = super(ModelViewSet, self).get_serializer_context()
+        context["permission_checker"] = self.get_permission_checker()
+
+        return context
+
     def get_serializer(self, *args, **kwargs):
         # If a list of objects has been provided, initialize the serializer with many=True
         if isinstance(kwargs.get("data", {}), list):
             kwargs["many"] = True
 
+        if "data" not in kwargs:
+            kwargs.update(self.get_field_selection())
+
+        # Prefetch permissions for objects we are about to serialize
+        if args and args[0] is not None and "data" not in kwargs and self.serializes_permissions():
+            instance = args[0]
+            if kwargs.get("many"):
+                # evaluate querysets here, so the serializer gets the instances we prefetched for
+                instance = list(instance)
+                args = (instance, *args[1:])
+                objects = instance
+            else:
+                objects = [instance]
+
+            if objects:
+                self.prefetch_permissions(objects)
+
         return super(ModelViewSet, self).get_serializer(*args, **kwargs)
 
+    def get_validator_models(self) -> tuple:
+        """
+        The models whose object permissions decide what a user sees of a response, see get_audience().
+        """
+        model = self.get_queryset().model
+        related = (model._meta.get_field(name).related_model for name in self.permission_prefetch)
+        return getattr(self, "cache_models", ()) or (model, *related)
+
+    def get_validators(self, values, last_modified=None):
+        """
+        Build the ETag of a response from the given values, the permission state which decides what the requesting
+        user gets to see and how the response was requested. Users of the same audience share their ETags.
+        """
+        ctype = ContentType.objects.get_for_model(self.get_queryset().model)
+        versions = get_versions(("global-permissions", "group-membership", permissions_namespace(ctype.pk)))
+        audience = get_audience(self.request.user, self.get_validator_models())
+        if audience is None:
+            audience = ("user", self.request.user.pk)
+
+        key = repr((self.request.get_full_path(), self.request.accepted_media_type, audience, versions, values))
+        etag = 'W/"%s"' % hashlib.md5(key.encode()).hexdigest()
+
+        return etag, int(last_modified.timestamp()) if last_modified else None
+
+    @staticmethod
+    def aggregate_timestamps(queryset, fields) -> list:
+        """
+        The latest timestamp and the number of objects of each field, e.g. "files__last_updated". Counting the objects
+        as well catches deletions, which don't move the latest timestamp.
+
+        Fields are aggregated in one query per multi-valued relation they span, joining several of them at once would
+        aggregate over the product of their rows.
+        """
+        queryset = queryset.order_by().prefetch_related(None)
+
+        groups = {}
+        for i, field in enumerate(fields):
+            groups.setdefault(multi_valued_path(queryset.model, field), []).append((i, field))
+
+        result = {}
+        for group in groups.values():
+            aggregates = {}
+            for i, field in group:
+                aggregates[f"max_{i}"] = Max(field)
+                aggregates[f"count_{i}"] = Count(field.rpartition("__")[0] or "pk", distinct=True)
+            result.update(queryset.aggregate(**aggregates))
+
+        return sorted(result.items())
+
+    def get_list_validators(self, queryset):
+        # a deletion can't be seen from the latest timestamp, so lists are only validated by their ETag
+        return self.get_validators(self.aggregate_timestamps(queryset, self.conditional_fields))
+
+    def get_object_validators(self, instance):
+        last_modified = getattr(instance, self.conditional_fields[0])
+
+        related = []
+        if len(self.conditional_fields) > 1:
+            queryset = type(instance).objects.filter(pk=instance.pk)
+            related = self.aggregate_timestamps(queryset, self.conditional_fields[1:])
+            last_modified = max([last_modified] + [v for k, v in related if k.startswith("max_") and v is not None])
+
+        return self.get_validators((last_modified, related), last_modified=last_modified)
+
+    def conditional_response(self, validators, build):
+        """
+        Answer with 304 Not Modified if the client already has the current representation, otherwise build the
+        response and attach the validators to it.
+        """
+        if validators is None:
+            return build()
+
+        etag, last_modified = validators
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = build()
+
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if last_modified:
+                response["Last-Modified"] = http_date(last_modified)
+            patch_vary_headers(response, ("Authorization", "Cookie"))
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        validators = self.get_list_validators(queryset) if self.conditional_fields else None
+
+        return self.conditional_response(validators, lambda: self.list_response(queryset))
+
+    def streams_list(self) -> bool:
+        """
+        Whether to stream a list response, which is done for unlimited JSON lists (limit=0) so the whole list is never
+        serialized or encoded in memory at once.
+        """
+        return (
+            bool(settings.LIST_STREAMING_CHUNK_SIZE)
+            and self.request.query_params.get("limit") == "0"
+            and isinstance(self.request.accepted_renderer, JSONRenderer)
+            and "indent" not in self.request.accepted_media_type
+            and hasattr(self.paginator, "stream_queryset")
+            and not self.paginator.use_cursor(self.request, self)
+        )
+
+    def streaming_response(self, queryset, serialize):
+        """
+        Stream a list in the same envelope as a paginated response, serializing and encoding one chunk of the queryset
+        at a time.
+        """
+        queryset = self.paginator.stream_queryset(queryset, self.request)
+        envelope = self.paginator.get_paginated_response([]).data
+        renderer = self.request.accepted_renderer
+        chunk_size = settings.LIST_STREAMING_CHUNK_SIZE
+
+        def stream():
+            # the envelope without its closing "]}", then the results one by one
+            yield renderer.render(envelope)[:-2]
+            rows = queryset.iterator(chunk_size=chunk_size)
+            separator = b""
+            while chunk := list(islice(rows, chunk_size)):
+                for item in serialize(chunk):
+                    yield separator + renderer.render(item)
+                    separator = b","
+            yield b"]}"
+
+        return StreamingHttpResponse(stream(), content_type=renderer.media_type)
+
+    def list_response(self, queryset):
+        if self.streams_list():
+            return self.streaming_response(queryset, lambda chunk: self.get_serializer(chunk, many=True).data)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        validators = self.get_object_validators(instance) if self.conditional_fields else None
+
+        return self.conditional_response(validators, lambda: Response(self.get_serializer(instance).data))
+
 
 class FieldChoicesViewSet(ViewSet):
     """
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class UtilitiesConfig(AppConfig):
+    name = "utilities"
+
+    def ready(self):
+        import utilities.signals  # noqa: F401
@@ -1,11 +1,12 @@
-from django.contrib.auth import get_user_model
 from drf_spectacular.extensions import OpenApiAuthenticationExtension
 from rest_framework.authentication import BaseAuthentication
 
+from .permissions import get_anonymous_user
+
 
 class AuthenticateAnonymous(BaseAuthentication):
     def authenticate(self, request):
-        anon = get_user_model().get_anonymous()
+        anon = get_anonymous_user()
 
         return (anon, None)
 
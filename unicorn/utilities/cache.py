@@ -0,0 +1,86 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _version_key(namespace):
+    return f"version/{namespace}"
+
+
+def get_version(namespace) -> int:
+    """
+    Get the current version of a cache namespace. Cached data should include the version in its key, so it is
+    invalidated by bump_version().
+    """
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        # start from the clock rather than 1, so an evicted version never brings back data cached under an old one
+        cache.add(_version_key(namespace), int(time.time() * 1000), None)
+        version = cache.get(_version_key(namespace))
+
+    return version
+
+
+def get_versions(namespaces) -> tuple:
+    """
+    Get the current versions of several cache namespaces with a single cache read.
+    """
+    versions = cache.get_many([_version_key(namespace) for namespace in namespaces])
+    return tuple(versions.get(_version_key(namespace)) or get_version(namespace) for namespace in namespaces)
+
+
+def bump_version(*namespaces):
+    """
+    Invalidate everything cached under the given namespaces.
+
+    The version is bumped right away, so the current transaction does not read stale data, and again after commit,
+    so other processes can't keep data they cached before the commit.
+    """
+
+    def bump():
+        for namespace in namespaces:
+            try:
+                cache.incr(_version_key(namespace))
+            except ValueError:
+                get_version(namespace)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+class LocalVersionedCache:
+    """
+    Process-local cache for data which is expensive to build and cheap to keep in memory, invalidated across processes
+    through a shared version. Each lookup costs a single read from the shared cache.
+
+    Versions bumped by other processes are only seen when the default cache is shared between them (SHARED_CACHE).
+    Otherwise nothing is kept, and every lookup builds the value.
+    """
+
+    def __init__(self):
+        self._data = {}
+
+    def get_or_set(self, key, namespace, default):
+        """
+        :param namespace: A namespace, or a tuple of namespaces which all invalidate the value
+        """
+        if not settings.SHARED_CACHE:
+            return default()
+
+        if isinstance(namespace, tuple):
+            version = get_versions(namespace)
+        else:
+            version = get_version(namespace)
+
+        cached = self._data.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        value = default()
+        self._data[key] = (version, value)
+        return value
+
+    def clear(self):
+        self._data.clear()
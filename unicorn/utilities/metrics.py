@@ -0,0 +1,27 @@
+import logging
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+def _key(name):
+    return f"metrics/{name}"
+
+
+def increment(name, value=1):
+    """
+    Add to a counter shared by all processes. Counters live in the default cache and are reset when it is cleared.
+    """
+    cache.add(_key(name), 0, None)
+    try:
+        cache.incr(_key(name), value)
+    except ValueError:
+        # evicted between add and incr
+        cache.set(_key(name), value, None)
+
+    logger.info("%s +%d", name, value)
+
+
+def get_counter(name) -> int:
+    return cache.get(_key(name), 0)
@@ -1,13 +1,30 @@
 from accounts.constants import USER_DISPLAY_AKA, USER_ROLE_ANON
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
 from django.http import Http404
 from guardian.mixins import PermissionRequiredMixin
 from guardian.shortcuts import get_objects_for_user
+from guardian.utils import (
+    get_group_obj_perms_model,
+    get_identity,
+    get_user_obj_perms_model,
+)
 from rest_framework import permissions
 from rest_framework.filters import BaseFilterBackend
 
+from .visibility import (
+    invalidate_object_permissions,
+    object_ids_with_perms,
+    permission_codenames,
+    user_visible_ids,
+    visibility_cache,
+    visible_objects_filter,
+)
+
 SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
 
 
@@ -20,6 +37,180 @@ def get_anonymous_user_instance(user_class):
     )
 
 
+def get_anonymous_user():
+    """
+    Return the anonymous user, cached for the whole process along with its global permissions. The instance is shared
+    between requests, so treat it as read only.
+
+    Revoking a permission is only seen by other processes through the shared cache, so without SHARED_CACHE the user
+    is looked up on every call, see LocalVersionedCache.
+    """
+
+    def build():
+        anon = get_user_model().get_anonymous()
+        # fill the permission cache of the auth backend, so permission checks on the instance are free from now on
+        anon.get_all_permissions()
+        return anon
+
+    return visibility_cache.get_or_set(
+        "anonymous-user", ("anonymous-user", "global-permissions", "group-membership"), build
+    )
+
+
+def anonymous_has_perms(perms, obj) -> bool:
+    """
+    Check object permissions of the anonymous user, using the visibility index instead of querying guardian.
+    """
+    codenames = [perm.split(".", 1)[-1] for perm in perms]
+    return obj.pk in object_ids_with_perms(get_anonymous_user(), obj.__class__, codenames, cached=True)
+
+
+class AnonymousPermissionChecker:
+    """
+    Stand-in for guardian's ObjectPermissionChecker for the anonymous user, answering from the visibility index.
+    """
+
+    def __init__(self):
+        self._visible = {}
+
+    def prefetch_perms(self, objects):
+        return True
+
+    def get_perms(self, obj):
+        model = obj.__class__
+        if model not in self._visible:
+            anon = get_anonymous_user()
+            self._visible[model] = [
+                (codename, user_visible_ids(anon, model, codename, cached=True))
+                for codename in permission_codenames(model)
+            ]
+
+        return [codename for codename, visible in self._visible[model] if obj.pk in visible]
+
+
+def bulk_assign_perms(perms, user_or_group, objects):
+    """
+    Assign a set of object permissions for a single user or group on many objects of the same model, using a single
+    INSERT. Unlike guardian's bulk assign_perm, existing permissions are not looked up first, and permissions which are
+    already assigned are ignored by the database instead.
+    """
+    objects = list(objects)
+    if not objects:
+        return []
+
+    ctype = ContentType.objects.get_for_model(objects[0])
+    permissions = list(Permission.objects.filter(content_type=ctype, codename__in=perms))
+
+    user, group = get_identity(user_or_group)
+    if user:
+        model = get_user_obj_perms_model(objects[0])
+        identity = {"user": user}
+    else:
+        model = get_group_obj_perms_model(objects[0])
+        identity = {"group": group}
+
+    rows = [
+        model(permission=permission, content_type=ctype, object_pk=str(obj.pk), **identity)
+        for obj in objects
+        for permission in permissions
+    ]
+    created = model.objects.bulk_create(rows, ignore_conflicts=True)
+
+    # bulk_create does not send post_save, so invalidate cached visibility ourselves
+    invalidate_object_permissions(ctype)
+    return created
+
+
+def bulk_remove_perms(perms, user_or_group, objects) -> int:
+    """
+    Remove a set of object permissions for a single user or group from many objects of the same model, using a single
+    DELETE. Returns the number of removed permissions.
+    """
+    objects = list(objects)
+    if not objects:
+        return 0
+
+    ctype = ContentType.objects.get_for_model(objects[0])
+
+    user, group = get_identity(user_or_group)
+    if user:
+        model = get_user_obj_perms_model(objects[0])
+        identity = {"user": user}
+    else:
+        model = get_group_obj_perms_model(objects[0])
+        identity = {"group": group}
+
+    rows = model.objects.filter(
+        content_type=ctype,
+        permission__in=Permission.objects.filter(content_type=ctype, codename__in=perms),
+        object_pk__in=[str(obj.pk) for obj in objects],
+        **identity,
+    )
+
+    # guardian's permission rows have no relations to cascade to, post_delete invalidates the cached visibility
+    removed, _ = rows.delete()
+    return removed
+
+
+def sync_user_perms(desired, user_ids, objects, codenames) -> int:
+    """
+    Make the object permissions of a set of users on a set of objects match the desired state, reading the current
+    state with a single query and applying only the difference with one bulk insert and one delete. Permissions of
+    other users, on other objects or with other codenames are left alone.
+
+    :param desired: A set of (user id, codename, object) tuples
+    :param objects: The objects in scope, which may be of different models
+    :returns: The number of permission rows inserted or deleted
+    """
+    model = get_user_obj_perms_model()
+    objects = {(ContentType.objects.get_for_model(obj).pk, str(obj.pk)): obj for obj in objects}
+    if not objects or not user_ids:
+        return 0
+
+    ctype_ids = {ctype_id for ctype_id, _ in objects}
+    permissions = {
+        (ctype_id, codename): pk
+        for pk, ctype_id, codename in Permission.objects.filter(
+            content_type_id__in=ctype_ids, codename__in=codenames
+        ).values_list("pk", "content_type_id", "codename")
+    }
+
+    wanted = set()
+    for user_id, codename, obj in desired:
+        ctype_id = ContentType.objects.get_for_model(obj).pk
+        wanted.add((user_id, permissions[(ctype_id, codename)], ctype_id, str(obj.pk)))
+
+    in_scope = Q()
+    for ctype_id in ctype_ids:
+        in_scope |= Q(content_type_id=ctype_id, object_pk__in=[pk for c, pk in objects if c == ctype_id])
+
+    existing = {
+        (user_id, permission_id, ctype_id, object_pk): pk
+        for pk, user_id, permission_id, ctype_id, object_pk in model.objects.filter(
+            in_scope, user_id__in=user_ids, permission_id__in=permissions.values()
+        ).values_list("pk", "user_id", "permission_id", "content_type_id", "object_pk")
+    }
+
+    missing = wanted - existing.keys()
+    model.objects.bulk_create(
+        [
+            model(user_id=user_id, permission_id=permission_id, content_type_id=ctype_id, object_pk=object_pk)
+            for user_id, permission_id, ctype_id, object_pk in missing
+        ],
+        ignore_conflicts=True,
+    )
+
+    surplus = [pk for key, pk in existing.items() if key not in wanted]
+    model.objects.filter(pk__in=surplus).delete()
+
+    # neither bulk_create nor deleting by queryset is guaranteed to send signals, so invalidate cached visibility here
+    if missing or surplus:
+        for ctype_id in ctype_ids:
+            invalidate_object_permissions(ContentType.objects.get_for_id(ctype_id))
+
+    return len(missing) + len(surplus)
+
+
 class StandardObjectPermissions(permissions.DjangoObjectPermissions):
     """
     Similar to 'DjangoObjectPermissions', but adding 'view' permissions.
@@ -51,18 +242,17 @@ class StandardObjectPermissions(permissions.DjangoObjectPermissions):
 
         queryset = self._queryset(view)
         perms = self.get_required_permissions(request.method, queryset.model)
-        anon = get_user_model().get_anonymous()
+        anon = get_anonymous_user()
 
         user_has_access = request.user.has_perms(perms)
         anon_has_access = anon.has_perms(perms)
 
         if not user_has_access and not anon_has_access:
-            user_count = get_objects_for_user(request.user, perms).count()
-            if user_count > 0:
+            if request.user.pk != anon.pk and get_objects_for_user(request.user, perms).exists():
                 return True
 
-            anon_count = get_objects_for_user(anon, perms).count()
-            if anon_count > 0:
+            codenames = [perm.split(".", 1)[-1] for perm in perms]
+            if object_ids_with_perms(anon, queryset.model, codenames, cached=True):
                 return True
 
         return user_has_access or anon_has_access
@@ -72,14 +262,15 @@ class StandardObjectPermissions(permissions.DjangoObjectPermissions):
         queryset = self._queryset(view)
         model_cls = queryset.model
         user = request.user
-        anon = get_user_model().get_anonymous()
+        anon = get_anonymous_user()
 
-        perms = self.get_required_object_permissions(request.method, model_cls)
+        def has_perms(perms):
+            # permissions of the anonymous user are cached, so check those first
+            return anonymous_has_perms(perms, obj) or (user.pk != anon.pk and user.has_perms(perms, obj))
 
-        user_has_access = user.has_perms(perms, obj)
-        anon_has_access = anon.has_perms(perms, obj)
+        perms = self.get_required_object_permissions(request.method, model_cls)
 
-        if not user_has_access and not anon_has_access:
+        if not has_perms(perms):
             # If the user does not have permissions we need to determine if
             # they have read permissions to see 403, or not, and simply see
             # a 404 response.
@@ -90,7 +281,7 @@ class StandardObjectPermissions(permissions.DjangoObjectPermissions):
                 raise Http404
 
             read_perms = self.get_required_object_permissions("GET", model_cls)
-            if not user.has_perms(read_perms, obj) and not anon.has_perms(read_perms, obj):
+            if not has_perms(read_perms):
                 raise Http404
 
             # nope
@@ -113,9 +304,11 @@ class PermissionRequiredMixinWithAnonymous(PermissionRequiredMixin):
         forbidden = super(PermissionRequiredMixinWithAnonymous, self).check_permissions(request)
         if forbidden:
             perms = self.get_required_permissions(request)
-            anon = get_user_model().get_anonymous()
             obj = self.get_permission_object()
-            has_permissions = all(anon.has_perm(perm, obj) for perm in perms)
+            if obj is None:
+                has_permissions = get_anonymous_user().has_perms(perms)
+            else:
+                has_permissions = anonymous_has_perms(perms, obj)
             if has_permissions:
                 forbidden = None
         return forbidden
@@ -128,28 +321,25 @@ class DjangoObjectPermissionsFilter(BaseFilterBackend):
     """
 
     perm_format = "%(app_label)s.view_%(model_name)s"
-    shortcut_kwargs = {"accept_global_perms": True}
 
     def __init__(self):
         if "guardian" not in settings.INSTALLED_APPS:
             raise ImproperlyConfigured("Using DjangoObjectPermissionsFilter, but django-guardian is not installed.")
 
     def filter_queryset(self, request, queryset, view):
-        # We want to defer this import until runtime, rather than import-time.
-        # See https://github.com/encode/django-rest-framework/issues/4608
-        # (Also see #1624 for why we need to make this import explicitly)
-        from guardian.shortcuts import get_objects_for_user
-
         user = request.user
-        anon = get_user_model().get_anonymous()
+        anon = get_anonymous_user()
 
         permission = self.perm_format % {
             "app_label": queryset.model._meta.app_label,
             "model_name": queryset.model._meta.model_name,
         }
 
-        user_objects = get_objects_for_user(user, permission, queryset, **self.shortcut_kwargs)
-        anon_objects = get_objects_for_user(anon, permission, queryset, **self.shortcut_kwargs)
+        # global permissions give access to everything
+        if user.is_superuser or user.has_perm(permission) or anon.has_perm(permission):
+            return queryset
 
-        objects = user_objects | anon_objects
-        return objects.distinct()
+        # permissions of the requesting and the anonymous user, and of their groups, are semi-joined in the query
+        codename = permission.split(".", 1)[1]
+        users = [anon.pk] if user.pk == anon.pk else [anon.pk, user.pk]
+        return queryset.filter(visible_objects_filter(users, queryset.model, codename))
@@ -0,0 +1,41 @@
+from django.contrib.auth.models import Group
+
+from .cache import LocalVersionedCache, bump_version
+
+# small and rarely changing tables (groups, genres, events and such), shared by every request handled by this process
+reference_cache = LocalVersionedCache()
+
+
+def reference_namespace(model) -> str:
+    """
+    Cache namespace for a reference model. Bumped by invalidate_reference() whenever a row is saved or deleted.
+    """
+    return f"reference/{model._meta.label_lower}"
+
+
+def invalidate_reference(model):
+    """
+    Invalidate everything cached from a reference model. Should be called from post_save and post_delete receivers.
+    """
+    bump_version(reference_namespace(model))
+
+
+def cached_reference(key, models, default):
+    """
+    Get a value built from reference models from the process cache, building it when any of the models changed.
+
+    Cached values are shared, so model instances in them must not be modified. Without a cache shared between the
+    processes (SHARED_CACHE) changes made by other processes can't be seen, so the value is built on every call.
+    """
+    return reference_cache.get_or_set(key, tuple(reference_namespace(model) for model in models), default)
+
+
+def get_group(name) -> Group:
+    """
+    Like Group.objects.get(name=name), without hitting the database for groups which were looked up before.
+    """
+    group = cached_reference(("group", name), [Group], lambda: Group.objects.filter(name=name).first())
+    if group is None:
+        raise Group.DoesNotExist(f"Group {name} does not exist")
+
+    return group
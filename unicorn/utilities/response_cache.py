@@ -0,0 +1,128 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+from django.utils.http import parse_http_date
+from guardian.models import UserObjectPermission
+from rest_framework.response import Response
+
+from .cache import bump_version, get_versions
+from .permissions import get_anonymous_user
+from .visibility import permissions_namespace
+
+
+def response_namespace(model, field=None) -> str:
+    """
+    Cache namespace for API responses built from a model. Bumped by invalidate_responses() whenever a row is saved or
+    deleted. Fields which are updated on their own, like scores, have a namespace of their own.
+    """
+    namespace = f"responses/{model._meta.label_lower}"
+    return f"{namespace}.{field}" if field else namespace
+
+
+def invalidate_responses(*models, field=None):
+    """
+    Invalidate every cached response built from the given models, or only those rendering the given field of them.
+    Should be called from post_save and post_delete receivers, and after bulk updates which don't send signals.
+    """
+    bump_version(*[response_namespace(model, field) for model in models])
+
+
+def get_audience(user, models):
+    """
+    Fingerprint of everything a user gets to see of the given models, or None if the user's responses must not be
+    shared.
+
+    Anonymous users share one audience, and so do regular users in the same groups, as long as they don't have any
+    permissions of their own. Everybody else (superusers, users with global permissions or permissions on objects of
+    the models, like contributors on their entries) is served uncached, so crew-only fields never leak from one
+    audience to another.
+    """
+    if not user.is_authenticated or user.pk == get_anonymous_user().pk:
+        return "anonymous"
+
+    if user.is_superuser or not user.is_active:
+        return None
+
+    model = type(user)
+    personal = (
+        model.objects.filter(pk=user.pk)
+        .annotate(
+            object_permissions=Exists(
+                UserObjectPermission.objects.filter(
+                    user=OuterRef("pk"), content_type__in=[ContentType.objects.get_for_model(m) for m in models]
+                )
+            ),
+            global_permissions=Exists(Permission.objects.filter(user=OuterRef("pk"))),
+        )
+        .values_list("object_permissions", "global_permissions")
+        .first()
+    )
+    if personal is None or any(personal):
+        return None
+
+    return "groups:" + ",".join(str(pk) for pk in sorted(user.groups.values_list("pk", flat=True)))
+
+
+class CachedResponseMixin:
+    """
+    Serve list and detail requests from the shared cache for users who see the same data, see get_audience().
+
+    Cached responses are invalidated when any of cache_models is saved or deleted, or when permissions on them change,
+    and expire after RESPONSE_CACHE_TIMEOUT seconds regardless, since some fields depend on the current time. Their
+    validators are cached with them, so conditional requests are answered the same way as by ModelViewSet.
+
+    Fields which are updated without saving their rows only invalidate the responses listing them in cache_fields.
+
+    Invalidations only reach other processes through a shared cache, so nothing is cached without SHARED_CACHE.
+    """
+
+    cache_models = ()
+
+    # (model, field) pairs rendered from cache_models, which are invalidated on their own, e.g. ((Entry, "score"),)
+    cache_fields = ()
+
+    def get_response_cache_key(self):
+        if not settings.RESPONSE_CACHE_TIMEOUT or not settings.SHARED_CACHE or not self.cache_models:
+            return None
+
+        audience = get_audience(self.request.user, self.cache_models)
+        if audience is None:
+            return None
+
+        namespaces = ["global-permissions"]
+        for model in self.cache_models:
+            namespaces.append(response_namespace(model))
+            namespaces.append(permissions_namespace(ContentType.objects.get_for_model(model).pk))
+        namespaces.extend(response_namespace(model, field) for model, field in self.cache_fields)
+
+        key = repr((self.request.get_full_path(), self.request.accepted_media_type, audience, get_versions(namespaces)))
+        return "response/%s" % hashlib.md5(key.encode()).hexdigest()
+
+    def cached_response(self, build):
+        key = self.get_response_cache_key()
+        if key is None:
+            return build()
+
+        cached = cache.get(key)
+        if cached is not None:
+            data, etag, last_modified = cached
+            validators = (etag, last_modified) if etag else None
+            return self.conditional_response(validators, lambda: Response(data))
+
+        response = build()
+        if isinstance(response, Response) and response.status_code == 200:
+            last_modified = parse_http_date(response["Last-Modified"]) if response.has_header("Last-Modified") else None
+            cached = (response.data, response.get("ETag"), last_modified)
+            cache.set(key, cached, settings.RESPONSE_CACHE_TIMEOUT)
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(lambda: super(CachedResponseMixin, self).retrieve(request, *args, **kwargs))
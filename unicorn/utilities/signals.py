@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from guardian.models import GroupObjectPermission, UserObjectPermission
+
+from .cache import bump_version
+from .reference import invalidate_reference
+from .visibility import permissions_namespace
+
+
+@receiver(post_save, sender=UserObjectPermission)
+@receiver(post_delete, sender=UserObjectPermission)
+@receiver(post_save, sender=GroupObjectPermission)
+@receiver(post_delete, sender=GroupObjectPermission)
+def invalidate_visibility(instance, **kwargs):
+    bump_version(permissions_namespace(instance.content_type_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_groups(sender, **kwargs):
+    invalidate_reference(sender)
+
+
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def invalidate_permission_ids(**kwargs):
+    bump_version("permissions")
+
+
+@receiver(m2m_changed, sender=get_user_model().groups.through)
+def invalidate_group_membership(action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_version("group-membership")
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+@receiver(m2m_changed, sender=get_user_model().user_permissions.through)
+def invalidate_global_permissions(action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_version("global-permissions")
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_anonymous_user(instance, **kwargs):
+    if instance.get_username() == settings.ANONYMOUS_USER_NAME:
+        bump_version("anonymous-user")
@@ -0,0 +1,127 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+from django.db.models.functions import Cast
+from guardian.models import GroupObjectPermission, UserObjectPermission
+
+from .cache import LocalVersionedCache, bump_version
+
+# visible object ids of groups and the anonymous user, shared by every request handled by this process
+visibility_cache = LocalVersionedCache()
+
+
+def permissions_namespace(content_type_id) -> str:
+    """
+    Cache namespace for object permissions on a content type. Bumped whenever such a permission is granted or revoked.
+    """
+    return f"object-permissions/{content_type_id}"
+
+
+def invalidate_object_permissions(model_or_ctype):
+    if not isinstance(model_or_ctype, ContentType):
+        model_or_ctype = ContentType.objects.get_for_model(model_or_ctype)
+
+    bump_version(permissions_namespace(model_or_ctype.pk))
+
+
+def _to_pks(model, object_pks):
+    return frozenset(model._meta.pk.to_python(pk) for pk in object_pks)
+
+
+def object_ids_with_perms(user, model, codenames, cached=False) -> frozenset:
+    """
+    Primary keys of objects a user has all of the given permissions on, like get_objects_for_user() without global
+    permissions.
+    """
+    visible = None
+    for codename in codenames:
+        ids = user_visible_ids(user, model, codename, cached=cached)
+        visible = ids if visible is None else visible & ids
+
+    return visible or frozenset()
+
+
+def permission_codenames(model) -> list:
+    ctype = ContentType.objects.get_for_model(model)
+    return visibility_cache.get_or_set(
+        ("codenames", ctype.pk),
+        "permissions",
+        lambda: list(Permission.objects.filter(content_type=ctype).values_list("codename", flat=True)),
+    )
+
+
+def _permission_id(ctype, codename):
+    return visibility_cache.get_or_set(
+        ("permission", ctype.pk, codename),
+        "permissions",
+        lambda: Permission.objects.filter(content_type=ctype, codename=codename).values_list("pk", flat=True).first(),
+    )
+
+
+def group_visible_ids(group_id, model, codename) -> frozenset:
+    """
+    Primary keys of objects a group has a permission on. Cached for the whole process, since most object visibility
+    comes from a handful of groups.
+    """
+    ctype = ContentType.objects.get_for_model(model)
+
+    def build():
+        object_pks = GroupObjectPermission.objects.filter(
+            group_id=group_id, content_type=ctype, permission_id=_permission_id(ctype, codename)
+        ).values_list("object_pk", flat=True)
+        return _to_pks(model, object_pks)
+
+    return visibility_cache.get_or_set(("group", group_id, ctype.pk, codename), permissions_namespace(ctype.pk), build)
+
+
+def user_visible_ids(user, model, codename, cached=False) -> frozenset:
+    """
+    Primary keys of objects a user has a permission on, directly or through groups.
+
+    :param cached: Keep the user's own permissions in the process cache as well. Only use this for shared users like
+                   the anonymous user, regular users are looked up with a single indexed query on each call.
+    """
+    ctype = ContentType.objects.get_for_model(model)
+
+    def build():
+        object_pks = UserObjectPermission.objects.filter(
+            user=user, content_type=ctype, permission_id=_permission_id(ctype, codename)
+        ).values_list("object_pk", flat=True)
+        return _to_pks(model, object_pks)
+
+    if cached:
+        visible = visibility_cache.get_or_set(
+            ("user", user.pk, ctype.pk, codename), permissions_namespace(ctype.pk), build
+        )
+        group_ids = visibility_cache.get_or_set(
+            ("groups", user.pk), "group-membership", lambda: list(user.groups.values_list("pk", flat=True))
+        )
+    else:
+        visible = build()
+        group_ids = user.groups.values_list("pk", flat=True)
+
+    for group_id in group_ids:
+        visible = visible | group_visible_ids(group_id, model, codename)
+
+    return visible
+
+
+def visible_objects_filter(users, model, codename) -> Q:
+    """
+    Filter for objects any of the users has a permission on, directly or through groups. Unlike user_visible_ids(),
+    the permissions are looked up by semi-joins in the query itself rather than sent along as a list of ids.
+    """
+    ctype = ContentType.objects.get_for_model(model)
+    permission_id = _permission_id(ctype, codename)
+    pk = model._meta.pk
+
+    # guardian stores object_pk as text, the cast lets the database compare it with the primary key
+    user_pks = UserObjectPermission.objects.filter(user__in=users, content_type=ctype, permission_id=permission_id)
+    memberships = get_user_model().groups.through.objects.filter(user_id__in=users).values("group_id")
+    group_pks = GroupObjectPermission.objects.filter(
+        group_id__in=memberships, content_type=ctype, permission_id=permission_id
+    )
+    return Q(pk__in=user_pks.values(object_id=Cast("object_pk", pk))) | Q(
+        pk__in=group_pks.values(object_id=Cast("object_pk", pk))
+    )
@@ -0,0 +1,130 @@
+import hashlib
+import os
+import shutil
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import Blob
+
+TUS_BLOB_DIR = getattr(settings, "TUS_BLOB_DIR", os.path.join(settings.MEDIA_ROOT, "blobs"))
+TUS_HASH_BLOCK_SIZE = getattr(settings, "TUS_HASH_BLOCK_SIZE", 4194304)  # in bytes
+
+# algorithms accepted in the Upload-Checksum header of the TUS checksum extension
+CHECKSUM_ALGORITHMS = ("sha1", "md5", "sha256")
+
+
+class BlockHasher:
+    """
+    Content hash of an upload, computed while the chunks arrive.
+
+    The state of a hashlib object can't be stored between requests, so uploads are hashed in blocks of
+    TUS_HASH_BLOCK_SIZE instead. Only the digests of complete blocks are kept with the upload, and the partial block
+    at the end is read back from disk by resume(). The content hash is the SHA-256 of the block digests, which doesn't
+    depend on how the client split the upload into chunks.
+    """
+
+    def __init__(self, digests=(), block_size=None):
+        self.digests = list(digests)
+        self.block_size = block_size or TUS_HASH_BLOCK_SIZE
+        self.block = hashlib.sha256()
+        self.pending = 0
+
+    def resume(self, path, offset, buffer_size=1048576):
+        """
+        Hash what has been written to path since the last complete block, up to offset.
+        """
+        self.update_from_file(path, len(self.digests) * self.block_size, offset, buffer_size)
+
+    def extend(self, path, size, digests, buffer_size=1048576):
+        """
+        Hash the content of another upload appended to this one. When it starts on a block boundary its block digests
+        are reused, and only its partial block at the end is read from disk.
+        """
+        start = 0
+        if not self.pending:
+            self.digests.extend(digests)
+            start = len(digests) * self.block_size
+        self.update_from_file(path, start, size, buffer_size)
+
+    def update_from_file(self, path, start, end, buffer_size=1048576):
+        with open(path, "rb") as f:
+            f.seek(start)
+            while start < end:
+                buffer = f.read(min(buffer_size, end - start))
+                if not buffer:
+                    break
+                self.update(buffer)
+                start += len(buffer)
+
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            size = min(len(view), self.block_size - self.pending)
+            self.block.update(view[:size])
+            self.pending += size
+            view = view[size:]
+
+            if self.pending == self.block_size:
+                self.digests.append(self.block.hexdigest())
+                self.block = hashlib.sha256()
+                self.pending = 0
+
+    def hexdigest(self) -> str:
+        digests = self.digests
+        if self.pending or not digests:
+            digests = digests + [self.block.hexdigest()]
+        return hashlib.sha256("".join(digests).encode()).hexdigest()
+
+
+def blob_path(content_hash) -> str:
+    return os.path.join(TUS_BLOB_DIR, content_hash[:2], content_hash)
+
+
+def store_blob(path, content_hash, size) -> str:
+    """
+    Move a finished upload into the blob store and take a reference on it. If the same content is stored already, the
+    upload is dropped instead. Returns the path of the blob.
+    """
+    target = blob_path(content_hash)
+    with transaction.atomic():
+        blob, created = Blob.objects.select_for_update().get_or_create(hash=content_hash, defaults={"size": size})
+        if created or not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(path, target)
+        else:
+            os.remove(path)
+        Blob.objects.filter(pk=blob.pk).update(refcount=F("refcount") + 1)
+
+    return target
+
+
+def link_blob(path, destination):
+    """
+    Make the content of a blob available as destination, without copying it where the filesystem allows.
+    """
+    try:
+        os.link(path, destination)
+    except OSError:
+        # no hard links across filesystems, or on this one
+        shutil.copyfile(path, destination)
+
+
+def release_blob(content_hash):
+    """
+    Drop a reference on a blob, deleting it once nothing refers to it anymore.
+    """
+    with transaction.atomic():
+        Blob.objects.filter(pk=content_hash, refcount__gt=0).update(refcount=F("refcount") - 1)
+        deleted, _ = Blob.objects.filter(pk=content_hash, refcount=0).delete()
+
+    if deleted:
+        transaction.on_commit(lambda: _remove(blob_path(content_hash)))
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
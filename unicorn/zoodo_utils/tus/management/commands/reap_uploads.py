@@ -0,0 +1,20 @@
+from datetime import datetime
+
+import pytz
+from django.core.management.base import BaseCommand
+from zoodo_utils.tus.reaper import reap_uploads
+from zoodo_utils.tus.views import TusUpload
+
+
+class Command(BaseCommand):
+    help = "Deletes expired and abandoned uploads, run it periodically"
+
+    def handle(self, *args, **options):
+        self.stdout.write("=== Starting reap_uploads at %s" % datetime.now().replace(tzinfo=pytz.utc))
+
+        reaped = reap_uploads(TusUpload.TUS_UPLOAD_DIR)
+        for resource_id, size in reaped:
+            self.stdout.write("- Deleted upload %s, reclaimed %d bytes" % (resource_id, size))
+        self.stdout.write("+ Reclaimed %d bytes from %d uploads" % (sum(size for _, size in reaped), len(reaped)))
+
+        self.stdout.write("=== Finished at %s" % datetime.now().replace(tzinfo=pytz.utc), ending="\n\n")
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadState',
+            fields=[
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('id', models.UUIDField(primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, null=True)),
+                ('file_size', models.BigIntegerField()),
+                ('offset', models.BigIntegerField(default=0)),
+                ('metadata', models.JSONField(default=dict)),
+                ('file_type', models.CharField(max_length=32, null=True)),
+                ('entry_id', models.IntegerField(null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
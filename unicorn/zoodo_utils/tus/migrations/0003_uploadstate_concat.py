@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tus", "0002_blob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uploadstate",
+            name="concat",
+            field=models.CharField(max_length=16, null=True),
+        ),
+    ]
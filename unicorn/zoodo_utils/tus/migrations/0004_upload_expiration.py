@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tus", "0003_uploadstate_concat"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uploadstate",
+            name="expires",
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="uploadstate",
+            name="uploader_id",
+            field=models.UUIDField(db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tus", "0004_upload_expiration"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uploadstate",
+            name="lease",
+            field=models.UUIDField(null=True),
+        ),
+        migrations.AddField(
+            model_name="uploadstate",
+            name="lease_expires",
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import models
+from utilities.models import CreatedUpdatedModel
+
+
+class UploadState(CreatedUpdatedModel, models.Model):
+    """
+    Progress of a single resumable upload, see store.DatabaseStateStore.
+    """
+
+    id = models.UUIDField(primary_key=True)
+    filename = models.CharField(max_length=255, null=True)
+    file_size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    metadata = models.JSONField(default=dict)
+    file_type = models.CharField(max_length=32, null=True)
+    entry_id = models.IntegerField(null=True)
+    block_digests = models.JSONField(default=list)
+    # "partial" for parts of a concatenated upload, see views.TusUpload._create_final_upload()
+    concat = models.CharField(max_length=16, null=True)
+    uploader_id = models.UUIDField(null=True, db_index=True)
+    expires = models.DateTimeField(null=True, db_index=True)
+    # held by the request writing a chunk, see store.BaseStateStore.claim()
+    lease = models.UUIDField(null=True)
+    lease_expires = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.file_size})"
+
+
+class Blob(CreatedUpdatedModel, models.Model):
+    """
+    Content of finished uploads, stored once per hash and linked to every file with the same content, see blobs.py.
+    """
+
+    hash = models.CharField(max_length=64, primary_key=True)
+    size = models.BigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.hash} ({self.refcount} references)"
@@ -0,0 +1,50 @@
+import os
+import uuid
+from datetime import timedelta
+
+from django.utils import timezone
+from utilities.metrics import increment
+
+from . import store
+
+
+def _remove(path) -> int:
+    # space actually used on disk, upload files are sparse until their chunks arrive
+    try:
+        stat = os.stat(path)
+        os.remove(path)
+    except FileNotFoundError:
+        return 0
+    return stat.st_blocks * 512 if hasattr(stat, "st_blocks") else stat.st_size
+
+
+def reap_uploads(upload_dir, now=None) -> list:
+    """
+    Delete expired uploads, both their state and their files, and upload files without any state left, like those of
+    uploads which were forgotten by the cache. Returns (resource_id, reclaimed bytes) for every upload deleted.
+    """
+    now = now or timezone.now()
+    state = store.get_state_store()
+
+    reaped = []
+    for upload in state.expired(now):
+        state.delete(upload.resource_id)
+        reaped.append((upload.resource_id, _remove(os.path.join(upload_dir, upload.resource_id))))
+
+    # files only get older than the expiration when nothing was written to them in that time
+    cutoff = (now - timedelta(seconds=store.TUS_EXPIRATION)).timestamp()
+    for name in os.listdir(upload_dir) if os.path.isdir(upload_dir) else ():
+        try:
+            uuid.UUID(name)
+        except ValueError:
+            continue
+
+        path = os.path.join(upload_dir, name)
+        if os.path.getmtime(path) < cutoff and state.get(name) is None:
+            reaped.append((name, _remove(path)))
+
+    if reaped:
+        increment("tus_reaped_uploads", len(reaped))
+        increment("tus_reclaimed_bytes", sum(size for _, size in reaped))
+
+    return reaped
@@ -10,4 +10,5 @@ import django.dispatch
 #       "entry_id",
 #       "uploader",
 #       "type",
+#       "content_hash",
 tus_upload_finished_signal = django.dispatch.Signal()
@@ -0,0 +1,255 @@
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import UploadState
+
+TUS_TIMEOUT = getattr(settings, "TUS_TIMEOUT", 3600)
+TUS_STATE_BACKEND = getattr(settings, "TUS_STATE_BACKEND", "zoodo_utils.tus.store.DatabaseStateStore")
+TUS_EXPIRATION = getattr(settings, "TUS_EXPIRATION", 86400)  # in seconds since the last chunk
+TUS_LEASE_TIMEOUT = getattr(settings, "TUS_LEASE_TIMEOUT", 600)  # in seconds a request may spend writing a chunk
+
+# in seconds after which the lock of a CacheStateStore update expires, should its worker die while holding it
+LOCK_TIMEOUT = 5
+LOCK_POLL = 0.01
+
+
+def expires_at() -> datetime:
+    """
+    Expiration of an upload receiving a chunk now, see the TUS expiration extension.
+    """
+    return timezone.now() + timedelta(seconds=TUS_EXPIRATION)
+
+
+@dataclass
+class UploadRecord:
+    """
+    Everything known about an upload in progress, stored as a single record.
+    """
+
+    resource_id: str
+    file_size: int
+    filename: str = None
+    offset: int = 0
+    metadata: dict = field(default_factory=dict)
+    file_type: str = None
+    entry_id: int = None
+    block_digests: list = field(default_factory=list)
+    concat: str = None
+    uploader_id: uuid.UUID = None
+    expires: datetime = None
+    # held by the request writing a chunk, see BaseStateStore.claim()
+    lease: uuid.UUID = None
+    lease_expires: datetime = None
+
+    def expired(self, now=None) -> bool:
+        return self.expires is not None and self.expires <= (now or timezone.now())
+
+
+class BaseStateStore(ABC):
+    """
+    Keeps track of uploads in progress. Every worker handling uploads must see the same state, so the store has to be
+    shared between processes and nodes.
+    """
+
+    @abstractmethod
+    def create(self, record):
+        """
+        Store the UploadRecord of a new upload.
+        """
+
+    @abstractmethod
+    def get(self, resource_id):
+        """
+        Return the UploadRecord of an upload, or None if there is no such upload.
+        """
+
+    @abstractmethod
+    def compare_and_set_offset(self, resource_id, expected, offset, lease=None, **changes) -> bool:
+        """
+        Move the offset of an upload, but only if it is still at the expected offset and, when a lease is given, the
+        lease is still held. The lease is released with it, and other fields in changes are updated along with it.
+        Returns whether it was moved.
+        """
+
+    @abstractmethod
+    def claim(self, resource_id, offset, lease, until) -> bool:
+        """
+        Lease an upload to a request writing at offset, unless the upload moved on or another request holds an
+        unexpired lease. Returns whether the lease was taken.
+        """
+
+    @abstractmethod
+    def release(self, resource_id, lease):
+        """
+        Give up a lease without moving the offset.
+        """
+
+    @abstractmethod
+    def delete(self, resource_id):
+        """
+        Forget an upload.
+        """
+
+    @abstractmethod
+    def reserved(self, uploader_id) -> tuple:
+        """
+        Number of unexpired uploads of a user, and the bytes reserved by them.
+        """
+
+    @abstractmethod
+    def expired(self, now) -> list:
+        """
+        UploadRecords of uploads which expired before now.
+        """
+
+
+class DatabaseStateStore(BaseStateStore):
+    """
+    Upload state in the database, shared by all workers and nodes and kept across restarts. Reading the state and
+    moving the offset take a single query each.
+    """
+
+    model = UploadState
+    fields = (
+        "filename",
+        "file_size",
+        "offset",
+        "metadata",
+        "file_type",
+        "entry_id",
+        "block_digests",
+        "concat",
+        "uploader_id",
+        "expires",
+        "lease",
+        "lease_expires",
+    )
+
+    def create(self, record):
+        self.model.objects.create(id=record.resource_id, **{f: getattr(record, f) for f in self.fields})
+
+    def get(self, resource_id):
+        values = self.model.objects.filter(pk=resource_id).values(*self.fields).first()
+        return None if values is None else UploadRecord(resource_id=str(resource_id), **values)
+
+    def compare_and_set_offset(self, resource_id, expected, offset, lease=None, **changes) -> bool:
+        uploads = self.model.objects.filter(pk=resource_id, offset=expected)
+        if lease is not None:
+            uploads = uploads.filter(lease=lease)
+        return bool(uploads.update(offset=offset, lease=None, lease_expires=None, **changes))
+
+    def claim(self, resource_id, offset, lease, until) -> bool:
+        unleased = Q(lease__isnull=True) | Q(lease_expires__lte=timezone.now())
+        return bool(
+            self.model.objects.filter(unleased, pk=resource_id, offset=offset).update(lease=lease, lease_expires=until)
+        )
+
+    def release(self, resource_id, lease):
+        self.model.objects.filter(pk=resource_id, lease=lease).update(lease=None, lease_expires=None)
+
+    def delete(self, resource_id):
+        self.model.objects.filter(pk=resource_id).delete()
+
+    def reserved(self, uploader_id) -> tuple:
+        totals = self.model.objects.filter(uploader_id=uploader_id, expires__gt=timezone.now()).aggregate(
+            count=Count("pk"), size=Sum("file_size")
+        )
+        return totals["count"], totals["size"] or 0
+
+    def expired(self, now) -> list:
+        rows = self.model.objects.filter(expires__lte=now).values("pk", *self.fields)
+        return [UploadRecord(resource_id=str(row.pop("pk")), **row) for row in rows]
+
+
+class CacheStateStore(BaseStateStore):
+    """
+    Upload state in the default cache, one key per upload. Only use this with a cache shared by all workers, like
+    Redis, and note that uploads are forgotten after TUS_TIMEOUT seconds. Their files are left for the reaper then.
+    """
+
+    def key(self, resource_id):
+        return f"tus-uploads/{resource_id}"
+
+    def user_key(self, uploader_id):
+        return f"tus-uploads/users/{uploader_id}"
+
+    def create(self, record):
+        cache.set(self.key(record.resource_id), asdict(record), TUS_TIMEOUT)
+        if record.uploader_id is not None:
+            # best effort index for reserved(), an upload lost in a race only makes the caps more lenient
+            resource_ids = cache.get(self.user_key(record.uploader_id), [])
+            cache.set(self.user_key(record.uploader_id), resource_ids + [record.resource_id], TUS_TIMEOUT)
+
+    def get(self, resource_id):
+        values = cache.get(self.key(resource_id))
+        return None if values is None else UploadRecord(**values)
+
+    def update(self, resource_id, condition, **changes) -> bool:
+        # the cache has no compare-and-set, so hold a short lock around the read and the write. Other updates only hold
+        # it for a moment, and a dead worker's lock expires, so waiting a little longer than that always gets it.
+        lock = self.key(resource_id) + "/lock"
+        deadline = time.monotonic() + LOCK_TIMEOUT + 1
+        while not cache.add(lock, 1, LOCK_TIMEOUT):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Upload state of {resource_id} is locked")
+            time.sleep(LOCK_POLL)
+
+        try:
+            values = cache.get(self.key(resource_id))
+            if values is None or not condition(UploadRecord(**values)):
+                return False
+            values.update(changes)
+            cache.set(self.key(resource_id), values, TUS_TIMEOUT)
+            return True
+        finally:
+            cache.delete(lock)
+
+    def compare_and_set_offset(self, resource_id, expected, offset, lease=None, **changes) -> bool:
+        return self.update(
+            resource_id,
+            lambda record: record.offset == expected and (lease is None or record.lease == lease),
+            offset=offset,
+            lease=None,
+            lease_expires=None,
+            **changes,
+        )
+
+    def claim(self, resource_id, offset, lease, until) -> bool:
+        return self.update(
+            resource_id,
+            lambda record: record.offset == offset and (record.lease is None or record.lease_expires <= timezone.now()),
+            lease=lease,
+            lease_expires=until,
+        )
+
+    def release(self, resource_id, lease):
+        self.update(resource_id, lambda record: record.lease == lease, lease=None, lease_expires=None)
+
+    def delete(self, resource_id):
+        cache.delete(self.key(resource_id))
+
+    def reserved(self, uploader_id) -> tuple:
+        resource_ids = cache.get(self.user_key(uploader_id), [])
+        records = [UploadRecord(**values) for values in cache.get_many([self.key(r) for r in resource_ids]).values()]
+        records = [record for record in records if not record.expired()]
+        return len(records), sum(record.file_size for record in records)
+
+    def expired(self, now) -> list:
+        # expired keys can't be listed, the reaper finds their files by age instead
+        return []
+
+
+def get_state_store() -> BaseStateStore:
+    """
+    The store configured with TUS_STATE_BACKEND.
+    """
+    return import_string(TUS_STATE_BACKEND)()
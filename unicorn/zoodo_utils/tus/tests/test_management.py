@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from utilities.metrics import get_counter
+
+from ..store import DatabaseStateStore, UploadRecord
+from ..views import TusUpload
+
+
+class ReapUploadsTest(TestCase):
+    def setUp(self):
+        self.upload_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.upload_dir)
+
+        patcher = mock.patch.object(TusUpload, "TUS_UPLOAD_DIR", self.upload_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, expires, data=b"0123456789"):
+        resource_id = str(uuid.uuid4())
+        with open(os.path.join(self.upload_dir, resource_id), "wb") as f:
+            f.write(data)
+        DatabaseStateStore().create(UploadRecord(resource_id=resource_id, file_size=len(data), expires=expires))
+        return resource_id
+
+    def test_reap_uploads(self):
+        """expired uploads and files without state should be deleted, and the space reclaimed counted"""
+        now = timezone.now()
+        expired = self.upload(now - timedelta(seconds=1))
+        running = self.upload(now + timedelta(hours=1))
+
+        orphan = os.path.join(self.upload_dir, str(uuid.uuid4()))
+        with open(orphan, "wb") as f:
+            f.write(b"0123456789")
+        os.utime(orphan, (time.time() - 7 * 86400,) * 2)
+
+        reclaimed = get_counter("tus_reclaimed_bytes")
+        out = StringIO()
+        call_command("reap_uploads", stdout=out)
+
+        self.assertIn(f"- Deleted upload {expired}", out.getvalue())
+        self.assertEqual(os.listdir(self.upload_dir), [running])
+        self.assertIsNone(DatabaseStateStore().get(expired))
+        self.assertIsNotNone(DatabaseStateStore().get(running))
+        self.assertGreater(get_counter("tus_reclaimed_bytes"), reclaimed)
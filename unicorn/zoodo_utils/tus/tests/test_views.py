@@ -0,0 +1,391 @@
+import base64
+import errno
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+from accounts.models import User
+from competitions.constants import GENRE_CATEGORY_CREATIVE
+from competitions.models import Competition, Entry, File, Genre
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from ..blobs import BlockHasher, blob_path
+from ..models import Blob, UploadState
+from ..signals import tus_upload_finished_signal
+from ..store import CacheStateStore, DatabaseStateStore, UploadRecord
+from ..views import TusUpload, _copy_file
+
+
+class TusUploadTestMixin:
+    def setUp(self):
+        now = timezone.now()
+        genre = Genre.objects.create(category=GENRE_CATEGORY_CREATIVE, name="Music")
+        competition = Competition.objects.create(
+            genre=genre,
+            name="Music",
+            run_time_start=now,
+            run_time_end=now,
+            fileupload=[{"type": "main", "file": "music"}],
+        )
+        self.entry = Entry.objects.create(competition=competition, title="Entry")
+
+        self.user = User.objects.create_user(username="uploader", is_superuser=True)
+        self.client.force_authenticate(user=self.user)
+
+        self.upload_dir = tempfile.mkdtemp()
+        self.destination_dir = tempfile.mkdtemp()
+        for name, value in (("TUS_UPLOAD_DIR", self.upload_dir), ("TUS_DESTINATION_DIR", self.destination_dir)):
+            patcher = mock.patch.object(TusUpload, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch("zoodo_utils.tus.blobs.TUS_BLOB_DIR", os.path.join(self.destination_dir, "blobs"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.upload_dir)
+        shutil.rmtree(self.destination_dir)
+
+    def metadata(self, filename="song.mp3", filetype="audio/mpeg"):
+        return ",".join(
+            f"{key} {base64.b64encode(value.encode()).decode()}"
+            for key, value in (("filename", filename), ("filetype", filetype))
+        )
+
+    def headers(self):
+        return {
+            "Tus-Resumable": "1.0.0",
+            "Upload-Metadata": self.metadata(),
+            "X-Unicorn-Entry-Id": str(self.entry.pk),
+            "X-Unicorn-File-Type": "main",
+        }
+
+    def create(self, length, **headers):
+        response = self.client.post("/upload/", headers={**self.headers(), "Upload-Length": str(length), **headers})
+        self.assertEqual(response.status_code, 201)
+        return "/upload/" + response["Location"].rsplit("/", 1)[1]
+
+    def patch(self, url, data, offset, **headers):
+        return self.client.generic(
+            "PATCH",
+            url,
+            data,
+            content_type="application/offset+octet-stream",
+            headers={"Tus-Resumable": "1.0.0", "Upload-Offset": str(offset), **headers},
+        )
+
+
+class TusUploadTest(TusUploadTestMixin, APITestCase):
+    @mock.patch.object(TusUpload, "TUS_BUFFER_SIZE", 3)
+    def test_upload_in_chunks(self):
+        """chunks should be streamed to disk, and the finished file registered with the entry"""
+        url = self.create(10)
+
+        response = self.patch(url, b"01234", 0)
+        self.assertEqual(response["Upload-Offset"], "5")
+        self.assertEqual(self.patch(url, b"56789", 0).status_code, 409)
+        self.assertEqual(self.patch(url, b"5678901", 5).status_code, 413)
+
+        response = self.patch(url, b"56789", 5)
+        self.assertEqual(response["Upload-Offset"], "10")
+
+        f = File.objects.get(entry=self.entry)
+        self.assertEqual(f.name, "song.mp3")
+        with open(os.path.join(self.destination_dir, f.file.name), "rb") as uploaded:
+            self.assertEqual(uploaded.read(), b"0123456789")
+
+    def test_resume(self):
+        """the offset of an upload should be available to resume from, until the upload is finished"""
+        url = self.create(10)
+        self.patch(url, b"01234", 0)
+
+        response = self.client.head(url, headers={"Tus-Resumable": "1.0.0"})
+        self.assertEqual((response["Upload-Offset"], response["Upload-Length"]), ("5", "10"))
+
+        self.patch(url, b"56789", 5)
+        self.assertEqual(self.client.head(url, headers={"Tus-Resumable": "1.0.0"}).status_code, 404)
+        self.assertEqual(self.patch(url, b"0", 10).status_code, 410)
+
+    def test_concurrent_chunks(self):
+        """a chunk should only be written while no other request is writing at the same offset"""
+        url = self.create(10)
+        resource_id = url.rsplit("/", 1)[1]
+        store = DatabaseStateStore()
+        lease = uuid.uuid4()
+        self.assertTrue(store.claim(resource_id, 0, lease, timezone.now() + timedelta(minutes=1)))
+
+        self.assertEqual(self.patch(url, b"01234", 0).status_code, 409)
+        with open(os.path.join(self.upload_dir, resource_id), "rb") as f:
+            self.assertEqual(f.read(), bytes(10))
+
+        # a lease left behind by a request which died expires, and the one holding it can't move the offset anymore
+        UploadState.objects.filter(pk=resource_id).update(lease_expires=timezone.now())
+        self.assertEqual(self.patch(url, b"01234", 0)["Upload-Offset"], "5")
+        self.assertFalse(store.compare_and_set_offset(resource_id, 5, 10, lease))
+        self.assertIsNone(store.get(resource_id).lease)
+
+    @mock.patch("zoodo_utils.tus.blobs.TUS_HASH_BLOCK_SIZE", 4)
+    def test_deduplication(self):
+        """identical content should be stored once, however it was chunked, and deleted with the last file"""
+        url = self.create(10)
+        self.patch(url, b"012345", 0)
+        self.patch(url, b"6789", 6)
+        url = self.create(10)
+        self.patch(url, b"012", 0)
+        self.patch(url, b"3456789", 3)
+
+        first, second = File.objects.filter(entry=self.entry).order_by("pk")
+        self.assertEqual(first.content_hash, second.content_hash)
+        blob = Blob.objects.get(pk=first.content_hash)
+        self.assertEqual((blob.size, blob.refcount), (10, 2))
+        inodes = {os.stat(os.path.join(self.destination_dir, f.file.name)).st_ino for f in (first, second)}
+        self.assertEqual(inodes, {os.stat(blob_path(blob.hash)).st_ino})
+
+        # links are only deleted once the deletion of their file is committed
+        name = second.file.name
+        with mock.patch.object(first.file.storage, "delete") as delete:
+            first.delete()
+            self.assertEqual(Blob.objects.get(pk=blob.hash).refcount, 1)
+            delete.assert_not_called()
+            with self.captureOnCommitCallbacks(execute=True):
+                second.delete()
+        delete.assert_called_once_with(name)
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(os.path.exists(blob_path(blob.hash)))
+
+    def test_failed_registration(self):
+        """content of an upload which can't be registered as a file should not be kept"""
+        url = self.create(10)
+        self.patch(url, b"01234", 0)
+        self.entry.delete()
+
+        with self.assertRaises(Entry.DoesNotExist):
+            self.patch(url, b"56789", 5)
+        self.assertFalse(File.objects.exists())
+        self.assertFalse(Blob.objects.exists())
+        self.assertEqual(os.listdir(self.destination_dir), ["blobs"])
+
+    def test_checksum(self):
+        """chunks not matching their Upload-Checksum should be discarded"""
+        url = self.create(10)
+
+        def checksum(data, algorithm="sha1"):
+            return f"{algorithm} {base64.b64encode(hashlib.new(algorithm, data).digest()).decode()}"
+
+        response = self.patch(url, b"01234", 0, **{"Upload-Checksum": checksum(b"43210")})
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(self.client.head(url, headers={"Tus-Resumable": "1.0.0"})["Upload-Offset"], "0")
+        self.assertEqual(self.patch(url, b"01234", 0, **{"Upload-Checksum": "crc32 AAAA"}).status_code, 400)
+
+        response = self.patch(url, b"01234", 0, **{"Upload-Checksum": checksum(b"01234", "sha256")})
+        self.assertEqual(response["Upload-Offset"], "5")
+
+    def test_file_check(self):
+        """uploaded files should be found by name, regardless of case, and by content hash"""
+        url = self.create(10)
+        self.patch(url, b"0123456789", 0)
+        content_hash = File.objects.get(entry=self.entry).content_hash
+
+        def check(key, value, **headers):
+            metadata = f"{key} {base64.b64encode(value.encode()).decode()}"
+            headers = {"Tus-Resumable": "1.0.0", "Upload-Metadata": metadata, **headers}
+            return self.client.get("/upload/", headers=headers)["Tus-File-Exists"]
+
+        self.assertEqual(check("filename", "SONG.mp3"), "True")
+        self.assertEqual(check("filename", "other.mp3"), "False")
+        self.assertEqual(check("hash", content_hash), "True")
+        self.assertEqual(check("hash", "0" * 64), "False")
+
+        # files are only found in the caller's own uploads or in the entry asked about, if they may upload to it
+        entry = {"X-Unicorn-Entry-Id": str(self.entry.pk)}
+        self.client.force_authenticate(user=User.objects.create_user(username="other", is_superuser=True))
+        self.assertEqual(check("hash", content_hash), "False")
+        self.assertEqual(check("filename", "song.mp3"), "False")
+        self.assertEqual(check("hash", content_hash, **entry), "True")
+        self.assertEqual(check("filename", "song.mp3", **entry), "True")
+        self.assertEqual(check("hash", content_hash, **{"X-Unicorn-Entry-Id": str(self.entry.pk + 1)}), "False")
+
+        self.client.force_authenticate(user=User.objects.create_user(username="stranger"))
+        self.assertEqual(check("hash", content_hash, **entry), "False")
+        self.assertEqual(check("filename", "song.mp3", **entry), "False")
+
+    @mock.patch("zoodo_utils.tus.blobs.TUS_HASH_BLOCK_SIZE", 4)
+    def test_concatenation(self):
+        """partial uploads should be assembled into one file, registered once and hashed like a regular upload"""
+        first = self.create(6, **{"Upload-Concat": "partial"})
+        second = self.create(4, **{"Upload-Concat": "partial"})
+        self.patch(second, b"6789", 0)
+        self.patch(first, b"012", 0)
+        self.assertFalse(File.objects.exists())
+
+        final = {"Upload-Concat": f"final;{first} {second}"}
+        response = self.client.post("/upload/", headers={**self.headers(), **final})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.head(first, headers={"Tus-Resumable": "1.0.0"})
+        self.assertEqual(response["Upload-Concat"], "partial")
+        self.patch(first, b"345", 3)
+
+        # partials of other users can't be taken
+        self.client.force_authenticate(user=User.objects.create_user(username="other", is_superuser=True))
+        self.assertEqual(self.client.post("/upload/", headers={**self.headers(), **final}).status_code, 400)
+        self.client.force_authenticate(user=self.user)
+
+        # partials are kept until the file is finished, so the client can try again
+        with mock.patch.object(TusUpload, "_finish_upload", side_effect=IOError("disk full")):
+            self.assertEqual(self.client.post("/upload/", headers={**self.headers(), **final}).status_code, 500)
+        self.assertEqual(self.client.head(second, headers={"Tus-Resumable": "1.0.0"})["Upload-Offset"], "4")
+
+        with mock.patch.object(TusUpload, "TUS_MAX_FILE_SIZE", 9):
+            self.assertEqual(self.client.post("/upload/", headers={**self.headers(), **final}).status_code, 413)
+
+        # partials leased by another request can't be taken, until that request died and its lease expired
+        store = DatabaseStateStore()
+        first_id, second_id = first.rsplit("/", 1)[1], second.rsplit("/", 1)[1]
+        self.assertTrue(store.claim(second_id, 4, uuid.uuid4(), timezone.now() + timedelta(minutes=1)))
+        self.assertEqual(self.client.post("/upload/", headers={**self.headers(), **final}).status_code, 409)
+        self.assertIsNone(store.get(first_id).lease)
+        UploadState.objects.filter(pk=second_id).update(lease_expires=timezone.now())
+
+        with mock.patch.object(tus_upload_finished_signal, "send", wraps=tus_upload_finished_signal.send) as send:
+            response = self.client.post("/upload/", headers={**self.headers(), **final})
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(self.client.post("/upload/", headers={**self.headers(), **final}).status_code, 400)
+        self.assertEqual(send.call_count, 1)
+
+        f = File.objects.get(entry=self.entry)
+        with open(os.path.join(self.destination_dir, f.file.name), "rb") as uploaded:
+            self.assertEqual(uploaded.read(), b"0123456789")
+        self.assertEqual(os.listdir(self.upload_dir), [])
+
+        url = self.create(10)
+        self.patch(url, b"0123456789", 0)
+        self.assertEqual(Blob.objects.get().refcount, 2)
+
+    def test_expiration(self):
+        """uploads should expire when no chunk arrived for a while"""
+        url = self.create(10)
+        response = self.patch(url, b"01234", 0)
+        self.assertIn("Upload-Expires", response)
+
+        UploadState.objects.update(expires=timezone.now())
+        self.assertEqual(self.client.head(url, headers={"Tus-Resumable": "1.0.0"}).status_code, 404)
+        self.assertEqual(self.patch(url, b"56789", 5).status_code, 410)
+
+    @mock.patch.object(TusUpload, "TUS_MAX_OPEN_UPLOADS", 2)
+    @mock.patch.object(TusUpload, "TUS_MAX_RESERVED_SIZE", 15)
+    def test_reservation(self):
+        """users should be limited in the number and size of their open uploads"""
+        self.create(10)
+        response = self.client.post("/upload/", headers={**self.headers(), "Upload-Length": "10"})
+        self.assertEqual(response.status_code, 413)
+
+        self.create(5)
+        response = self.client.post("/upload/", headers={**self.headers(), "Upload-Length": "0"})
+        self.assertEqual(response.status_code, 429)
+
+        UploadState.objects.update(expires=timezone.now())
+        self.create(10)
+
+
+class CopyFileTest(TestCase):
+    def test_fallback(self):
+        """files should be copied through a buffer when zero-copy isn't supported"""
+        with tempfile.TemporaryFile() as src, tempfile.TemporaryFile() as dst:
+            src.write(b"0123456789")
+            src.seek(2)
+            dst.write(b"ab")
+            dst.flush()
+
+            unsupported = mock.Mock(side_effect=OSError(errno.EXDEV, "Invalid cross-device link"))
+            with mock.patch("zoodo_utils.tus.views.ZERO_COPY_FUNCTIONS", [unsupported]):
+                self.assertEqual(_copy_file(src.fileno(), dst.fileno(), 5, 2), 5)
+
+            dst.seek(0)
+            self.assertEqual(dst.read(), b"ab23456")
+
+
+class BlockHasherTest(TestCase):
+    def test_resume(self):
+        """the hash should not depend on chunking, or on resuming from the upload file"""
+        data = b"0123456789" * 3
+        expected = BlockHasher(block_size=8)
+        expected.update(data)
+
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(data)
+            f.flush()
+
+            hasher = BlockHasher(block_size=8)
+            hasher.update(data[:13])
+            self.assertEqual(len(hasher.digests), 1)
+
+            resumed = BlockHasher(hasher.digests, block_size=8)
+            resumed.resume(f.name, 13)
+            resumed.update(data[13:])
+
+        self.assertEqual(resumed.hexdigest(), expected.hexdigest())
+
+
+class StateStoreTest(TestCase):
+    def test_compare_and_set_offset(self):
+        """offsets should only move from the expected offset, for every backend"""
+        for store in (DatabaseStateStore(), CacheStateStore()):
+            resource_id = str(uuid.uuid4())
+            store.create(UploadRecord(resource_id=resource_id, file_size=10, filename="song.mp3"))
+
+            self.assertTrue(store.compare_and_set_offset(resource_id, 0, 5))
+            self.assertFalse(store.compare_and_set_offset(resource_id, 0, 7))
+            self.assertEqual(store.get(resource_id).offset, 5)
+
+            store.delete(resource_id)
+            self.assertIsNone(store.get(resource_id))
+            self.assertFalse(store.compare_and_set_offset(resource_id, 5, 10))
+
+    def test_claim(self):
+        """only one request should hold the lease of an upload, and only it should move the offset"""
+        for store in (DatabaseStateStore(), CacheStateStore()):
+            resource_id = str(uuid.uuid4())
+            store.create(UploadRecord(resource_id=resource_id, file_size=10, filename="song.mp3"))
+            first, second = uuid.uuid4(), uuid.uuid4()
+            until = timezone.now() + timedelta(minutes=1)
+
+            self.assertTrue(store.claim(resource_id, 0, first, until))
+            self.assertFalse(store.claim(resource_id, 0, second, until))
+            self.assertFalse(store.compare_and_set_offset(resource_id, 0, 5, second))
+
+            store.release(resource_id, first)
+            self.assertTrue(store.claim(resource_id, 0, second, until))
+            self.assertTrue(store.compare_and_set_offset(resource_id, 0, 5, second))
+            self.assertFalse(store.claim(resource_id, 0, first, until))
+            self.assertTrue(store.claim(resource_id, 5, first, until))
+            store.delete(resource_id)
+
+    def test_locked_update(self):
+        """cache updates should wait for a concurrent update holding the lock instead of failing"""
+        store = CacheStateStore()
+        resource_id = str(uuid.uuid4())
+        store.create(UploadRecord(resource_id=resource_id, file_size=10, filename="song.mp3"))
+
+        lock = store.key(resource_id) + "/lock"
+        cache.add(lock, 1)
+        release = threading.Timer(0.1, cache.delete, (lock,))
+        release.start()
+        try:
+            self.assertTrue(store.compare_and_set_offset(resource_id, 0, 5))
+        finally:
+            release.cancel()
+        self.assertEqual(store.get(resource_id).offset, 5)
+
+        cache.add(lock, 1)
+        with mock.patch("zoodo_utils.tus.store.LOCK_TIMEOUT", 0), self.assertRaises(TimeoutError):
+            store.compare_and_set_offset(resource_id, 5, 10)
+        cache.delete(lock)
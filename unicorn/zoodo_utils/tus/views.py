@@ -1,25 +1,78 @@
 import base64
+import binascii
+import errno
+import hashlib
 import logging
 import os
-import shutil
+import time
 import uuid
+from datetime import timedelta
 
 from competitions.models import Entry, File
 from django.conf import settings
-from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Upper
 from django.http import HttpResponse
+from django.utils import timezone
 from django.utils.decorators import method_decorator
+from django.utils.http import http_date
 from django.views.decorators.csrf import csrf_exempt
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiParameter, OpenApiResponse, extend_schema
 from rest_framework.views import APIView
+from utilities.visibility import visible_objects_filter
 
+from .blobs import CHECKSUM_ALGORITHMS, BlockHasher, link_blob, release_blob, store_blob
 from .parsers import TusUploadParser
 from .signals import tus_upload_finished_signal
+from .store import TUS_LEASE_TIMEOUT, UploadRecord, expires_at, get_state_store
 
 logger = logging.getLogger(__name__)
 
+# copies which stay inside the kernel, in order of preference, see _copy_file()
+ZERO_COPY_FUNCTIONS = [
+    copy
+    for copy in (
+        getattr(os, "copy_file_range", None),
+        (lambda src, dst, count: os.sendfile(dst, src, None, count)) if hasattr(os, "sendfile") else None,
+    )
+    if copy is not None
+]
+ZERO_COPY_UNSUPPORTED = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP)
+
+# seconds a lease outlives the deadline of its writer, so a write in flight at the deadline lands before anyone else's
+LEASE_MARGIN = 30
+
+
+def _copy_file(src, dst, size, buffer_size):
+    """
+    Copy size bytes between the current positions of file descriptors src and dst. The data stays inside the kernel
+    where the platform and filesystems allow it, and goes through a buffer otherwise. Returns the bytes copied.
+    """
+    remaining = size
+    for copy in ZERO_COPY_FUNCTIONS:
+        try:
+            while remaining:
+                copied = copy(src, dst, remaining)
+                if not copied:
+                    return size - remaining
+                remaining -= copied
+            return size
+        except OSError as e:
+            if e.errno not in ZERO_COPY_UNSUPPORTED:
+                raise
+
+    while remaining:
+        buffer = os.read(src, min(buffer_size, remaining))
+        if not buffer:
+            break
+        os.write(dst, buffer)
+        remaining -= len(buffer)
+
+    return size - remaining
+
 
 TUS_HEADERS = [
     OpenApiParameter(
@@ -63,10 +116,13 @@ class TusUpload(APIView):
     TUS_MAX_FILE_SIZE = getattr(settings, "TUS_MAX_FILE_SIZE", 4294967296)  # in bytes
     TUS_FILE_OVERWRITE = getattr(settings, "TUS_FILE_OVERWRITE", True)
     TUS_TIMEOUT = getattr(settings, "TUS_TIMEOUT", 3600)
+    TUS_BUFFER_SIZE = getattr(settings, "TUS_BUFFER_SIZE", 1048576)  # in bytes, memory used per upload request
+    TUS_MAX_OPEN_UPLOADS = getattr(settings, "TUS_MAX_OPEN_UPLOADS", 10)  # per user
+    TUS_MAX_RESERVED_SIZE = getattr(settings, "TUS_MAX_RESERVED_SIZE", 8589934592)  # in bytes, per user
 
     tus_api_version = "1.0.0"
     tus_api_version_supported = ["1.0.0"]
-    tus_api_extensions = ["creation", "termination", "file-check"]
+    tus_api_extensions = ["creation", "termination", "file-check", "checksum", "concatenation", "expiration"]
 
     @method_decorator(csrf_exempt)
     def dispatch(self, *args, **kwargs):
@@ -83,6 +139,7 @@ class TusUpload(APIView):
         response["Tus-Version"] = ",".join(self.tus_api_version_supported)
         response["Tus-Extension"] = ",".join(self.tus_api_extensions)
         response["Tus-Max-Size"] = self.TUS_MAX_FILE_SIZE
+        response["Tus-Checksum-Algorithm"] = ",".join(CHECKSUM_ALGORITHMS)
         response["Cache-Control"] = "no-store"
 
         return response
@@ -90,7 +147,9 @@ class TusUpload(APIView):
     @extend_schema(
         operation_id="tus_file_check",
         summary="Check if a file already exists",
-        description="Checks whether a file with the given name has already been uploaded.",
+        description=(
+            "Checks whether a file with the given name, or content with the given hash, has already been uploaded."
+        ),
         parameters=TUS_HEADERS,
         responses={
             200: OpenApiResponse(
@@ -101,23 +160,32 @@ class TusUpload(APIView):
         },
     )
     def get(self, request, *args, **kwargs):
-        metadata = {}
         response = self.get_tus_response()
 
         if request.META.get("HTTP_TUS_RESUMABLE", None) is None:
             return HttpResponse(status=405, content="Method Not Allowed")
 
-        for kv in request.META.get("HTTP_UPLOAD_METADATA", None).split(","):
-            key, value = kv.split(" ")
-            metadata[key] = base64.b64decode(value)
-
-        if metadata.get("filename", None) and metadata.get("filename").upper() in [
-            f.upper() for f in os.listdir(os.path.dirname(self.TUS_UPLOAD_DIR))
-        ]:
-            response["Tus-File-Name"] = metadata.get("filename")
-            response["Tus-File-Exists"] = True
+        metadata = self._parse_upload_metadata(request)
+        filename, content_hash = metadata.get("filename"), metadata.get("hash")
+
+        files = File.objects.none()
+        if content_hash:
+            files = File.objects.filter(content_hash=content_hash)
+        elif filename:
+            # matches the functional index on UPPER(name)
+            files = File.objects.annotate(name_upper=Upper("name")).filter(name_upper=filename.upper())
+
+        # only files the caller has seen, whether anybody else uploaded them is none of their business
+        entry_id = request.META.get("HTTP_X_UNICORN_ENTRY_ID")
+        if entry_id:
+            files = files.filter(entry__in=self._uploadable_entries(request.user).filter(pk=entry_id))
         else:
-            response["Tus-File-Exists"] = False
+            files = files.filter(uploader_id=request.user.pk)
+        exists = files.exists()
+
+        if exists and filename:
+            response["Tus-File-Name"] = filename
+        response["Tus-File-Exists"] = exists
         return response
 
     @extend_schema(
@@ -138,7 +206,7 @@ class TusUpload(APIView):
 
         message_id = request.META.get("HTTP_MESSAGE_ID", None)
         if message_id:
-            metadata["message_id"] = base64.b64decode(message_id)
+            metadata["message_id"] = base64.b64decode(message_id).decode("utf-8")
 
         upload_metadata = request.META.get("HTTP_UPLOAD_METADATA", None)
         if upload_metadata:
@@ -152,6 +220,12 @@ class TusUpload(APIView):
 
         return metadata
 
+    def _uploadable_entries(self, user):
+        # contributors upload to their entries, and admins who may change an entry can see its files anyway
+        if user.has_perm("competitions.change_entry"):
+            return Entry.objects.all()
+        return Entry.objects.filter(Q(contributors=user) | visible_objects_filter([user.pk], Entry, "change_entry"))
+
     def _check_file_overwrite(self, filename):
         if self.TUS_FILE_OVERWRITE or not filename:
             return False
@@ -162,18 +236,114 @@ class TusUpload(APIView):
             logger.error("Unable to access file: %s", sanitized)
             return False
 
-    def _store_upload_cache(self, resource_id, metadata, file_size, entry_id, file_type):
-        cache.add(f"tus-uploads/{resource_id}/filename", metadata.get("filename"), self.TUS_TIMEOUT)
-        cache.add(f"tus-uploads/{resource_id}/file_size", file_size, self.TUS_TIMEOUT)
-        cache.add(f"tus-uploads/{resource_id}/offset", 0, self.TUS_TIMEOUT)
-        cache.add(f"tus-uploads/{resource_id}/metadata", metadata, self.TUS_TIMEOUT)
-        cache.add(f"tus-uploads/{resource_id}/type", file_type, self.TUS_TIMEOUT)
-        cache.add(f"tus-uploads/{resource_id}/entry", entry_id, self.TUS_TIMEOUT)
+    def _get_upload(self, resource_id):
+        # validate resource_id is a valid UUID to prevent path traversal
+        try:
+            uuid.UUID(resource_id)
+        except (ValueError, AttributeError, TypeError):
+            return None
+
+        upload = get_state_store().get(resource_id)
+        if upload is None or upload.expired():
+            # expired uploads are gone for clients, even before the reaper deletes them
+            return None
+
+        return upload
+
+    def _check_reservation(self, request, file_size):
+        """
+        Status code and reason to refuse a new upload with, or None if the user may reserve file_size more bytes.
+        """
+        if file_size < 0 or file_size > self.TUS_MAX_FILE_SIZE:
+            return 413, "Upload exceeds the maximum size"
+
+        if request.user.pk is None:
+            return None
+
+        count, size = get_state_store().reserved(request.user.pk)
+        if count >= self.TUS_MAX_OPEN_UPLOADS:
+            return 429, "Too many open uploads"
+        if size + file_size > self.TUS_MAX_RESERVED_SIZE:
+            return 413, "Too many bytes reserved by open uploads"
+
+        return None
+
+    def _parse_checksum(self, request):
+        """
+        The hash object and the expected digest from the Upload-Checksum header, or None without the header. Raises
+        ValueError for unsupported algorithms or malformed digests.
+        """
+        checksum = request.META.get("HTTP_UPLOAD_CHECKSUM", None)
+        if not checksum:
+            return None
+
+        algorithm, _, digest = checksum.partition(" ")
+        if algorithm not in CHECKSUM_ALGORITHMS:
+            raise ValueError(f"Unsupported checksum algorithm {algorithm}")
+        try:
+            return hashlib.new(algorithm), base64.b64decode(digest, validate=True)
+        except binascii.Error as e:
+            raise ValueError(str(e))
+
+    def _write_chunk(self, stream, path, offset, length, hashers=(), deadline=None):
+        """
+        Copy up to length bytes from the request stream into the upload file at offset, TUS_BUFFER_SIZE at a time,
+        feeding every buffer to the hashers on the way. Returns the number of bytes actually written, which is less
+        than length if the client went away or the deadline (a timestamp) passed.
+        """
+        written = 0
+        with os.fdopen(os.open(path, os.O_WRONLY), "wb") as f:
+            f.seek(offset)
+            while written < length:
+                buffer = stream.read(min(self.TUS_BUFFER_SIZE, length - written))
+                if not buffer or (deadline is not None and time.time() > deadline):
+                    break
+                f.write(buffer)
+                for hasher in hashers:
+                    hasher.update(buffer)
+                written += len(buffer)
+
+        return written
+
+    def _refuse_chunk(self, upload, path, offset, length):
+        """
+        Status code and reason to refuse a chunk with, or None if it can be written.
+        """
+        if upload is None or (upload.filename or upload.concat) is None or os.path.lexists(path) is False:
+            return 410, None
+
+        if offset != upload.offset:  # check to make sure we're in sync
+            return 409, None  # HTTP 409 Conflict
+
+        if length < 0 or offset + length > upload.file_size:
+            return 413, "Chunk exceeds the upload length"
+
+        return None
+
+    def _receive_chunk(self, request, upload, path, length, deadline=None):
+        """
+        Write a chunk to the upload file at the upload's offset, hashing it on the way. Returns the number of bytes
+        written, the hasher of the whole upload and whether the chunk matched its Upload-Checksum.
+        """
+        checksum = self._parse_checksum(request)
+
+        # the partial hash block is picked up from disk, hashing continues where the last chunk left off
+        hasher = BlockHasher(upload.block_digests)
+        hasher.resume(path, upload.offset, self.TUS_BUFFER_SIZE)
+
+        # stream straight from the request, request.body would hold the whole chunk in memory
+        hashers = [hasher] if checksum is None else [hasher, checksum[0]]
+        written = self._write_chunk(request.stream, path, upload.offset, length, hashers, deadline)
+        if written != length:
+            logger.warning("Received %d of %d bytes for upload %s", written, length, upload.resource_id)
+
+        matched = checksum is None or (written == length and checksum[0].digest() == checksum[1])
+        return written, hasher, matched
 
     def _create_upload_file(self, resource_id, file_size):
         with os.fdopen(os.open(os.path.join(self.TUS_UPLOAD_DIR, resource_id), os.O_WRONLY | os.O_CREAT), "wb") as f:
-            f.seek(file_size)
-            f.write(b"\0")
+            # sparse file of exactly the upload length, chunks are written into it in place
+            f.truncate(file_size)
 
     @extend_schema(
         operation_id="tus_create_upload",
@@ -204,12 +374,27 @@ class TusUpload(APIView):
                 location=OpenApiParameter.HEADER,
                 description="Type of file being uploaded (e.g. screenshot, entry).",
             ),
+            OpenApiParameter(
+                name="Upload-Concat",
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.HEADER,
+                description=(
+                    "'partial' for a part of an upload, or 'final;' followed by the space separated URLs of the "
+                    "finished partial uploads to concatenate into the file."
+                ),
+            ),
         ],
         request=None,
         responses={
             201: OpenApiResponse(description="Upload resource created. Location header contains the upload URL."),
-            400: OpenApiResponse(description="No matching entry for the provided entry ID."),
-            409: OpenApiResponse(description="File already exists and overwriting is disabled."),
+            400: OpenApiResponse(description="No matching entry for the provided entry ID, or invalid partials."),
+            409: OpenApiResponse(
+                description="File already exists and overwriting is disabled, or the partials are being concatenated."
+            ),
+            413: OpenApiResponse(
+                description="Upload too large, or too many bytes reserved by the user's open uploads."
+            ),
+            429: OpenApiResponse(description="Too many open uploads for the user."),
             500: OpenApiResponse(description="Unsupported protocol or server error."),
         },
     )
@@ -223,6 +408,7 @@ class TusUpload(APIView):
             return response
 
         metadata = self._parse_upload_metadata(request)
+        expires = expires_at()
 
         if self._check_file_overwrite(metadata.get("filename")):
             response.status_code = 409
@@ -236,7 +422,16 @@ class TusUpload(APIView):
             response.reason_phrase = "No matching entry for this upload"
             return response
 
+        concat = request.META.get("HTTP_UPLOAD_CONCAT", "")
+        if concat.startswith("final;"):
+            return self._create_final_upload(request, response, metadata, entry, concat[len("final;") :].split())
+
         file_size = int(request.META.get("HTTP_UPLOAD_LENGTH", "0"))
+        refusal = self._check_reservation(request, file_size)
+        if refusal is not None:
+            response.status_code, response.reason_phrase = refusal
+            return response
+
         resource_id = str(uuid.uuid4())
 
         try:
@@ -250,14 +445,155 @@ class TusUpload(APIView):
             response.status_code = 500
             return response
 
-        self._store_upload_cache(
-            resource_id, metadata, file_size, entry.pk, request.META.get("HTTP_X_UNICORN_FILE_TYPE")
+        get_state_store().create(
+            UploadRecord(
+                resource_id=resource_id,
+                filename=metadata.get("filename"),
+                file_size=file_size,
+                metadata=metadata,
+                file_type=request.META.get("HTTP_X_UNICORN_FILE_TYPE"),
+                entry_id=entry.pk,
+                concat="partial" if concat == "partial" else None,
+                uploader_id=request.user.pk,
+                expires=expires,
+            )
         )
 
         response.status_code = 201
         response["Location"] = f"{request.build_absolute_uri()}{resource_id}"
+        response["Upload-Expires"] = http_date(expires.timestamp())
         return response
 
+    def _create_final_upload(self, request, response, metadata, entry, urls):
+        """
+        Concatenation extension: assemble finished partial uploads of the same user into the file, which is then
+        finished right away. The partials are leased like chunks being written, so only one request gets to finish
+        them and the leases of a dead worker expire, and are only deleted once the file is finished. They already
+        count towards the bytes reserved by the user, so only the size of the whole file is checked.
+        """
+        store = get_state_store()
+        partials = [self._get_upload(url.rstrip("/").rsplit("/", 1)[-1]) for url in urls]
+        refusal = self._refuse_partials(request, metadata, partials)
+        if refusal is not None:
+            response.status_code, response.reason_phrase = refusal
+            return response
+
+        lease = uuid.uuid4()
+        deadline = timezone.now() + timedelta(seconds=TUS_LEASE_TIMEOUT)
+        if not self._claim_partials(partials, lease, deadline + timedelta(seconds=LEASE_MARGIN)):
+            # another request is concatenating them already
+            response.status_code = 409
+            return response
+
+        resource_id = str(uuid.uuid4())
+        path = os.path.join(self.TUS_UPLOAD_DIR, resource_id)
+        try:
+            hasher = self._assemble_upload_file(path, partials)
+        except IOError as e:
+            logger.error("Unable to concatenate uploads: %s", e, exc_info=True)
+            self._abandon_final_upload(path, partials, lease)
+            response.status_code = 500
+            return response
+
+        if timezone.now() > deadline:
+            # the leases may be taken over by another request once past the margin, which would finish the file twice
+            self._abandon_final_upload(path, partials, lease)
+            response.status_code = 409
+            response.reason_phrase = "Concatenation took too long"
+            return response
+
+        upload = UploadRecord(
+            resource_id=resource_id,
+            file_size=sum(p.file_size for p in partials),
+            filename=metadata.get("filename"),
+            metadata=metadata,
+            file_type=request.META.get("HTTP_X_UNICORN_FILE_TYPE"),
+            entry_id=entry.pk,
+        )
+        try:
+            self._finish_upload(request, upload, path, hasher.hexdigest())
+        except IOError as e:
+            logger.error("Unable to store upload: %s", e, exc_info=True)
+            self._abandon_final_upload(path, partials, lease)
+            response.status_code = 500
+            return response
+        except Exception:
+            self._abandon_final_upload(path, partials, lease)
+            raise
+
+        for partial in partials:
+            store.delete(partial.resource_id)
+            os.remove(os.path.join(self.TUS_UPLOAD_DIR, partial.resource_id))
+
+        response.status_code = 201
+        response["Location"] = f"{request.build_absolute_uri()}{resource_id}"
+        response["Upload-Offset"] = upload.file_size
+        return response
+
+    def _refuse_partials(self, request, metadata, partials):
+        """
+        Status code and reason to refuse concatenating the partial uploads with, or None if they can be concatenated.
+        """
+        if not metadata.get("filename") or not partials:
+            return 400, "Missing filename or partial uploads"
+        if any(
+            p is None or p.concat != "partial" or p.offset != p.file_size or p.uploader_id != request.user.pk
+            for p in partials
+        ):
+            # uploads of other users are treated as missing, so their ids can't be probed
+            return 400, "Partial uploads must exist, be your own and be finished"
+        if sum(p.file_size for p in partials) > self.TUS_MAX_FILE_SIZE:
+            return 413, "Upload exceeds the maximum size"
+
+        return None
+
+    def _claim_partials(self, partials, lease, until) -> bool:
+        """
+        Lease all of the partial uploads, or none of them. Returns whether they were leased.
+        """
+        store = get_state_store()
+        claimed = []
+        for partial in partials:
+            if not store.claim(partial.resource_id, partial.file_size, lease, until):
+                self._release_partials(claimed, lease)
+                return False
+            claimed.append(partial)
+
+        return True
+
+    def _release_partials(self, partials, lease):
+        store = get_state_store()
+        for partial in partials:
+            store.release(partial.resource_id, lease)
+
+    def _abandon_final_upload(self, path, partials, lease):
+        # the partials are left as they were, so the client can try again
+        self._release_partials(partials, lease)
+        if os.path.lexists(path):
+            os.remove(path)
+
+    def _assemble_upload_file(self, path, partials):
+        """
+        Concatenate the files of the partial uploads into path. Returns the hasher of the result.
+        """
+        hasher = BlockHasher()
+        dst = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        try:
+            for partial in partials:
+                partial_path = os.path.join(self.TUS_UPLOAD_DIR, partial.resource_id)
+                src = os.open(partial_path, os.O_RDONLY)
+                try:
+                    copied = _copy_file(src, dst, partial.file_size, self.TUS_BUFFER_SIZE)
+                finally:
+                    os.close(src)
+                if copied != partial.file_size:
+                    raise IOError(f"Partial upload {partial.resource_id} is shorter than its length")
+                hasher.extend(partial_path, partial.file_size, partial.block_digests, self.TUS_BUFFER_SIZE)
+        finally:
+            os.close(dst)
+
+        return hasher
+
     @extend_schema(
         operation_id="tus_upload_offset",
         summary="Get the current upload offset",
@@ -272,16 +608,19 @@ class TusUpload(APIView):
         response = self.get_tus_response()
         resource_id = kwargs.get("resource_id", None)
 
-        offset = cache.get(f"tus-uploads/{resource_id}/offset")
-        file_size = cache.get(f"tus-uploads/{resource_id}/file_size")
-        if offset is None:
+        upload = self._get_upload(resource_id)
+        if upload is None:
             response.status_code = 404
             return response
 
         else:
             response.status_code = 200
-            response["Upload-Offset"] = offset
-            response["Upload-Length"] = file_size
+            response["Upload-Offset"] = upload.offset
+            response["Upload-Length"] = upload.file_size
+            if upload.concat:
+                response["Upload-Concat"] = upload.concat
+            if upload.expires:
+                response["Upload-Expires"] = http_date(upload.expires.timestamp())
 
         return response
 
@@ -308,13 +647,22 @@ class TusUpload(APIView):
                 required=True,
                 description="Size of the chunk being uploaded in bytes.",
             ),
+            OpenApiParameter(
+                name="Upload-Checksum",
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.HEADER,
+                description="Algorithm and base64-encoded digest of the chunk, e.g. 'sha1 <digest>'.",
+            ),
         ],
         request={"application/offset+octet-stream": OpenApiTypes.BINARY},
         responses={
             200: OpenApiResponse(description="Chunk uploaded. Upload-Offset header reflects the new offset."),
-            400: OpenApiResponse(description="Invalid resource ID."),
-            409: OpenApiResponse(description="Offset mismatch — client and server are out of sync."),
+            400: OpenApiResponse(description="Invalid resource ID or checksum."),
+            409: OpenApiResponse(
+                description="Offset mismatch — client and server are out of sync, or another request is writing."
+            ),
             410: OpenApiResponse(description="Upload resource no longer exists."),
+            460: OpenApiResponse(description="Checksum mismatch, the chunk was discarded."),
             500: OpenApiResponse(description="Server error writing chunk."),
         },
     )
@@ -330,66 +678,106 @@ class TusUpload(APIView):
             response.status_code = 400
             return response
 
-        filename = cache.get(f"tus-uploads/{resource_id}/filename")
-        file_size = int(cache.get(f"tus-uploads/{resource_id}/file_size") or 0)
-        metadata = cache.get(f"tus-uploads/{resource_id}/metadata")
-        offset = cache.get(f"tus-uploads/{resource_id}/offset")
-        entry_id = cache.get(f"tus-uploads/{resource_id}/entry")
-        entry_filetype = cache.get(f"tus-uploads/{resource_id}/type")
+        upload = self._get_upload(resource_id)
 
         file_offset = int(request.META.get("HTTP_UPLOAD_OFFSET", 0))
-        chunk_size = int(request.META.get("CONTENT_LENGTH", 102400))
+        try:
+            chunk_size = int(request.META["CONTENT_LENGTH"])
+        except (KeyError, ValueError):
+            response.status_code = 400
+            response.reason_phrase = "Missing or invalid Content-Length"
+            return response
 
         upload_file_path = os.path.join(self.TUS_UPLOAD_DIR, resource_id)
-        if filename is None or os.path.lexists(upload_file_path) is False:
-            response.status_code = 410
+        refusal = self._refuse_chunk(upload, upload_file_path, file_offset, chunk_size)
+        if refusal is not None:
+            response.status_code, response.reason_phrase = refusal
             return response
 
-        if file_offset != offset:  # check to make sure we're in sync
-            response.status_code = 409  # HTTP 409 Conflict
+        return self._write_upload(request, response, upload, upload_file_path, chunk_size)
+
+    def _write_upload(self, request, response, upload, upload_file_path, chunk_size):
+        # claim the offset before writing, so concurrent requests for the same offset never write over each other
+        store = get_state_store()
+        lease = uuid.uuid4()
+        deadline = timezone.now() + timedelta(seconds=TUS_LEASE_TIMEOUT)
+        if not store.claim(upload.resource_id, upload.offset, lease, deadline + timedelta(seconds=LEASE_MARGIN)):
+            response.status_code = 409
+            response.reason_phrase = "Upload is being written by another request"
             return response
 
         try:
-            flags = os.O_RDWR
-            mode = "r+b"
-            if not os.path.exists(upload_file_path):
-                flags |= os.O_CREAT
-                mode = "wb"
-            with os.fdopen(os.open(upload_file_path, flags), mode) as f:
-                f.seek(file_offset)
-                f.write(request.body)
-        except IOError as e:
-            logger.error("Unable to write chunk: %s", e, exc_info=True)
-            response.status_code = 500
+            written, hasher, matched = self._receive_chunk(
+                request, upload, upload_file_path, chunk_size, deadline.timestamp()
+            )
+        except (ValueError, IOError) as e:
+            store.release(upload.resource_id, lease)
+            if isinstance(e, ValueError):
+                response.status_code = 400
+                response.reason_phrase = str(e)
+            else:
+                logger.error("Unable to write chunk: %s", e, exc_info=True)
+                response.status_code = 500
+            return response
+
+        if not matched or not written:
+            # the offset doesn't move, so the bytes written are overwritten when the client retries
+            store.release(upload.resource_id, lease)
+        if not matched:
+            response.status_code = 460
+            response.reason_phrase = "Checksum Mismatch"
             return response
 
-        new_offset = cache.incr(f"tus-uploads/{resource_id}/offset", chunk_size)
+        # only advance past what actually made it to disk, so the client resumes from there. The lease may have expired
+        # and been taken by another request in the meantime, in which case this one lost and the client has to resync.
+        new_offset = upload.offset + written
+        expires = expires_at()
+        if written and not store.compare_and_set_offset(
+            upload.resource_id, upload.offset, new_offset, lease, block_digests=hasher.digests, expires=expires
+        ):
+            response.status_code = 409
+            return response
         response["Upload-Offset"] = new_offset
 
-        if file_size == new_offset:  # file transfer complete, rename from resource id to actual filename
-            filename = f"{uuid.uuid4().hex}_{os.path.basename(filename)}"
-            shutil.move(upload_file_path, os.path.join(self.TUS_DESTINATION_DIR, filename))
-            cache.delete_many(
-                [
-                    f"tus-uploads/{resource_id}/file_size",
-                    f"tus-uploads/{resource_id}/filename",
-                    f"tus-uploads/{resource_id}/offset",
-                    f"tus-uploads/{resource_id}/metadata",
-                    f"tus-uploads/{resource_id}/entry",
-                    f"tus-uploads/{resource_id}/type",
-                ]
-            )
-            tus_upload_finished_signal.send(
-                sender=self.__class__,
-                metadata=metadata,
-                filename=filename,
-                upload_file_path=upload_file_path,
-                file_size=file_size,
-                upload_url=self.TUS_UPLOAD_URL,
-                destination_folder=self.TUS_DESTINATION_DIR,
-                entry_id=entry_id,
-                uploader=request.user.id,
-                type=entry_filetype,
-            )
+        if new_offset < upload.file_size:
+            response["Upload-Expires"] = http_date(expires.timestamp())
+        elif upload.concat is None:  # file transfer complete, partials wait for the final upload instead
+            try:
+                self._finish_upload(request, upload, upload_file_path, hasher.hexdigest())
+            except IOError as e:
+                logger.error("Unable to store upload: %s", e, exc_info=True)
+                response.status_code = 500
+                return response
 
         return response
+
+    def _finish_upload(self, request, upload, upload_file_path, content_hash):
+        # the content goes to the blob store, and is linked to the actual filename from there
+        filename = f"{uuid.uuid4().hex}_{os.path.basename(upload.filename)}"
+        destination = os.path.join(self.TUS_DESTINATION_DIR, filename)
+        blob = store_blob(upload_file_path, content_hash, upload.file_size)
+
+        try:
+            link_blob(blob, destination)
+            get_state_store().delete(upload.resource_id)
+            # receivers register the file, which is rolled back along with them if any of them fails
+            with transaction.atomic():
+                tus_upload_finished_signal.send(
+                    sender=self.__class__,
+                    metadata=upload.metadata,
+                    filename=filename,
+                    upload_file_path=upload_file_path,
+                    file_size=upload.file_size,
+                    upload_url=self.TUS_UPLOAD_URL,
+                    destination_folder=self.TUS_DESTINATION_DIR,
+                    entry_id=upload.entry_id,
+                    uploader=request.user.id,
+                    type=upload.file_type,
+                    content_hash=content_hash,
+                )
+        except Exception:
+            # no file refers to the blob, so nothing else would ever release the reference taken above
+            if os.path.lexists(destination):
+                os.remove(destination)
+            release_blob(content_hash)
+            raise